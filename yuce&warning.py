@@ -4,12 +4,11 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from datetime import datetime, timedelta
+from datetime import datetime
+from functools import partial, wraps
 import warnings
 import os
-import re
 import calendar
-import math
 from io import BytesIO
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -17,6 +16,40 @@ import matplotlib.font_manager as fm
 from matplotlib.ticker import MaxNLocator
 from matplotlib.gridspec import GridSpec
 
+import yuce_engine
+import yuce_sqlstore
+from yuce_engine import (
+    DEFAULT_ACTUAL_FILE,
+    DEFAULT_FORECAST_FILE,
+    DEFAULT_INVENTORY_FILE,
+    DEFAULT_PRICE_FILE,
+    DEFAULT_PRODUCT_FILE,
+    analyze_batch_risk,
+    calculate_national_accuracy,
+    calculate_product_growth,
+    calculate_regional_accuracy,
+    calculate_top_skus,
+    cube_aggregate,
+    data_version,
+    default_analysis_months,
+    format_product_code,
+    generate_recommendation,
+    get_common_months,
+    get_last_three_months,
+    append_perf_log,
+    latest_snapshot,
+    memory_usage_report,
+    process_data,
+    read_snapshot_manifest,
+    risk_table_page,
+    share_categories,
+    snapshot_changed_inputs,
+    timed_stage,
+    value_batches,
+)
+from yuce_export import analysis_workbook, csv_export
+from yuce_sqlstore import SQLITE_DB_PATH, database_version
+
 warnings.filterwarnings('ignore')
 
 # 设置页面配置
@@ -243,1700 +276,384 @@ def add_chart_explanation(explanation_text):
     st.markdown(f'<div class="chart-explanation">{explanation_text}</div>', unsafe_allow_html=True)
 
 
-# 函数：简化产品名称
-def simplify_product_name(code, full_name):
-    """将产品完整名称简化为更简短的格式"""
-    # 检查输入有效性
-    if not full_name or not isinstance(full_name, str):
-        return full_name
-
-    # 如果符合"口力X-中国"格式，则简化
-    if "口力" in full_name and "-中国" in full_name:
-        # 去除"口力"前缀和"-中国"后缀
-        return full_name.replace("口力", "").replace("-中国", "").strip()
-
-    # 否则返回原始名称
-    return full_name
-
-
-# 函数：安全计算均值
-def safe_mean(series, default=0):
-    """安全地计算Series的均值，处理空值和异常"""
-    if series is None or len(series) == 0 or (hasattr(series, 'empty') and series.empty) or (
-            hasattr(series, 'isna') and series.isna().all()):
-        return default
-
-    try:
-        # 尝试使用pandas内置mean方法
-        if hasattr(series, 'mean'):
-            return series.mean()
-
-        # 如果不是pandas Series，尝试使用numpy
-        import numpy as np
-        return np.nanmean(series)
-    except (OverflowError, ValueError, TypeError, ZeroDivisionError):
-        # 处理任何计算错误
-        return default
-
-
-# 函数：计算准确率
-def calculate_unified_accuracy(actual, forecast):
-    """统一计算准确率的函数，适用于全国和区域"""
-    if actual == 0 and forecast == 0:
-        return 1.0  # 如果实际和预测都为0，准确率为100%
-
-    if actual == 0:
-        return 0.0  # 如果实际为0但预测不为0，准确率为0%
-
-    # 计算差异率
-    diff_rate = (actual - forecast) / actual
-
-    # 计算准确率 (基础公式: 1 - |差异率|)
-    return max(0, 1 - abs(diff_rate))
-
-
-# 函数：生成备货建议
-def generate_recommendation(growth_rate):
-    """优化的备货建议生成函数"""
-    # 基于增长率生成建议
-    if growth_rate > 15:
-        return {
-            "建议": "增加备货",
-            "调整比例": round(growth_rate),
-            "颜色": "#4CAF50",
-            "样式类": "recommendation-increase",
-            "图标": "↑"
-        }
-    elif growth_rate > 0:
-        return {
-            "建议": "小幅增加",
-            "调整比例": round(growth_rate / 2),
-            "颜色": "#8BC34A",
-            "样式类": "recommendation-increase",
-            "图标": "↗"
-        }
-    elif growth_rate > -10:
-        return {
-            "建议": "维持现状",
-            "调整比例": 0,
-            "颜色": "#FFC107",
-            "样式类": "recommendation-maintain",
-            "图标": "→"
-        }
-    else:
-        adjust = abs(round(growth_rate / 2))
-        return {
-            "建议": "减少备货",
-            "调整比例": adjust,
-            "颜色": "#F44336",
-            "样式类": "recommendation-decrease",
-            "图标": "↓"
-        }
-
-
-# 函数：计算风险百分比
-def calculate_risk_percentage(days_to_clear, batch_age, target_days):
-    """
-    计算风险百分比，基于清库天数和库龄
-
-    参数:
-    days_to_clear (float): 预计清库天数
-    batch_age (int): 批次库龄（天数）
-    target_days (int): 目标清库天数（30/60/90天）
-
-    返回:
-    float: 风险百分比，范围0-100
-    """
-    # 核心规则1: 库龄已经超过目标天数，风险直接为100%
-    if batch_age >= target_days:
-        return 100.0
-
-    # 核心规则2: 无法清库情况
-    if days_to_clear == float('inf'):
-        return 100.0
-
-    # 核心规则3: 清库天数超过目标的3倍，风险为100%
-    if days_to_clear >= 3 * target_days:
-        return 100.0
-
-    # 计算基于清库天数的风险（使用sigmoid函数提供更好的区分度）
-    clearance_ratio = days_to_clear / target_days
-    clearance_risk = 100 / (1 + math.exp(-4 * (clearance_ratio - 1)))
-
-    # 计算基于库龄的风险（线性比例）
-    age_risk = 100 * batch_age / target_days
-
-    # 组合风险 - 加权平均，更强调高风险因素
-    combined_risk = 0.8 * max(clearance_risk, age_risk) + 0.2 * min(clearance_risk, age_risk)
-
-    # 阈值规则1: 清库天数超过目标，风险至少为80%
-    if days_to_clear > target_days:
-        combined_risk = max(combined_risk, 80)
-
-    # 阈值规则2: 清库天数超过目标的2倍，风险至少为90%
-    if days_to_clear >= 2 * target_days:
-        combined_risk = max(combined_risk, 90)
-
-    # 阈值规则3: 库龄超过目标的75%，风险至少为75%
-    if batch_age >= 0.75 * target_days:
-        combined_risk = max(combined_risk, 75)
-
-    return min(100, round(combined_risk, 1))
-
-
-# 函数：加载单价数据
-@st.cache_data
-def load_price_data(file_path=None):
-    """加载产品单价数据"""
-    price_data = {}
-
-    # 指定的产品单价信息（默认值，防止文件不存在或读取失败）
-    specified_prices = {
-        'F01E4B': 137.04,
-        'F3411A': 137.04,
-        'F0104L': 126.72,
-        'F3406B': 129.36,
-        'F01C5D': 153.6,
-        'F01L3A': 182.4,
-        'F01L6A': 307.2,
-        'F01A3C': 175.5,
-        'F01H2B': 307.2,
-        'F01L4A': 182.4,
-        'F0104J': 216.96
-    }
-
-    try:
-        if file_path and os.path.exists(file_path):
-            price_df = pd.read_excel(file_path)
-            # 查找包含"单价"的列
-            unit_price_col = [col for col in price_df.columns if '单价' in col]
-            product_code_col = [col for col in price_df.columns if '产品代码' in col or '编号' in col]
-
-            if unit_price_col and product_code_col:
-                # 使用找到的列名
-                code_col = product_code_col[0]
-                price_col = unit_price_col[0]
-
-                # 处理可能的前缀如"型号"或"编号："
-                for _, row in price_df.iterrows():
-                    code = str(row[code_col])
-                    # 提取产品代码 - 查找形如F开头后跟字母和数字的模式
-                    code_match = re.search(r'(F[0-9A-Z]+)', code)
-                    if code_match:
-                        code = code_match.group(1)
-                        price_data[code] = row[price_col]
-            else:
-                # 尝试查找产品代码和单价列，不管列名是什么
-                if len(price_df.columns) >= 2:  # 至少有两列：代码和单价
-                    code_col = price_df.columns[0]  # 假设第一列是代码
-                    price_col = price_df.columns[1]  # 假设第二列是单价
-
-                    for _, row in price_df.iterrows():
-                        code = str(row[code_col])
-                        # 提取产品代码 - 查找形如F开头后跟字母和数字的模式
-                        code_match = re.search(r'(F[0-9A-Z]+)', code)
-                        if code_match:
-                            code = code_match.group(1)
-                            price_data[code] = row[price_col]
-
-            # 如果成功读取了数据，返回
-            if price_data:
-                return price_data
-
-        # 如果单价文件加载失败或未提供路径，使用指定的价格
-        return specified_prices
-
-    except Exception as e:
-        # 出错时使用指定的价格
-        return specified_prices
-
-
-# 函数：加载产品信息数据
-@st.cache_data
-def load_product_info(file_path=None):
-    """加载产品信息数据"""
-    try:
-        # 默认路径或示例数据
-        if file_path is None or not os.path.exists(file_path):
-            # 创建示例数据
-            return create_sample_product_info()
-
-        # 加载数据
-        df = pd.read_excel(file_path)
-
-        # 确保列名格式一致
-        required_columns = ['产品代码', '产品名称']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-
-        if missing_columns:
-            st.error(f"产品信息文件缺少必要的列: {', '.join(missing_columns)}。使用示例数据进行演示。")
-            return create_sample_product_info()
-
-        # 确保数据类型正确
-        df['产品代码'] = df['产品代码'].astype(str)
-        df['产品名称'] = df['产品名称'].astype(str)
-
-        # 添加简化产品名称列
-        df['简化产品名称'] = df.apply(lambda row: simplify_product_name(row['产品代码'], row['产品名称']), axis=1)
-
-        return df
-
-    except Exception as e:
-        st.error(f"加载产品信息数据时出错: {str(e)}。使用示例数据进行演示。")
-        return create_sample_product_info()
-
-
-# 函数：创建示例产品信息数据
-def create_sample_product_info():
-    """创建示例产品信息数据"""
-    # 产品代码列表
-    product_codes = [
-        'F0104L', 'F01E4P', 'F01E6C', 'F3406B', 'F3409N', 'F3411A',
-        'F01E4B', 'F0183F', 'F0110C', 'F0104J', 'F0104M', 'F0104P',
-        'F0110A', 'F0110B', 'F0115C', 'F0101P'
-    ]
-
-    # 产品名称列表
-    product_names = [
-        '口力比萨68克袋装-中国', '口力汉堡大袋120g-中国', '口力汉堡中袋108g-中国',
-        '口力海洋动物100g-中国', '口力幻彩蜥蜴105g-中国', '口力午餐袋77g-中国',
-        '口力汉堡137g-中国', '口力热狗120g-中国', '口力奶酪90g-中国',
-        '口力比萨小包60g-中国', '口力比萨中包80g-中国', '口力比萨大包100g-中国',
-        '口力薯条65g-中国', '口力鸡块75g-中国', '口力汉堡圈85g-中国',
-        '口力德果汉堡108g-中国'
-    ]
-
-    # 产品规格
-    product_specs = [
-        '68g*24', '120g*24', '108g*24', '100g*24', '105g*24', '77g*24',
-        '137g*24', '120g*24', '90g*24', '60g*24', '80g*24', '100g*24',
-        '65g*24', '75g*24', '85g*24', '108g*24'
-    ]
-
-    # 创建DataFrame
-    data = {'产品代码': product_codes,
-            '产品名称': product_names,
-            '产品规格': product_specs}
-
-    df = pd.DataFrame(data)
-
-    # 添加简化产品名称列
-    df['简化产品名称'] = df.apply(lambda row: simplify_product_name(row['产品代码'], row['产品名称']), axis=1)
+# 本次运行的性能诊断记录，以及本次运行中未命中缓存（实际执行了函数体）的缓存函数
+perf_records = []
+cache_misses = set()
 
-    return df
+# 整页运行结束并写入性能日志后为True，之后执行的片段都是片段单独重跑；正在计时的片段名称
+full_run_logged = False
+active_fragment = None
 
 
-# 函数：格式化产品代码
-def format_product_code(code, product_info_df, include_name=True):
-    """将产品代码格式化为只显示简化名称，不显示代码"""
-    if product_info_df is None or code not in product_info_df['产品代码'].values:
-        return code
+# 函数：记录阶段性能
+def perf_stage(stage):
+    """记录代码块的耗时和内存峰值增量（见timed_stage），显示在侧边栏的性能诊断面板中"""
+    return timed_stage(perf_records, stage)
 
-    if include_name:
-        # 仅使用简化名称，不包含代码
-        filtered_df = product_info_df[product_info_df['产品代码'] == code]
-        if not filtered_df.empty and '简化产品名称' in filtered_df.columns:
-            simplified_name = filtered_df['简化产品名称'].iloc[0]
-            if not pd.isna(simplified_name) and simplified_name:
-                # 移除代码部分，只保留简化产品名称部分
-                return simplified_name.replace(code, "").strip()
 
-        # 回退到只显示产品名称，不显示代码
-        product_name = filtered_df['产品名称'].iloc[0]
-        return product_name
-    else:
-        return code
-
-
-# 函数：加载实际销售数据
-@st.cache_data
-def load_actual_data(file_path=None):
-    """加载实际销售数据"""
-    try:
-        # 默认路径或示例数据
-        if file_path is None or not os.path.exists(file_path):
-            # 创建示例数据
-            return load_sample_actual_data()
-
-        # 加载数据
-        df = pd.read_excel(file_path)
-
-        # 确保列名格式一致
-        required_columns = ['订单日期', '所属区域', '申请人', '产品代码', '求和项:数量（箱）']
-
-        # 尝试匹配列名
-        renamed_columns = {}
-        for req_col in required_columns:
-            matched_cols = [col for col in df.columns if req_col in col]
-            if matched_cols:
-                renamed_columns[matched_cols[0]] = req_col
-
-        # 如果找到匹配列，重命名
-        if renamed_columns:
-            df = df.rename(columns=renamed_columns)
-
-        # 检查是否有缺失列
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            st.error(f"实际销售数据文件缺少必要的列: {', '.join(missing_columns)}。使用示例数据进行演示。")
-            return load_sample_actual_data()
-
-        # 确保数据类型正确
-        df['订单日期'] = pd.to_datetime(df['订单日期'])
-        df['所属区域'] = df['所属区域'].astype(str)
-        df['申请人'] = df['申请人'].astype(str)
-        df['产品代码'] = df['产品代码'].astype(str)
-        df['求和项:数量（箱）'] = pd.to_numeric(df['求和项:数量（箱）'], errors='coerce')
-
-        # 创建年月字段，用于与预测数据对齐
-        df['所属年月'] = df['订单日期'].dt.strftime('%Y-%m')
-
-        return df
-
-    except Exception as e:
-        st.error(f"加载实际销售数据时出错: {str(e)}。使用示例数据进行演示。")
-        return load_sample_actual_data()
-
-
-# 函数：加载预测数据
-@st.cache_data
-def load_forecast_data(file_path=None):
-    """加载预测数据"""
-    try:
-        # 默认路径或示例数据
-        if file_path is None or not os.path.exists(file_path):
-            # 创建示例数据
-            return load_sample_forecast_data()
-
-        # 加载数据
-        df = pd.read_excel(file_path)
-
-        # 确保列名格式一致
-        required_columns = ['所属大区', '销售员', '所属年月', '产品代码', '预计销售量']
-
-        # 尝试匹配列名
-        renamed_columns = {}
-        for req_col in required_columns:
-            matched_cols = [col for col in df.columns if req_col in col]
-            if matched_cols:
-                renamed_columns[matched_cols[0]] = req_col
-
-        # 如果找到匹配列，重命名
-        if renamed_columns:
-            df = df.rename(columns=renamed_columns)
-
-        # 检查是否有缺失列
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            st.error(f"预测数据文件缺少必要的列: {', '.join(missing_columns)}。使用示例数据进行演示。")
-            return load_sample_forecast_data()
-
-        # 确保数据类型正确
-        df['所属大区'] = df['所属大区'].astype(str)
-        df['销售员'] = df['销售员'].astype(str)
-        df['所属年月'] = pd.to_datetime(df['所属年月']).dt.strftime('%Y-%m')
-        df['产品代码'] = df['产品代码'].astype(str)
-        df['预计销售量'] = pd.to_numeric(df['预计销售量'], errors='coerce')
-
-        # 为了保持一致，将'所属大区'列重命名为'所属区域'
-        df = df.rename(columns={'所属大区': '所属区域'})
-
-        return df
-
-    except Exception as e:
-        st.error(f"加载预测数据时出错: {str(e)}。使用示例数据进行演示。")
-        return load_sample_forecast_data()
-
-
-# 函数：创建示例销售数据
-def load_sample_actual_data():
-    """创建示例实际销售数据"""
-    # 产品代码列表
-    product_codes = [
-        'F0104L', 'F01E4P', 'F01E6C', 'F3406B', 'F3409N', 'F3411A',
-        'F01E4B', 'F0183F', 'F0110C', 'F0104J', 'F0104M', 'F0104P',
-        'F0110A', 'F0110B', 'F0115C', 'F0101P'
-    ]
-
-    # 区域列表
-    regions = ['北', '南', '东', '西']
-
-    # 申请人列表
-    applicants = ['孙杨', '李根', '张伟', '王芳', '刘涛', '陈明']
-
-    # 生成日期范围
-    start_date = datetime(2023, 9, 1)
-    end_date = datetime(2025, 2, 24)
-    date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-
-    # 创建数据
-    data = []
-    for date in date_range:
-        # 为每天生成随机数量的记录
-        num_records = np.random.randint(3, 10)
-
-        for _ in range(num_records):
-            region = np.random.choice(regions)
-            applicant = np.random.choice(applicants)
-            product_code = np.random.choice(product_codes)
-            quantity = np.random.randint(5, 300)
-
-            data.append({
-                '订单日期': date,
-                '所属区域': region,
-                '申请人': applicant,
-                '产品代码': product_code,
-                '求和项:数量（箱）': quantity
-            })
+# 函数：记录片段性能
+def timed_fragment(name):
+    """
+    片段函数的装饰器（放在@st.fragment之下）：整页运行时片段的耗时计入所在的阶段；
+    片段单独重跑时（筛选、翻页、表格检索和排序等）片段内的阶段另行记录，并以{'fragment': name}写入性能日志
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            global perf_records, active_fragment
+            # 嵌套片段随外层片段一起计时
+            if not full_run_logged or active_fragment is not None:
+                return func(*args, **kwargs)
+            perf_records = []
+            active_fragment = name
+            try:
+                with perf_stage(f"片段：{name}"):
+                    return func(*args, **kwargs)
+            finally:
+                active_fragment = None
+                append_perf_log(perf_records, {'mode': run_mode, 'fragment': name})
+        return wrapper
+    return decorator
+
+
+# 函数：获取缓存命中状态
+def cache_status(name):
+    """缓存函数在本次运行中执行了函数体时为'miss'，否则为'hit'"""
+    return 'miss' if name in cache_misses else 'hit'
+
+
+# 函数：加载单个输入文件
+@st.cache_data(show_spinner=False, max_entries=20)
+def load_input_file(kind, version, file_path):
+    """
+    按文件类型和版本缓存的数据加载（缓存在所有会话间共享，错误信息显示在页面上）
 
-    # 创建DataFrame
-    df = pd.DataFrame(data)
+    版本标识来自input_file_versions，某个文件更新后只有该文件的缓存失效，其他文件的缓存继续使用；
+    max_entries限制文件多次更新后残留的旧版本缓存。
+    """
+    cache_misses.add(f"load_input_file:{kind}")
+    return yuce_engine.INPUT_LOADERS[kind](file_path, on_error=st.error)
 
-    # 添加年月字段
-    df['所属年月'] = df['订单日期'].dt.strftime('%Y-%m')
 
-    return df
+# 函数：加载输入文件
+def load_input_files(files):
+    """
+    检查各输入文件的版本并按版本加载，返回(文件类型 -> 版本标识, 文件类型 -> 数据)
 
+    首次加载或文件更新后需要解析的文件先在进程池中并行解析并写入解析缓存，
+    随后各文件按版本从缓存加载；文件未变化时只检查文件大小和修改时间。
+    本会话已加载过的版本不再交给进程池（load_input_file的缓存已命中）。
+    """
+    with perf_stage("检查文件版本"):
+        versions = yuce_engine.input_file_versions(files)
+    loaded_versions = st.session_state.setdefault('loaded_input_versions', set())
+    loaded = {}
+    with st.spinner("正在加载数据文件..."):
+        # 解析出错的文件不写入缓存，由load_input_file在当前进程中重新加载并显示错误信息
+        with perf_stage("并行解析文件"):
+            yuce_engine.parse_input_files({kind: path for kind, path in files.items()
+                                           if (kind, versions[kind]) not in loaded_versions},
+                                          return_data=False)
+        for kind, path in files.items():
+            with perf_stage(f"加载文件：{kind}") as record:
+                loaded[kind] = load_input_file(kind, versions[kind], path)
+                record['cache'] = cache_status(f"load_input_file:{kind}")
+                data = loaded[kind][1] if kind == 'inventory' else loaded[kind]
+                record['rows'] = len(data)
+            loaded_versions.add((kind, versions[kind]))
+    return versions, loaded
+
+
+# 函数：提示已更新的输入文件
+def notify_updated_files(versions, labels):
+    """与本会话上次加载时的版本比较，在侧边栏提示内容有更新并已重新加载的文件"""
+    previous = st.session_state.get('input_versions')
+    st.session_state['input_versions'] = versions
+    if previous is None:
+        return
+    updated = [labels[kind] for kind, version in versions.items()
+               if kind in previous and previous[kind] != version]
+    if updated:
+        st.sidebar.info(f"检测到文件更新，已重新加载：{'、'.join(updated)}")
 
-# 函数：创建示例预测数据
-def load_sample_forecast_data():
-    """创建示例预测数据"""
-    # 产品代码列表
-    product_codes = [
-        'F0104L', 'F01E4P', 'F01E6C', 'F3406B', 'F3409N', 'F3411A',
-        'F01E4B', 'F0183F', 'F0110C', 'F0104J', 'F0104M', 'F0104P',
-        'F0110A', 'F0110B', 'F0115C', 'F0101P'
-    ]
 
-    # 区域列表
-    regions = ['北', '南', '东', '西']
+# 函数：获取上传文件路径
+def uploaded_file_path(uploaded_file):
+    """
+    将上传文件按内容摘要保存（见save_uploaded_file）并返回其路径，未上传时返回None
 
-    # 销售员列表
-    sales_people = ['李根', '张伟', '王芳', '刘涛', '陈明', '孙杨']
+    同一次上传只读取和哈希一次内容；不同会话上传相同内容的文件得到同一路径，
+    因此按路径缓存的解析结果在会话间共享。
+    """
+    if uploaded_file is None:
+        return None
+    upload_paths = st.session_state.setdefault('upload_paths', {})
+    if uploaded_file.file_id not in upload_paths:
+        upload_paths[uploaded_file.file_id] = yuce_engine.save_uploaded_file(uploaded_file.getvalue(),
+                                                                             uploaded_file.name)
+    return upload_paths[uploaded_file.file_id]
 
-    # 生成月份范围
-    start_date = datetime(2023, 9, 1)
-    end_date = datetime(2025, 2, 1)
-    month_range = pd.date_range(start=start_date, end=end_date, freq='MS')
 
-    # 创建数据
-    data = []
-    for month in month_range:
-        month_str = month.strftime('%Y-%m')
+# 函数：读取夜间快照
+@st.cache_data(show_spinner="正在读取夜间快照...")
+def load_snapshot(snapshot_dir):
+    """读取夜间批处理写入的快照（快照目录写入后不再修改，按目录缓存）"""
+    cache_misses.add('load_snapshot')
+    return yuce_engine.read_snapshot(snapshot_dir)
 
-        for region in regions:
-            for sales_person in sales_people:
-                for product_code in product_codes:
-                    # 使用正态分布生成预测值，使其变化更自然
-                    forecast = max(0, np.random.normal(150, 50))
 
-                    # 有些产品可能没有预测
-                    if np.random.random() > 0.1:  # 90%的概率有预测
-                        data.append({
-                            '所属区域': region,
-                            '销售员': sales_person,
-                            '所属年月': month_str,
-                            '产品代码': product_code,
-                            '预计销售量': round(forecast)
-                        })
+# 函数：从SQLite数据库加载数据
+@st.cache_data(show_spinner="正在从数据库读取数据...")
+def load_sqlite_inputs(db_version, analysis_date, db_path=SQLITE_DB_PATH):
+    """
+    从SQLite数据库读取汇总后的分析输入（按数据库版本和分析日期缓存，批次库龄随日期变化）
 
-    # 创建DataFrame
-    df = pd.DataFrame(data)
-    return df
+    筛选和汇总在数据库中完成，缓存中只保留月度出货汇总、批次相关产品的日出货和预测汇总。
+    """
+    cache_misses.add('load_sqlite_inputs')
+    return yuce_sqlstore.load_sql_inputs(db_path)
 
 
-# 函数：加载库存数据
+# 函数：缓存的产品增长率计算
 @st.cache_data
-def load_inventory_data(file_path=None):
-    """加载库存数据和批次信息"""
-    try:
-        # 默认路径或示例数据
-        if file_path is None or not os.path.exists(file_path):
-            # 创建示例数据
-            return load_sample_inventory_data()
-
-        # 加载数据
-        inventory_raw = pd.read_excel(file_path, header=0)
-
-        # 确定列名形式
-        expected_columns = ['物料', '描述', '现有库存', '已分配量', '现有库存可订量', '待入库量', '本月剩余可订量',
-                            '库位', '生产日期', '生产批号', '数量']
-
-        # 检查列名是否存在
-        missing_main_columns = [col for col in expected_columns[:7] if
-                                not any(col in str(c) for c in inventory_raw.columns)]
-        if missing_main_columns:
-            st.error(f"库存文件缺少必要的主要列: {', '.join(missing_main_columns)}。使用示例数据进行演示。")
-            return load_sample_inventory_data()
-
-        # 处理第一层数据（产品信息）
-        product_rows = inventory_raw[inventory_raw.iloc[:, 0].notna()]
-        inventory_data = product_rows.iloc[:, :7].copy()
-        inventory_data.columns = ['产品代码', '描述', '现有库存', '已分配量',
-                                  '现有库存可订量', '待入库量', '本月剩余可订量']
-
-        # 创建批次信息
-        batch_with_product = []
-        product_code = None
-        product_description = None
-
-        for i, row in inventory_raw.iterrows():
-            if pd.notna(row.iloc[0]):
-                # 这是产品行
-                product_code = row.iloc[0]
-                product_description = row.iloc[1]
-            elif i < len(inventory_raw) - 1 and pd.notna(row.iloc[7]):
-                # 这是批次行
-                batch_row = row.iloc[7:].copy()
-                batch_row_with_product = pd.Series([product_code, product_description] + batch_row.tolist())
-                batch_with_product.append(batch_row_with_product)
-
-        # 创建批次数据DataFrame
-        if batch_with_product:
-            batch_data = pd.DataFrame(batch_with_product)
-            batch_data.columns = ['产品代码', '描述', '库位', '生产日期', '生产批号', '数量']
-
-            # 转换日期列
-            batch_data['生产日期'] = pd.to_datetime(batch_data['生产日期'], errors='coerce')
-
-            # 转换数量列为数字
-            batch_data['数量'] = pd.to_numeric(batch_data['数量'], errors='coerce')
-
-            # 计算批次价值和库龄
-            today = datetime.now().date()
-            batch_data['库龄'] = batch_data['生产日期'].apply(
-                lambda x: (today - x.date()).days if pd.notna(x) else 0
-            )
-
-            return inventory_data, batch_data
-
-        return inventory_data, pd.DataFrame(
-            columns=['产品代码', '描述', '库位', '生产日期', '生产批号', '数量', '库龄'])
-
-    except Exception as e:
-        st.error(f"加载库存数据时出错: {str(e)}。使用示例数据进行演示。")
-        return load_sample_inventory_data()
-
-
-# 函数：创建示例库存数据
-def load_sample_inventory_data():
-    """创建示例库存数据和批次信息"""
-    # 产品代码列表
-    product_codes = [
-        'F0101P', 'F0104J', 'F0104L', 'F0104M', 'F0104P',
-        'F0110A', 'F0110C', 'F01C5D', 'F01E4B', 'F01A3C'
-    ]
-
-    # 描述列表
-    descriptions = [
-        '口力汉堡90G直立袋装-中国', '口力比萨XXL45G盒装-中国', '口力比萨68G袋装-中国',
-        '口力比萨1KG散装-中国', '口力比萨24片盒装-中国', '口力薯条65g-中国',
-        '口力奶酪90g-中国', '口力欢乐派对100G袋装（永旺专供）-中国',
-        '口力汉堡137g-中国', '口力芝士蛋糕24片盒装-中国'
-    ]
-
-    # 创建库存数据
-    inventory_data = []
-    for code, desc in zip(product_codes, descriptions):
-        current_stock = np.random.randint(200, 3000)
-        allocated = np.random.randint(0, 300)
-        available = current_stock - allocated
-        pending = np.random.randint(0, 500)
-        remaining = available + pending
-
-        inventory_data.append({
-            '产品代码': code,
-            '描述': desc,
-            '现有库存': current_stock,
-            '已分配量': allocated,
-            '现有库存可订量': available,
-            '待入库量': pending,
-            '本月剩余可订量': remaining
-        })
-
-    # 创建批次数据
-    batch_data = []
-    today = datetime.now().date()
-
-    for i, (code, desc) in enumerate(zip(product_codes, descriptions)):
-        # 为每个产品生成2-5个批次
-        num_batches = np.random.randint(2, 6)
-
-        for j in range(num_batches):
-            # 生成随机的生产日期
-            days_ago = np.random.randint(10, 300)  # 10-300天前的批次
-            production_date = today - timedelta(days=days_ago)
-
-            # 生成批号
-            batch_number = f"{production_date.strftime('%Y%m%d')}L:0{75000 + i * 100 + j}"
-
-            # 生成随机数量
-            quantity = np.random.randint(20, 1000)
-
-            batch_data.append({
-                '产品代码': code,
-                '描述': desc,
-                '库位': f"DC-{np.random.randint(0, 10):03d}",
-                '生产日期': production_date,
-                '生产批号': batch_number,
-                '数量': quantity,
-                '库龄': days_ago
-            })
-
-    # 创建DataFrames
-    inventory_df = pd.DataFrame(inventory_data)
-    batch_df = pd.DataFrame(batch_data)
-
-    # 特别处理F0101P的数据，让它符合附件三中的例子
-    if 'F0101P' in inventory_df['产品代码'].values:
-        # 找到F0101P的索引
-        idx = inventory_df[inventory_df['产品代码'] == 'F0101P'].index[0]
-        inventory_df.loc[idx, '现有库存'] = 2581
-        inventory_df.loc[idx, '已分配量'] = 20
-        inventory_df.loc[idx, '现有库存可订量'] = 2561
-        inventory_df.loc[idx, '本月剩余可订量'] = 2561
-
-        # 为F0101P创建特定批次
-        f0101p_batches = [
-            {
-                '产品代码': 'F0101P',
-                '描述': '口力汉堡90G直立袋装-中国',
-                '库位': 'DC-000',
-                '生产日期': datetime(2025, 3, 5),
-                '生产批号': '20250305L:075064',
-                '数量': 654,
-                '库龄': 68
-            }
-        ]
-
-        # 找到并替换F0101P批次
-        batch_df = batch_df[batch_df['产品代码'] != 'F0101P']
-        for batch in f0101p_batches:
-            batch_df = pd.concat([batch_df, pd.DataFrame([batch])], ignore_index=True)
-
-    # 特别处理F01C5D的数据，让它符合附件三中的例子
-    if 'F01C5D' in inventory_df['产品代码'].values:
-        # 为F01C5D创建特定批次
-        f01c5d_batches = [
-            {
-                '产品代码': 'F01C5D',
-                '描述': '口力欢乐派对100G袋装（永旺专供）-中国',
-                '库位': 'DC-000',
-                '生产日期': datetime(2024, 9, 10),
-                '生产批号': '20240910L:074123',
-                '数量': 252,
-                '库龄': 244
-            }
-        ]
-
-        # 找到并替换F01C5D批次
-        batch_df = batch_df[batch_df['产品代码'] != 'F01C5D']
-        for batch in f01c5d_batches:
-            batch_df = pd.concat([batch_df, pd.DataFrame([batch])], ignore_index=True)
-
-    # 特别处理F01A3C的数据，让它符合附件三中的例子
-    if 'F01A3C' in inventory_df['产品代码'].values:
-        # 为F01A3C创建特定批次
-        f01a3c_batches = [
-            {
-                '产品代码': 'F01A3C',
-                '描述': '口力芝士蛋糕24片盒装-中国',
-                '库位': 'DC-000',
-                '生产日期': datetime(2024, 10, 7),
-                '生产批号': '20241007L:074234',
-                '数量': 16,
-                '库龄': 217
-            }
-        ]
-
-        # 找到并替换F01A3C批次
-        batch_df = batch_df[batch_df['产品代码'] != 'F01A3C']
-        for batch in f01a3c_batches:
-            batch_df = pd.concat([batch_df, pd.DataFrame([batch])], ignore_index=True)
-
-    return inventory_df, batch_df
-
-
-# 函数：获取共同月份
-def get_common_months(actual_df, forecast_df):
-    """获取两个数据集共有的月份"""
-    actual_months = set(actual_df['所属年月'].unique())
-    forecast_months = set(forecast_df['所属年月'].unique())
-    common_months = sorted(list(actual_months.intersection(forecast_months)))
-    return common_months
-
-
-# 函数：获取最近3个月
-def get_last_three_months():
-    today = datetime.now()
-    current_month = today.replace(day=1)
-
-    last_month = current_month - timedelta(days=1)
-    last_month = last_month.replace(day=1)
-
-    two_months_ago = last_month - timedelta(days=1)
-    two_months_ago = two_months_ago.replace(day=1)
+def cached_product_growth(actual_version, _actual_monthly, regions=None, months=None, growth_min=-100, growth_max=500):
+    """
+    按出货数据版本缓存的产品增长率计算
 
-    months = []
-    for dt in [two_months_ago, last_month, current_month]:
-        months.append(dt.strftime('%Y-%m'))
+    缓存键由数据版本标识（见data_version）和筛选条件组成，带下划线前缀的数据参数不参与哈希，
+    命中缓存时无需对整表计算哈希。
+    """
+    cache_misses.add('cached_product_growth')
+    return calculate_product_growth(_actual_monthly, regions, months, growth_min, growth_max)
 
-    return months
 
+# 函数：获取产品增长率
+def product_growth_for_view(actual_version, actual_summary, regions, months, snapshot_results=None):
+    """筛选条件与快照预计算时一致时直接使用快照中的产品增长率，否则按数据版本缓存计算"""
+    if snapshot_results is not None and snapshot_results['product_growth_filters'] == {
+        'regions': list(regions), 'months': list(months)
+    }:
+        return snapshot_results['product_growth']
+    return cached_product_growth(actual_version, actual_summary, regions=regions, months=months)
 
-# 函数：筛选数据
-def filter_data(data, months=None, regions=None):
-    """统一的数据筛选函数"""
-    filtered_data = data.copy()
 
-    if months and len(months) > 0:
-        filtered_data = filtered_data[filtered_data['所属年月'].isin(months)]
+# 函数：缓存的批次风险分析
+@st.cache_data(show_spinner="正在分析批次风险...")
+def cached_batch_risk_analysis(batch_version, actual_version, forecast_version, analysis_date,
+                               _batch_data, _actual_data, _forecast_data):
+    """
+    按输入数据版本缓存的批次风险分析，结果在所有会话间共享
 
-    if regions and len(regions) > 0:
-        filtered_data = filtered_data[filtered_data['所属区域'].isin(regions)]
+    缓存键只包含批次、出货、预测数据的版本标识和分析日期（库龄与清库风险随日期变化），
+    带下划线前缀的数据参数不参与哈希，因此重复运行时无需对整表计算哈希。
+    单价只影响批次价值，由value_batches单独计算，单价更新时不重新分析。
+    """
+    cache_misses.add('cached_batch_risk_analysis')
+    return analyze_batch_risk(_batch_data, _actual_data, _forecast_data, {})
 
-    return filtered_data
 
+# 函数：缓存的数据处理
+@st.cache_data(show_spinner="正在汇总预测与出货数据...")
+def cached_process_data(actual_version, forecast_version, _actual_data, _forecast_data, _product_info):
+    """按出货和预测数据版本缓存的数据处理（销售立方体和准确率），产品信息和单价更新时不重新计算"""
+    cache_misses.add('cached_process_data')
 
-# 函数：处理和分析数据
-def process_data(actual_df, forecast_df, product_info_df):
-    """处理数据并计算关键指标"""
-    # 按月份、区域、产品码汇总数据
-    actual_monthly = actual_df.groupby(['所属年月', '所属区域', '产品代码']).agg({
-        '求和项:数量（箱）': 'sum'
-    }).reset_index()
+    # 筛选共有月份数据
+    common_months = get_common_months(_actual_data, _forecast_data)
+    actual_data_filtered = _actual_data[_actual_data['所属年月'].isin(common_months)]
+    forecast_data_filtered = _forecast_data[_forecast_data['所属年月'].isin(common_months)]
 
-    forecast_monthly = forecast_df.groupby(['所属年月', '所属区域', '产品代码']).agg({
-        '预计销售量': 'sum'
-    }).reset_index()
+    return process_data(actual_data_filtered, forecast_data_filtered, _product_info)
 
-    # 按销售员细分的预测数据
-    forecast_by_salesperson = forecast_df.groupby(['所属年月', '所属区域', '销售员', '产品代码']).agg({
-        '预计销售量': 'sum'
-    }).reset_index()
 
-    # 实际按销售员细分的数据
-    actual_by_salesperson = actual_df.groupby(['所属年月', '所属区域', '申请人', '产品代码']).agg({
-        '求和项:数量（箱）': 'sum'
-    }).reset_index()
+# 函数：缓存的销售立方体切片
+@st.cache_data(show_spinner=False, max_entries=200)
+def cached_cube_view(actual_version, forecast_version, by, months, regions, _sales_cube):
+    """按出货和预测数据版本及筛选条件缓存的立方体切片，切回标签页或恢复筛选条件时直接复用"""
+    cache_misses.add('cached_cube_view')
+    return cube_aggregate(_sales_cube, by, months, regions)
 
-    # 重命名列，使合并更容易
-    actual_by_salesperson = actual_by_salesperson.rename(columns={'申请人': '销售员'})
 
-    # 合并预测和实际数据
-    # 按区域和产品级别
-    merged_monthly = pd.merge(
-        actual_monthly,
-        forecast_monthly,
-        on=['所属年月', '所属区域', '产品代码'],
-        how='outer'
-    )
+# 函数：获取当前数据的立方体切片
+def cube_view(by, months=None, regions=None):
+    """各标签页按筛选条件取销售立方体的汇总视图，参数同cube_aggregate"""
+    return cached_cube_view(actual_version, forecast_version, list(by), list(months or []), list(regions or []),
+                            sales_cube)
 
-    # 按销售员级别
-    merged_by_salesperson = pd.merge(
-        actual_by_salesperson,
-        forecast_by_salesperson,
-        on=['所属年月', '所属区域', '销售员', '产品代码'],
-        how='outer'
-    )
 
-    # 填充缺失值为0
-    for df in [merged_monthly, merged_by_salesperson]:
-        df['求和项:数量（箱）'] = df['求和项:数量（箱）'].fillna(0)
-        df['预计销售量'] = df['预计销售量'].fillna(0)
-
-    # 计算差异和准确率
-    for df in [merged_monthly, merged_by_salesperson]:
-        # 差异
-        df['数量差异'] = df['求和项:数量（箱）'] - df['预计销售量']
-
-        # 差异率 (避免除以零)
-        df['数量差异率'] = np.where(
-            df['求和项:数量（箱）'] > 0,
-            df['数量差异'] / df['求和项:数量（箱）'] * 100,
-            np.where(
-                df['预计销售量'] > 0,
-                -100,  # 预测有值但实际为0
-                0  # 预测和实际都是0
-            )
-        )
+# 函数：缓存的图表
+@st.cache_data(show_spinner=False, max_entries=100)
+def cached_chart(chart_name, data_key, _chart_function, _chart_args):
+    """按图表名称、数据版本和筛选条件缓存的Plotly图表，图表数据只在数据或筛选条件变化时重新构建"""
+    cache_misses.add('cached_chart')
+    return _chart_function(*_chart_args)
 
-        # 准确率
-        df['数量准确率'] = np.where(
-            (df['求和项:数量（箱）'] > 0) | (df['预计销售量'] > 0),
-            np.maximum(0, 100 - np.abs(df['数量差异率'])) / 100,
-            1  # 预测和实际都是0时准确率为100%
-        )
 
-    # 计算总体准确率
-    national_accuracy = calculate_national_accuracy(merged_monthly)
-    regional_accuracy = calculate_regional_accuracy(merged_monthly)
-
-    # 计算占比80%的SKU
-    national_top_skus = calculate_top_skus(merged_monthly, by_region=False)
-    regional_top_skus = calculate_top_skus(merged_monthly, by_region=True)
-
-    return {
-        'actual_monthly': actual_monthly,
-        'forecast_monthly': forecast_monthly,
-        'merged_monthly': merged_monthly,
-        'merged_by_salesperson': merged_by_salesperson,
-        'national_accuracy': national_accuracy,
-        'regional_accuracy': regional_accuracy,
-        'national_top_skus': national_top_skus,
-        'regional_top_skus': regional_top_skus
-    }
+# 函数：获取批次风险图表
+def risk_chart_view(chart_function, *chart_args, filters=()):
+    """按批次风险结果版本和筛选条件缓存create_*_chart的结果，filters为生成chart_args所用的筛选条件"""
+    return cached_chart(chart_function.__name__, (risk_version, filters), chart_function, chart_args)
 
 
-# 函数：计算全国准确率
-def calculate_national_accuracy(merged_df):
-    """计算全国的预测准确率"""
-    # 按月份汇总
-    monthly_summary = merged_df.groupby('所属年月').agg({
-        '求和项:数量（箱）': 'sum',
-        '预计销售量': 'sum'
-    }).reset_index()
+# 函数：翻页按钮回调
+def turn_chart_page(page_key, step):
+    """在按钮回调中修改页码，点击后无需再额外调用 st.rerun()"""
+    st.session_state[page_key] += step
 
-    # 计算差异
-    monthly_summary['数量差异'] = monthly_summary['求和项:数量（箱）'] - monthly_summary['预计销售量']
 
-    # 使用统一函数计算准确率
-    monthly_summary['数量准确率'] = monthly_summary.apply(
-        lambda row: calculate_unified_accuracy(row['求和项:数量（箱）'], row['预计销售量']),
-        axis=1
-    )
+# 函数：创建图表分页器
+@st.fragment
+@timed_fragment("图表分页")
+def display_chart_paginator(df, chart_function, page_size, title, key_prefix):
+    """创建图表分页器（独立片段，翻页时只重新执行本分页器并绘制当前页的切片）"""
+    total_items = len(df)
+    total_pages = max((total_items + page_size - 1) // page_size, 1)
+    page_key = f"{key_prefix}_current_page"
 
-    # 计算整体平均准确率 (使用安全均值计算)
-    overall = {
-        '数量准确率': safe_mean(monthly_summary['数量准确率'], 0)
-    }
+    if page_key not in st.session_state:
+        st.session_state[page_key] = 0
 
-    return {
-        'monthly': monthly_summary,
-        'overall': overall
-    }
+    # 确保当前页在有效范围内
+    st.session_state[page_key] = min(max(st.session_state[page_key], 0), total_pages - 1)
 
+    # 创建分页控制
+    col1, col2, col3 = st.columns([1, 3, 1])
 
-# 函数：计算区域准确率
-def calculate_regional_accuracy(merged_df):
-    """计算各区域的预测准确率"""
-    # 按月份和区域汇总
-    region_monthly_summary = merged_df.groupby(['所属年月', '所属区域']).agg({
-        '求和项:数量（箱）': 'sum',
-        '预计销售量': 'sum'
-    }).reset_index()
+    with col1:
+        st.button("上一页", key=f"{key_prefix}_prev", disabled=st.session_state[page_key] <= 0,
+                  on_click=turn_chart_page, args=(page_key, -1))
 
-    # 计算差异
-    region_monthly_summary['数量差异'] = region_monthly_summary['求和项:数量（箱）'] - region_monthly_summary[
-        '预计销售量']
+    with col2:
+        st.markdown(
+            f"<div style='text-align:center' class='pagination-info'>第 {st.session_state[page_key] + 1} 页，共 {total_pages} 页</div>",
+            unsafe_allow_html=True)
 
-    # 使用统一函数计算准确率
-    region_monthly_summary['数量准确率'] = region_monthly_summary.apply(
-        lambda row: calculate_unified_accuracy(row['求和项:数量（箱）'], row['预计销售量']),
-        axis=1
-    )
+    with col3:
+        st.button("下一页", key=f"{key_prefix}_next", disabled=st.session_state[page_key] >= total_pages - 1,
+                  on_click=turn_chart_page, args=(page_key, 1))
 
-    # 按区域计算平均准确率 (使用安全均值计算)
-    region_overall = region_monthly_summary.groupby('所属区域').agg({
-        '数量准确率': lambda x: safe_mean(x, 0)
-    }).reset_index()
+    # 获取当前页的数据
+    start_idx = st.session_state[page_key] * page_size
+    end_idx = min(start_idx + page_size, total_items)
+    page_data = df.iloc[start_idx:end_idx]
 
-    return {
-        'region_monthly': region_monthly_summary,
-        'region_overall': region_overall
-    }
+    # 显示图表
+    chart_function(page_data, title)
 
 
-# 函数：计算产品增长率
-@st.cache_data
-def calculate_product_growth(actual_monthly, regions=None, months=None, growth_min=-100, growth_max=500):
+# 函数：导出完整分析
+def export_full_analysis(processed_data, batch_risk_analysis, actual_summary, snapshot_results=None):
     """
-    计算产品销量增长率，用于生成备货建议
+    下载按钮的延迟数据源，点击下载时才生成多工作表Excel
 
-    计算逻辑：
-    1. 优先计算同比增长率：当前月与去年同月比较
-    2. 若无同比数据，则计算环比增长率：当前月与上月比较
-    3. 根据增长率给出备货建议
-
-    参数:
-    - actual_monthly: 实际销售数据
-    - regions: 区域筛选
-    - months: 月份筛选
-    - growth_min/max: 增长率异常值截断范围
-
-    返回:
-    - all_growth: 所有产品增长率数据
-    - latest_growth: 最新月份的增长率数据，包含趋势与备货建议
+    产品增长率与夜间快照一致，按全部区域和默认月份计算（有快照时直接使用快照中的结果）。
     """
-    # 确保数据按时间排序
-    actual_monthly['所属年月'] = pd.to_datetime(actual_monthly['所属年月'])
-    actual_monthly = actual_monthly.sort_values('所属年月')
-
-    # 应用区域筛选
-    if regions and len(regions) > 0:
-        filtered_data = actual_monthly[actual_monthly['所属区域'].isin(regions)]
+    if snapshot_results is not None:
+        product_growth = snapshot_results['product_growth']
     else:
-        filtered_data = actual_monthly  # 如果没有区域筛选，使用全部数据
-
-    # 应用月份筛选
-    if months and len(months) > 0:
-        months_datetime = pd.to_datetime(months)
-        filtered_data = filtered_data[filtered_data['所属年月'].isin(months_datetime)]
-
-    # 按产品和月份汇总筛选后的区域销量
-    filtered_monthly_sales = filtered_data.groupby(['所属年月', '产品代码']).agg({
-        '求和项:数量（箱）': 'sum'
-    }).reset_index()
-
-    # 创建年和月字段
-    filtered_monthly_sales['年'] = filtered_monthly_sales['所属年月'].dt.year
-    filtered_monthly_sales['月'] = filtered_monthly_sales['所属年月'].dt.month
-
-    # 准备用于计算增长率的数据结构
-    growth_data = []
-
-    # 获取所有产品的唯一列表
-    products = filtered_monthly_sales['产品代码'].unique()
-
-    # 获取所有年份和月份
-    years = filtered_monthly_sales['年'].unique()
-    years.sort()
-
-    # 检查是否有足够的数据进行增长率计算
-    if len(filtered_monthly_sales) > 0:
-        # 为每个产品计算月度增长率
-        for product in products:
-            product_data = filtered_monthly_sales[filtered_monthly_sales['产品代码'] == product]
-
-            # 按年月对产品销量进行排序
-            product_data = product_data.sort_values(['年', '月'])
-
-            # 如果产品有多个月的数据，计算环比增长率（与上月相比）
-            if len(product_data) > 1:
-                for i in range(1, len(product_data)):
-                    current_row = product_data.iloc[i]
-                    prev_row = product_data.iloc[i - 1]
-
-                    # 计算当前月环比增长率
-                    current_sales = current_row['求和项:数量（箱）']
-                    prev_sales = prev_row['求和项:数量（箱）']
-
-                    if prev_sales > 0:
-                        growth_rate = (current_sales - prev_sales) / prev_sales * 100
-                        # 限制异常值
-                        growth_rate = max(min(growth_rate, growth_max), growth_min)
-                    else:
-                        growth_rate = 0 if current_sales == 0 else 100
-
-                    # 记录环比增长率数据
-                    growth_data.append({
-                        '产品代码': product,
-                        '年': current_row['年'],
-                        '月': current_row['月'],
-                        '当月销量': current_sales,
-                        '上月销量': prev_sales,
-                        '销量增长率': growth_rate,
-                        '计算方式': '环比'  # 标记为环比计算
-                    })
-
-            # 尝试计算同期同比增长率（如果有前一年的数据）- 优先使用同比数据
-            if len(years) > 1:
-                for year in years[1:]:  # 从第二年开始
-                    prev_year = year - 1
-
-                    # 获取当前年和前一年的数据
-                    current_year_data = product_data[product_data['年'] == year]
-                    prev_year_data = product_data[product_data['年'] == prev_year]
-
-                    # 为每个月计算同比增长率
-                    for _, curr_row in current_year_data.iterrows():
-                        curr_month = curr_row['月']
-                        curr_sales = curr_row['求和项:数量（箱）']
-
-                        # 寻找前一年同月数据
-                        prev_month_data = prev_year_data[prev_year_data['月'] == curr_month]
-
-                        if not prev_month_data.empty:
-                            prev_sales = prev_month_data.iloc[0]['求和项:数量（箱）']
-
-                            if prev_sales > 0:
-                                yoy_growth_rate = (curr_sales - prev_sales) / prev_sales * 100
-                                # 限制异常值
-                                yoy_growth_rate = max(min(yoy_growth_rate, growth_max), growth_min)
-                            else:
-                                yoy_growth_rate = 0 if curr_sales == 0 else 100
-
-                            # 记录同比增长率
-                            # 优先使用同比数据（替换之前的环比数据，如果存在）
-                            existing_entry = next((item for item in growth_data if
-                                                   item['产品代码'] == product and
-                                                   item['年'] == year and
-                                                   item['月'] == curr_month), None)
-
-                            if existing_entry:
-                                existing_entry['销量增长率'] = yoy_growth_rate
-                                existing_entry['同比上年销量'] = prev_sales
-                                existing_entry['计算方式'] = '同比'  # 更新为同比计算
-                            else:
-                                growth_data.append({
-                                    '产品代码': product,
-                                    '年': year,
-                                    '月': curr_month,
-                                    '当月销量': curr_sales,
-                                    '同比上年销量': prev_sales,
-                                    '销量增长率': yoy_growth_rate,
-                                    '计算方式': '同比'  # 标记为同比计算
-                                })
-
-    # 创建增长率DataFrame
-    growth_df = pd.DataFrame(growth_data)
-
-    # 如果有增长数据，添加趋势判断和备货建议
-    if not growth_df.empty:
-        try:
-            # 取最近一个月的增长率
-            latest_growth = growth_df.sort_values(['年', '月'], ascending=False).groupby(
-                '产品代码').first().reset_index()
-
-            # 过滤无效增长率值
-            latest_growth = latest_growth[latest_growth['销量增长率'].notna()]
-            latest_growth = latest_growth[np.isfinite(latest_growth['销量增长率'])]
-
-            if not latest_growth.empty:
-                # 添加趋势判断
-                latest_growth['趋势'] = np.where(
-                    latest_growth['销量增长率'] > 15, '强劲增长',
-                    np.where(
-                        latest_growth['销量增长率'] > 0, '增长',
-                        np.where(
-                            latest_growth['销量增长率'] > -10, '轻微下降',
-                            '显著下降'
-                        )
-                    )
-                )
-
-                # 添加备货建议
-                latest_growth['备货建议对象'] = latest_growth['销量增长率'].apply(generate_recommendation)
-                latest_growth['备货建议'] = latest_growth['备货建议对象'].apply(lambda x: x['建议'])
-                latest_growth['调整比例'] = latest_growth['备货建议对象'].apply(lambda x: x['调整比例'])
-                latest_growth['建议颜色'] = latest_growth['备货建议对象'].apply(lambda x: x['颜色'])
-                latest_growth['建议样式类'] = latest_growth['备货建议对象'].apply(lambda x: x['样式类'])
-                latest_growth['建议图标'] = latest_growth['备货建议对象'].apply(lambda x: x['图标'])
-            else:
-                # 创建空的结果框架
-                latest_growth = pd.DataFrame(columns=growth_df.columns)
-        except Exception as e:
-            # 记录错误但继续执行
-            print(f"处理增长率数据时出错: {str(e)}")
-            latest_growth = pd.DataFrame(columns=growth_df.columns)
-
-        return {
-            'all_growth': growth_df,
-            'latest_growth': latest_growth
-        }
-    else:
-        return {
-            'all_growth': pd.DataFrame(),
-            'latest_growth': pd.DataFrame()
-        }
-
-
-# 函数：计算重点SKU
-def calculate_top_skus(merged_df, by_region=False):
-    """计算占销售量80%的SKU及其准确率 - 修复空区域问题"""
-    if merged_df.empty:
-        return {} if by_region else pd.DataFrame()
-
-    if by_region:
-        # 按区域、产品汇总
-        grouped = merged_df.groupby(['所属区域', '产品代码']).agg({
-            '求和项:数量（箱）': 'sum',
-            '预计销售量': 'sum'
-        }).reset_index()
-
-        # 计算准确率
-        grouped['数量准确率'] = grouped.apply(
-            lambda row: calculate_unified_accuracy(row['求和项:数量（箱）'], row['预计销售量']),
-            axis=1
+        members = processed_data['sales_cube']['members']
+        product_growth = calculate_product_growth(
+            actual_summary, list(members['所属区域']), default_analysis_months(list(members['所属年月']))
         )
+    return analysis_workbook(processed_data, batch_risk_analysis, product_growth)
 
-        # 计算各区域的占比80%SKU
-        results = {}
-        for region in grouped['所属区域'].unique():
-            if pd.isna(region) or region is None or region == 'None':
-                continue  # 跳过空区域
-
-            region_data = grouped[grouped['所属区域'] == region].copy()
-            if region_data.empty:
-                continue  # 跳过没有数据的区域
-
-            total_sales = region_data['求和项:数量（箱）'].sum()
-            if total_sales <= 0:
-                continue  # 跳过销售量为0的区域
-
-            # 按销售量降序排序
-            region_data = region_data.sort_values('求和项:数量（箱）', ascending=False)
-
-            # 计算累计销售量和占比
-            region_data['累计销售量'] = region_data['求和项:数量（箱）'].cumsum()
-            region_data['累计占比'] = region_data['累计销售量'] / total_sales * 100
-
-            # 筛选占比80%的SKU
-            top_skus = region_data[region_data['累计占比'] <= 80].copy()
-
-            # 如果没有SKU达到80%阈值，至少取前3个SKU
-            if top_skus.empty:
-                top_skus = region_data.head(min(3, len(region_data)))
-
-            results[region] = top_skus
-
-        return results
-    else:
-        # 全国汇总
-        grouped = merged_df.groupby('产品代码').agg({
-            '求和项:数量（箱）': 'sum',
-            '预计销售量': 'sum'
-        }).reset_index()
-
-        # 计算准确率
-        grouped['数量准确率'] = grouped.apply(
-            lambda row: calculate_unified_accuracy(row['求和项:数量（箱）'], row['预计销售量']),
-            axis=1
-        )
-
-        total_sales = grouped['求和项:数量（箱）'].sum()
-        if total_sales <= 0:
-            return pd.DataFrame(columns=grouped.columns)  # 返回空DataFrame但保持列结构
-
-        # 按销售量降序排序
-        grouped = grouped.sort_values('求和项:数量（箱）', ascending=False)
-
-        # 计算累计销售量和占比 - 这里修复了列名不匹配的错误
-        grouped['累计销售量'] = grouped['求和项:数量（箱）'].cumsum()
-        grouped['累计占比'] = grouped['累计销售量'] / total_sales * 100  # 修改这里，使用"累计销售量"而不是"累计销量"
-
-        # 筛选占比80%的SKU
-        top_skus = grouped[grouped['累计占比'] <= 80].copy()
-
-        # 如果没有SKU达到80%阈值，至少取前5个SKU
-        if top_skus.empty:
-            top_skus = grouped.head(min(5, len(grouped)))
-
-        return top_skus
-
-
-# 函数：分析批次风险
-def analyze_batch_risk(batch_data, actual_data, forecast_data, prices, min_daily_sales=0.5, min_seasonal_index=0.3):
-    """
-    分析批次风险，计算批次的风险等级、清库天数和积压风险等
-
-    参数:
-    batch_data (DataFrame): 批次数据
-    actual_data (DataFrame): 实际销售数据
-    forecast_data (DataFrame): 预测数据
-    prices (dict): 产品单价字典
-    min_daily_sales (float): 最小日均销量阈值，防止清库天数计算为无穷大
-    min_seasonal_index (float): 季节性指数下限，防止季节性太低导致调整后销量接近零
-
-    返回:
-    DataFrame: 批次风险分析结果
-    """
-    if batch_data.empty:
-        return pd.DataFrame()
-
-    batch_analysis = []
-    today = datetime.now().date()
-
-    # 计算每个产品的销售指标
-    product_sales_metrics = {}
-    for product_code in batch_data['产品代码'].unique():
-        # 获取该产品的销售记录
-        product_sales = actual_data[actual_data['产品代码'] == product_code]
-
-        if len(product_sales) == 0:
-            # 无销售记录
-            product_sales_metrics[product_code] = {
-                'daily_avg_sales': 0,
-                'sales_std': 0,
-                'coefficient_of_variation': float('inf'),
-                'total_sales': 0,
-                'last_90_days_sales': 0,
-                'region_sales': {},
-                'person_sales': {}
-            }
-        else:
-            # 计算日均销量
-            total_sales = product_sales['求和项:数量（箱）'].sum()
-
-            # 计算过去90天的销量
-            ninety_days_ago = today - timedelta(days=90)
-            recent_sales = product_sales[product_sales['订单日期'].dt.date >= ninety_days_ago]
-            recent_sales_total = recent_sales['求和项:数量（箱）'].sum() if len(recent_sales) > 0 else 0
-
-            # 计算日均销量
-            # 使用从最早订单到今天的天数作为分母
-            days_range = (today - product_sales['订单日期'].min().date()).days + 1
-            daily_avg_sales = total_sales / days_range if days_range > 0 else 0
-
-            # 计算日销量标准差
-            # 首先构建每日销量时间序列
-            daily_sales = product_sales.groupby(product_sales['订单日期'].dt.date)['求和项:数量（箱）'].sum()
-
-            # 计算标准差
-            sales_std = daily_sales.std() if len(daily_sales) > 1 else 0
-
-            # 计算变异系数（波动系数）
-            coefficient_of_variation = sales_std / daily_avg_sales if daily_avg_sales > 0 else float('inf')
-
-            # 按区域和销售人员分组统计
-            region_sales = product_sales.groupby('所属区域')['求和项:数量（箱）'].sum().to_dict()
-            person_sales = product_sales.groupby('申请人')['求和项:数量（箱）'].sum().to_dict()
-
-            # 存储结果
-            product_sales_metrics[product_code] = {
-                'daily_avg_sales': daily_avg_sales,
-                'sales_std': sales_std,
-                'coefficient_of_variation': coefficient_of_variation,
-                'total_sales': total_sales,
-                'last_90_days_sales': recent_sales_total,
-                'region_sales': region_sales,
-                'person_sales': person_sales
-            }
-
-    # 计算每个产品的季节性指数
-    seasonal_indices = {}
-    for product_code in batch_data['产品代码'].unique():
-        product_sales = actual_data[actual_data['产品代码'] == product_code]
-
-        if len(product_sales) > 0:
-            # 按月分组销量
-            product_sales['月份'] = product_sales['订单日期'].dt.month
-            monthly_sales = product_sales.groupby('月份')['求和项:数量（箱）'].sum()
-
-            if len(monthly_sales) > 1:
-                # 计算平均月销量
-                avg_monthly_sales = monthly_sales.mean()
-
-                # 当前月份的季节性指数
-                current_month = today.month
-                if current_month in monthly_sales.index:
-                    seasonal_index = monthly_sales[current_month] / avg_monthly_sales
-                else:
-                    seasonal_index = 1.0  # 无数据时默认为1
-            else:
-                seasonal_index = 1.0  # 只有一个月的数据，无法计算季节性
-        else:
-            seasonal_index = 1.0  # 无销售数据默认为1
 
-        # 应用季节性指数下限，避免因季节性极低导致的问题
-        seasonal_index = max(seasonal_index, min_seasonal_index)
-        seasonal_indices[product_code] = seasonal_index
+# 风险程度对应的颜色样式
+RISK_LEVEL_CLASSES = {
+    '极高风险': 'risk-extreme-high',
+    '高风险': 'risk-high',
+    '中风险': 'risk-medium',
+    '低风险': 'risk-low'
+}
 
-    # 为每个批次计算风险指标
-    for _, batch in batch_data.iterrows():
-        product_code = batch['产品代码']
-        batch_date = batch['生产日期']
-        batch_qty = batch['数量']
-        batch_age = batch['库龄'] if '库龄' in batch.index else (today - batch_date.date()).days
-
-        # 获取销售指标
-        sales_metrics = product_sales_metrics.get(product_code, {
-            'daily_avg_sales': 0,
-            'sales_std': 0,
-            'coefficient_of_variation': float('inf'),
-            'total_sales': 0,
-            'last_90_days_sales': 0,
-            'region_sales': {},
-            'person_sales': {}
-        })
-
-        # 获取季节性指数
-        seasonal_index = seasonal_indices.get(product_code, 1.0)
-
-        # 获取产品单价并计算批次价值
-        unit_price = prices.get(product_code, 50.0)
-        batch_value = batch_qty * unit_price
-
-        # 计算预计清库天数
-        daily_avg_sales = sales_metrics['daily_avg_sales']
-
-        # 考虑季节性调整，并应用最小销量阈值
-        daily_avg_sales_adjusted = max(daily_avg_sales * seasonal_index, min_daily_sales)
-
-        # 计算清库天数和积压风险
-        if daily_avg_sales_adjusted > 0:
-            days_to_clear = batch_qty / daily_avg_sales_adjusted
-
-            # 计算风险百分比
-            one_month_risk = calculate_risk_percentage(days_to_clear, batch_age, 30)
-            two_month_risk = calculate_risk_percentage(days_to_clear, batch_age, 60)
-            three_month_risk = calculate_risk_percentage(days_to_clear, batch_age, 90)
-        else:
-            days_to_clear = float('inf')
-            one_month_risk = 100
-            two_month_risk = 100
-            three_month_risk = 100
-
-        # 根据复杂的风险评估逻辑确定风险等级和风险得分
-        # 改进风险等级评估逻辑 - 使用综合评分方法
-        risk_score = 0
-
-        # 库龄因素 (0-40分)
-        if batch_age > 90:
-            risk_score += 40
-        elif batch_age > 60:
-            risk_score += 30
-        elif batch_age > 30:
-            risk_score += 20
-        else:
-            risk_score += 10
-
-        # 清库天数因素 (0-40分)
-        if days_to_clear == float('inf'):
-            risk_score += 40
-        elif days_to_clear > 180:  # 半年以上
-            risk_score += 35
-        elif days_to_clear > 90:
-            risk_score += 30
-        elif days_to_clear > 60:
-            risk_score += 20
-        elif days_to_clear > 30:
-            risk_score += 10
-
-        # 销量波动系数 (0-10分)
-        if sales_metrics['coefficient_of_variation'] > 2.0:
-            risk_score += 10
-        elif sales_metrics['coefficient_of_variation'] > 1.0:
-            risk_score += 5
-
-        # 根据总分确定风险等级
-        if risk_score >= 80:
-            risk_level = "极高风险"
-        elif risk_score >= 60:
-            risk_level = "高风险"
-        elif risk_score >= 40:
-            risk_level = "中风险"
-        elif risk_score >= 20:
-            risk_level = "低风险"
-        else:
-            risk_level = "极低风险"
-
-        # 生成建议措施
-        if risk_level == "极高风险":
-            recommendation = "紧急清理：考虑折价促销"
-        elif risk_level == "高风险":
-            recommendation = "优先处理：降价促销或转仓调配"
-        elif risk_level == "中风险":
-            recommendation = "密切监控：调整采购计划"
-        elif risk_level == "低风险":
-            recommendation = "常规管理：定期审查库存周转"
-        else:
-            recommendation = "维持现状：正常库存水平"
-
-        # 确定积压原因
-        stocking_reasons = []
-        if batch_age > 60:
-            stocking_reasons.append("库龄过长")
-        if sales_metrics['coefficient_of_variation'] > 1.0:
-            stocking_reasons.append("销量波动大")
-        if seasonal_index < 0.8:
-            stocking_reasons.append("季节性影响")
-        if not stocking_reasons:
-            stocking_reasons.append("正常库存")
-
-        # 获取责任区域和责任人
-        responsible_region, responsible_person, responsibility_summary = analyze_responsibility(
-            product_code, batch_date, sales_metrics, forecast_data, actual_data, batch_qty
-        )
 
-        # 添加批次分析结果
-        batch_analysis.append({
-            '产品代码': product_code,
-            '描述': batch['描述'],
-            '批次日期': batch_date.date(),
-            '批次库存': batch_qty,
-            '库龄': batch_age,
-            '批次价值': batch_value,
-            '日均出货': round(daily_avg_sales, 2),
-            '出货波动系数': round(sales_metrics['coefficient_of_variation'], 2),
-            '预计清库天数': days_to_clear if days_to_clear != float('inf') else float('inf'),
-            '一个月积压风险': f"{round(one_month_risk, 1)}%",
-            '两个月积压风险': f"{round(two_month_risk, 1)}%",
-            '三个月积压风险': f"{round(three_month_risk, 1)}%",
-            '积压原因': '，'.join(stocking_reasons),
-            '季节性指数': round(seasonal_index, 2),
-            '责任区域': responsible_region,
-            '责任人': responsible_person,
-            '责任分析摘要': responsibility_summary,
-            '风险程度': risk_level,
-            '风险得分': risk_score,
-            '建议措施': recommendation
-        })
-
-    # 创建DataFrame并排序
-    batch_df = pd.DataFrame(batch_analysis)
-
-    # 按照风险程度和库龄排序
-    risk_order = {
-        "极高风险": 0,
-        "高风险": 1,
-        "中风险": 2,
-        "低风险": 3,
-        "极低风险": 4
-    }
+# 函数：创建带有颜色标记的风险等级
+def highlight_risk(risk_level):
+    """返回带风险等级颜色样式的HTML标签"""
+    return f'<span class="{RISK_LEVEL_CLASSES.get(risk_level, "risk-extreme-low")}">{risk_level}</span>'
 
-    if not batch_df.empty:
-        batch_df['风险排序'] = batch_df['风险程度'].map(risk_order)
-        batch_df = batch_df.sort_values(by=['风险排序', '库龄'], ascending=[True, False])
-        batch_df = batch_df.drop(columns=['风险排序'])
 
-    return batch_df
+# 函数：重置表格页码
+def reset_table_page(page_key):
+    """排序或检索条件变化时回到第一页"""
+    st.session_state[page_key] = 0
 
 
-# 函数：分析责任归属
-def analyze_responsibility(product_code, batch_date, sales_metrics, forecast_df, actual_df, batch_qty):
+# 函数：显示批次风险详情表
+@st.fragment
+@timed_fragment("风险批次表格")
+def display_risk_table(risk_data, display_columns, key_prefix, page_size_options=(20, 50, 100)):
     """
-    分析批次库存的责任归属
+    分页显示批次风险详情表（独立片段），检索、排序和分页都在服务端完成，只格式化并发送当前页
 
     参数:
-    product_code (str): 产品代码
-    batch_date (datetime): 批次生产日期
-    sales_metrics (dict): 产品销售指标
-    forecast_df (DataFrame): 预测数据
-    actual_df (DataFrame): 实际销售数据
-    batch_qty (float): 批次库存数量
-
-    返回:
-    tuple: (责任区域, 责任人, 责任分析摘要)
+    risk_data (DataFrame): 筛选后的批次风险分析结果
+    display_columns (list): 显示的列
+    key_prefix (str): 控件key前缀
+    page_size_options (tuple): 可选的每页行数
     """
-    today = datetime.now().date()
-    batch_date = batch_date.date()
-    default_region = "未知"
-    default_person = "系统管理员"
-
-    # 建立销售人员-区域映射
-    sales_person_region_mapping = {}
-    person_region_data = actual_df[['申请人', '所属区域']].drop_duplicates()
-    for _, row in person_region_data.iterrows():
-        person = row['申请人']
-        region = row['所属区域']
-        sales_person_region_mapping[person] = region
-
-    # 获取产品责任分配的默认映射
-    product_responsibility = {}
-    product_region_counts = actual_df[actual_df['产品代码'] == product_code].groupby('所属区域')[
-        '求和项:数量（箱）'].sum()
-    product_person_counts = actual_df[actual_df['产品代码'] == product_code].groupby('申请人')['求和项:数量（箱）'].sum()
-
-    if not product_region_counts.empty:
-        default_region = product_region_counts.idxmax()
-    if not product_person_counts.empty:
-        default_person = product_person_counts.idxmax()
-
-    # 定义时间窗口
-    forecast_start_date = batch_date - timedelta(days=90)
-    forecast_end_date = batch_date + timedelta(days=30)
-    sales_start_date = batch_date
-    sales_end_date = min(today, batch_date + timedelta(days=90))
-
-    # 获取相关预测记录
-    forecast_df['所属年月'] = pd.to_datetime(forecast_df['所属年月'])
-    product_forecasts = forecast_df[
-        (forecast_df['产品代码'] == product_code) &
-        (forecast_df['所属年月'].dt.date >= forecast_start_date) &
-        (forecast_df['所属年月'].dt.date <= forecast_end_date)
-        ]
-
-    # 获取相关实际销售记录
-    product_sales = actual_df[
-        (actual_df['产品代码'] == product_code) &
-        (actual_df['订单日期'].dt.date >= sales_start_date) &
-        (actual_df['订单日期'].dt.date <= sales_end_date)
-        ]
-
-    # 初始化责任评分
-    person_scores = {}
-    region_scores = {}
-
-    # 计算预测未兑现量
-    person_allocations = {}
-    forecast_responsibility = {}
-
-    if not product_forecasts.empty:
-        # 按销售人员分组统计预测总量
-        person_forecast_totals = product_forecasts.groupby('销售员')['预计销售量'].sum()
-
-        # 按销售人员统计实际销售总量
-        person_sales_data = {}
-        for person in person_forecast_totals.index:
-            person_actual_sales = product_sales[product_sales['申请人'] == person]['求和项:数量（箱）'].sum() \
-                if not product_sales.empty else 0
-            person_sales_data[person] = person_actual_sales
-
-            # 计算未兑现预测量
-            forecast_qty = person_forecast_totals[person]
-            if forecast_qty > 0:
-                unfulfilled = max(0, forecast_qty - person_actual_sales)
-                if unfulfilled > 0:
-                    forecast_responsibility[person] = {
-                        "forecast_quantity": forecast_qty,
-                        "actual_sales": person_actual_sales,
-                        "unfulfilled": unfulfilled,
-                        "fulfillment_rate": person_actual_sales / forecast_qty
-                    }
-
-        # 如果有未兑现预测，按未兑现量分配库存责任
-        if forecast_responsibility:
-            total_unfulfilled = sum(detail["unfulfilled"] for person, detail in forecast_responsibility.items())
-
-            if total_unfulfilled > 0:
-                # 按未兑现预测量比例分配库存
-                for person, detail in forecast_responsibility.items():
-                    allocation = int(batch_qty * (detail["unfulfilled"] / total_unfulfilled))
-                    person_allocations[person] = max(1, allocation)
-
-                    # 计算责任得分
-                    # 预测差异得分 (60%)
-                    forecast_score = 0.6 * (1 - detail["fulfillment_rate"])
-                    # 分配总得分
-                    person_scores[person] = forecast_score
-
-                    # 设置区域得分
-                    person_region = sales_person_region_mapping.get(person, default_region)
-                    region_scores[person_region] = region_scores.get(person_region, 0) + forecast_score
-
-                # 确保所有库存都被分配
-                allocated_total = sum(person_allocations.values())
-                if allocated_total < batch_qty and person_allocations:
-                    # 将剩余库存分配给未兑现预测量最大的人
-                    top_unfulfilled_person = max(forecast_responsibility.items(),
-                                                 key=lambda x: x[1]["unfulfilled"])[0]
-                    person_allocations[top_unfulfilled_person] += (batch_qty - allocated_total)
-
-    # 如果没有人有预测未兑现，使用默认责任人
-    if not person_scores:
-        person_scores[default_person] = 1.0
-        region_scores[default_region] = 1.0
-        person_allocations[default_person] = batch_qty
-
-    # 确定最终责任人
-    if person_allocations:
-        responsible_person = max(person_allocations.items(), key=lambda x: x[1])[0]
-
-        # 获取责任区域
-        if responsible_person in sales_person_region_mapping:
-            responsible_region = sales_person_region_mapping[responsible_person]
-        else:
-            responsible_region = default_region
-    else:
-        responsible_person = default_person
-        responsible_region = default_region
+    page_key = f"{key_prefix}_current_page"
+    if page_key not in st.session_state:
+        st.session_state[page_key] = 0
 
-    # 构建责任分析摘要
-    responsibility_summary = generate_responsibility_summary(
-        responsible_person, forecast_responsibility, person_allocations, batch_qty
+    # 检索和排序控制
+    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+    with col1:
+        search = st.text_input("检索产品代码、责任区域、责任人或建议措施", key=f"{key_prefix}_search",
+                               on_change=reset_table_page, args=(page_key,))
+    with col2:
+        sort_by = st.selectbox("排序列", options=['默认（风险程度、库龄）'] + list(display_columns),
+                               key=f"{key_prefix}_sort", on_change=reset_table_page, args=(page_key,))
+    with col3:
+        sort_order = st.radio("顺序", options=['升序', '降序'], key=f"{key_prefix}_order", horizontal=True,
+                              on_change=reset_table_page, args=(page_key,))
+    with col4:
+        page_size = st.selectbox("每页行数", options=page_size_options, index=1, key=f"{key_prefix}_page_size",
+                                 on_change=reset_table_page, args=(page_key,))
+
+    page_data, total_rows, page = risk_table_page(
+        risk_data[display_columns],
+        sort_by=sort_by if sort_by in display_columns else None,
+        ascending=sort_order == '升序',
+        search=search.strip(),
+        page=st.session_state[page_key],
+        page_size=page_size
     )
+    st.session_state[page_key] = page
+    total_pages = max((total_rows + page_size - 1) // page_size, 1)
 
-    return responsible_region, responsible_person, responsibility_summary
-
-
-# 函数：生成责任分析摘要
-def generate_responsibility_summary(responsible_person, forecast_responsibility, person_allocations, batch_qty):
-    """
-    生成责任分析摘要
-
-    参数:
-    responsible_person (str): 主要责任人
-    forecast_responsibility (dict): 预测责任详情
-    person_allocations (dict): 人员库存分配情况
-    batch_qty (float): 批次库存数量
-
-    返回:
-    str: 责任分析摘要
-    """
-    if not person_allocations:
-        return "无法确定责任"
-
-    # 确定主要责任人的责任原因
-    main_reasons = []
-
-    if responsible_person in forecast_responsibility:
-        detail = forecast_responsibility[responsible_person]
-        forecast_qty = detail["forecast_quantity"]
-        actual_sales = detail["actual_sales"]
-        fulfillment_rate = detail["fulfillment_rate"] * 100
-        unfulfilled = detail["unfulfilled"]
-
-        main_reasons.append(f"预测{forecast_qty:.0f}件但仅销售{actual_sales:.0f}件(履行率{fulfillment_rate:.0f}%)")
-        main_reasons.append(f"未兑现预测{unfulfilled:.0f}件")
-    else:
-        main_reasons.append("综合预测与销售因素")
-
-    # 获取主要责任人应承担的库存数量
-    main_allocation = person_allocations.get(responsible_person, 0)
-
-    # 构建主要责任人部分
-    main_reason = "、".join(main_reasons)
-    main_part = f"{responsible_person}主要责任({main_reason}，承担{main_allocation}件)"
-
-    # 构建共同责任部分
-    other_persons = []
-    for person, allocation in person_allocations.items():
-        if person != responsible_person and allocation > 0:
-            if person in forecast_responsibility:
-                unfulfilled = forecast_responsibility[person]["unfulfilled"]
-                other_persons.append(f"{person}(未兑现预测{unfulfilled:.0f}件，承担{allocation}件)")
-            else:
-                other_persons.append(f"{person}(责任共担，承担{allocation}件)")
-
-    # 组合最终摘要
-    if other_persons:
-        return f"{main_part}，共同责任：{', '.join(other_persons)}"
-    else:
-        return main_part
-
+    if total_rows == 0:
+        st.info("没有符合检索条件的批次数据")
+        return
 
-# 函数：创建图表分页器
-def display_chart_paginator(df, chart_function, page_size, title, key_prefix):
-    """创建图表分页器"""
-    total_items = len(df)
-    total_pages = (total_items + page_size - 1) // page_size
+    # 只格式化当前页：预计清库天数、带颜色标记的风险等级、金额和日均出货
+    page_display = page_data.copy()
+    if '预计清库天数' in page_display.columns:
+        page_display['预计清库天数'] = page_display['预计清库天数'].apply(
+            lambda x: "无法清库" if x == float('inf') else f"{int(x)}天"
+        )
+    if '风险程度' in page_display.columns:
+        page_display['风险程度'] = page_display['风险程度'].astype(str).map(highlight_risk)
 
-    if f"{key_prefix}_current_page" not in st.session_state:
-        st.session_state[f"{key_prefix}_current_page"] = 0
+    st.markdown(page_display.to_html(
+        escape=False, index=False, formatters={
+            '批次价值': lambda x: f"¥{x:,.2f}",
+            '日均出货': lambda x: f"{x:.2f}箱/天"
+        }
+    ), unsafe_allow_html=True)
 
     # 创建分页控制
     col1, col2, col3 = st.columns([1, 3, 1])
-
     with col1:
-        if st.button("上一页", key=f"{key_prefix}_prev", disabled=st.session_state[f"{key_prefix}_current_page"] <= 0):
-            st.session_state[f"{key_prefix}_current_page"] -= 1
-            st.rerun()
-
+        st.button("上一页", key=f"{key_prefix}_prev", disabled=page <= 0,
+                  on_click=turn_chart_page, args=(page_key, -1))
     with col2:
         st.markdown(
-            f"<div style='text-align:center' class='pagination-info'>第 {st.session_state[f'{key_prefix}_current_page'] + 1} 页，共 {total_pages} 页</div>",
+            f"<div style='text-align:center' class='pagination-info'>第 {page + 1} 页，共 {total_pages} 页（{total_rows} 个批次）</div>",
             unsafe_allow_html=True)
-
     with col3:
-        if st.button("下一页", key=f"{key_prefix}_next",
-                     disabled=st.session_state[f"{key_prefix}_current_page"] >= total_pages - 1):
-            st.session_state[f"{key_prefix}_current_page"] += 1
-            st.rerun()
-
-    # 确保当前页在有效范围内
-    if st.session_state[f"{key_prefix}_current_page"] >= total_pages:
-        st.session_state[f"{key_prefix}_current_page"] = total_pages - 1
-    if st.session_state[f"{key_prefix}_current_page"] < 0:
-        st.session_state[f"{key_prefix}_current_page"] = 0
-
-    # 获取当前页的数据
-    start_idx = st.session_state[f"{key_prefix}_current_page"] * page_size
-    end_idx = min(start_idx + page_size, total_items)
-    page_data = df.iloc[start_idx:end_idx]
-
-    # 显示图表
-    chart_function(page_data, title)
+        st.button("下一页", key=f"{key_prefix}_next", disabled=page >= total_pages - 1,
+                  on_click=turn_chart_page, args=(page_key, 1))
 
 
 # 函数：创建通用图表
@@ -2269,7 +986,7 @@ def create_forecast_bias_chart(batch_analysis, actual_data, forecast_data):
         batch_date = batch['批次日期']
 
         # 获取相关预测和实际销售数据
-        three_months_before = pd.to_datetime(batch_date) - pd.DateOffset(months=3)
+        three_months_before = (pd.to_datetime(batch_date) - pd.DateOffset(months=3)).date()
         product_forecast = forecast_data[
             (forecast_data['产品代码'] == product_code) &
             (pd.to_datetime(forecast_data['所属年月']).dt.date >= three_months_before)
@@ -2944,22 +1661,85 @@ st.markdown('<div class="main-header">销售预测与库存风险管理一体化
 
 # 侧边栏 - 上传文件区域
 st.sidebar.header("📂 数据导入")
-use_default_files = st.sidebar.checkbox("使用默认文件", value=True, help="使用指定的默认文件路径")
-
-# 定义默认文件路径
-DEFAULT_ACTUAL_FILE = "2409~250224出货数据.xlsx"
-DEFAULT_FORECAST_FILE = "2409~2502人工预测.xlsx"
-DEFAULT_PRODUCT_FILE = "产品信息.xlsx"
-DEFAULT_INVENTORY_FILE = "含批次库存0221（2）.xlsx"
-DEFAULT_PRICE_FILE = "单价.xlsx"
-
-if use_default_files:
-    # 使用默认文件路径
-    actual_data = load_actual_data(DEFAULT_ACTUAL_FILE)
-    forecast_data = load_forecast_data(DEFAULT_FORECAST_FILE)
-    product_info = load_product_info(DEFAULT_PRODUCT_FILE)
-    inventory_data, batch_data = load_inventory_data(DEFAULT_INVENTORY_FILE)
-    price_data = load_price_data(DEFAULT_PRICE_FILE)
+
+# 默认输入文件及其显示名称
+input_files = {
+    'actual': DEFAULT_ACTUAL_FILE,
+    'forecast': DEFAULT_FORECAST_FILE,
+    'product_info': DEFAULT_PRODUCT_FILE,
+    'inventory': DEFAULT_INVENTORY_FILE,
+    'price': DEFAULT_PRICE_FILE
+}
+input_file_labels = {
+    'actual': '出货数据', 'forecast': '预测数据', 'product_info': '产品信息', 'inventory': '库存数据', 'price': '单价数据'
+}
+
+# 夜间批处理（yuce_nightly.py）生成过快照时，可直接读取预先计算的结果；
+# 只有快照是今天生成且各输入版本与当前文件一致时才默认使用快照，否则提示并默认实时加载
+snapshot_dir = latest_snapshot()
+snapshot_is_current = False
+if snapshot_dir is not None:
+    latest_manifest = read_snapshot_manifest(snapshot_dir)
+    stale_reasons = [f"{input_file_labels[kind]}已更新"
+                     for kind in snapshot_changed_inputs(latest_manifest, input_files)]
+    if latest_manifest['analysis_date'] != datetime.now().date().isoformat():
+        stale_reasons.insert(0, f"分析日期为{latest_manifest['analysis_date']}")
+    snapshot_is_current = not stale_reasons
+    if stale_reasons:
+        st.sidebar.warning(f"夜间快照已过期（{'，'.join(stale_reasons)}），已改为实时加载数据")
+use_snapshot = snapshot_dir is not None and st.sidebar.checkbox(
+    "使用夜间快照", value=snapshot_is_current, help="读取夜间批处理预先计算的数据和分析结果，不重新加载和分析"
+)
+# 用yuce_sqlstore.py导入过数据时，可从SQLite数据库按需汇总读取
+use_sqlite = not use_snapshot and os.path.isfile(SQLITE_DB_PATH) and st.sidebar.checkbox(
+    "使用SQLite数据库", value=True, help="从SQLite数据库读取出货、预测、库存和单价数据，筛选和汇总在数据库中完成"
+)
+use_default_files = use_snapshot or use_sqlite or st.sidebar.checkbox(
+    "使用默认文件", value=True, help="使用指定的默认文件路径"
+)
+
+snapshot_results = None
+if use_snapshot:
+    # 快照只读：输入数据和分析结果都来自快照
+    with perf_stage("读取夜间快照") as record:
+        snapshot_inputs, snapshot_results, snapshot_manifest = load_snapshot(snapshot_dir)
+        record['cache'] = cache_status('load_snapshot')
+        record['rows'] = len(snapshot_inputs['actual_data'])
+    actual_data = snapshot_inputs['actual_data']
+    forecast_data = snapshot_inputs['forecast_data']
+    product_info = snapshot_inputs['product_info']
+    inventory_data = snapshot_inputs['inventory_data']
+    batch_data = snapshot_inputs['batch_data']
+    price_data = snapshot_inputs['price_data']
+    actual_summary = snapshot_inputs.get('actual_cells', actual_data)
+
+    st.sidebar.success(f"已加载夜间快照（生成于{snapshot_manifest['created_at'].replace('T', ' ')}）")
+elif use_sqlite:
+    # 出货数据只读取月度汇总和批次相关产品的日出货，产品信息仍来自默认文件
+    db_version = database_version(SQLITE_DB_PATH)
+    with perf_stage("读取SQLite数据库") as record:
+        sqlite_inputs = load_sqlite_inputs(db_version, datetime.now().date().isoformat())
+        record['cache'] = cache_status('load_sqlite_inputs')
+        record['rows'] = len(sqlite_inputs['actual_cells'])
+    actual_data = sqlite_inputs['actual_data']
+    actual_summary = sqlite_inputs['actual_cells']
+    forecast_data = sqlite_inputs['forecast_data']
+    _, product_inputs = load_input_files({'product_info': DEFAULT_PRODUCT_FILE})
+    product_info = product_inputs['product_info']
+    inventory_data = sqlite_inputs['inventory_data']
+    batch_data = sqlite_inputs['batch_data']
+    price_data = sqlite_inputs['price_data']
+
+    st.sidebar.success(f"已从SQLite数据库加载数据（{SQLITE_DB_PATH}）")
+elif use_default_files:
+    # 使用默认文件路径，五个文件并行解析；每次重跑检查文件版本，只重新加载有更新的文件
+    input_versions, loaded_inputs = load_input_files(input_files)
+    notify_updated_files(input_versions, input_file_labels)
+    actual_data = loaded_inputs['actual']
+    forecast_data = loaded_inputs['forecast']
+    product_info = loaded_inputs['product_info']
+    inventory_data, batch_data = loaded_inputs['inventory']
+    price_data = loaded_inputs['price']
 
     if os.path.exists(DEFAULT_ACTUAL_FILE):
         st.sidebar.success(f"已成功加载默认出货数据文件")
@@ -2993,15 +1773,86 @@ else:
     uploaded_inventory = st.sidebar.file_uploader("上传库存数据文件", type=["xlsx", "xls"])
     uploaded_price = st.sidebar.file_uploader("上传单价数据文件", type=["xlsx", "xls"])
 
-    # 加载数据
-    actual_data = load_actual_data(uploaded_actual if uploaded_actual else None)
-    forecast_data = load_forecast_data(uploaded_forecast if uploaded_forecast else None)
-    product_info = load_product_info(uploaded_product if uploaded_product else None)
-    inventory_data, batch_data = load_inventory_data(uploaded_inventory if uploaded_inventory else None)
-    price_data = load_price_data(uploaded_price if uploaded_price else None)
+    # 上传的文件按内容摘要保存后与默认文件一样按路径加载，未上传的使用示例数据
+    input_files = {
+        'actual': uploaded_file_path(uploaded_actual),
+        'forecast': uploaded_file_path(uploaded_forecast),
+        'product_info': uploaded_file_path(uploaded_product),
+        'inventory': uploaded_file_path(uploaded_inventory),
+        'price': uploaded_file_path(uploaded_price)
+    }
+    input_versions, loaded_inputs = load_input_files(input_files)
+    actual_data = loaded_inputs['actual']
+    forecast_data = loaded_inputs['forecast']
+    product_info = loaded_inputs['product_info']
+    inventory_data, batch_data = loaded_inputs['inventory']
+    price_data = loaded_inputs['price']
+
+if not use_snapshot and not use_sqlite:
+    # 各文件分别加载，出货、预测和批次数据的维度列在此统一为同一分类字典（快照和数据库的数据已统一）
+    with perf_stage("统一分类字典") as record:
+        actual_data, forecast_data, batch_data = share_categories(actual_data, forecast_data, batch_data)
+        record['rows'] = len(actual_data) + len(forecast_data) + len(batch_data)
+
+    # 汇总和增长率所用的出货数据（数据库和增量存储提供月度汇总，否则直接使用明细）
+    actual_summary = actual_data
+
+# 各数据表的内存占用
+with st.sidebar.expander("💾 内存占用"):
+    memory_tables = {
+        '出货数据': actual_data,
+        '预测数据': forecast_data,
+        '库存数据': inventory_data,
+        '批次数据': batch_data,
+        '产品信息': product_info
+    }
+    if actual_summary is not actual_data:
+        memory_tables['出货月度汇总'] = actual_summary
+    memory_report = memory_usage_report(memory_tables)
+    memory_lines = [
+        f"- {name}：{rows:,} 行，{size:.2f} MB"
+        for name, rows, size in zip(memory_report['数据表'], memory_report['行数'], memory_report['内存(MB)'])
+    ]
+    memory_lines.append(f"**合计：{memory_report['内存(MB)'].sum():.2f} MB**")
+    st.markdown("\n".join(memory_lines))
+
+if use_snapshot:
+    # 快照记录了生成时各输入的版本标识
+    snapshot_sources = snapshot_manifest['sources']
+    actual_version = snapshot_sources['actual']['version']
+    forecast_version = snapshot_sources['forecast']['version']
+    batch_version = snapshot_sources['inventory']['version']
+    price_version = snapshot_sources['price']['version']
+    analysis_date = snapshot_manifest['analysis_date']
+
+    batch_risk_analysis = snapshot_results['batch_risk_analysis']
+else:
+    if use_sqlite:
+        # 数据库的版本标识随每次导入变化，各数据共用
+        actual_version = f"actual:{db_version}"
+        forecast_version = f"forecast:{db_version}"
+        batch_version = f"inventory:{db_version}"
+        price_version = f"price:{db_version}"
+    else:
+        # 默认文件和上传文件都有文件路径，版本标识取自文件内容摘要
+        actual_version = data_version('actual', input_files['actual'], actual_data)
+        forecast_version = data_version('forecast', input_files['forecast'], forecast_data)
+        batch_version = data_version('inventory', input_files['inventory'], batch_data)
+        price_version = data_version('price', input_files['price'], price_data)
+    analysis_date = datetime.now().date().isoformat()
+
+    # 分析批次风险（输入数据未变化时直接复用缓存结果），再按当前单价计算批次价值
+    with perf_stage("批次风险分析") as record:
+        batch_risk_analysis = cached_batch_risk_analysis(
+            batch_version, actual_version, forecast_version, analysis_date,
+            batch_data, actual_data, forecast_data
+        )
+        batch_risk_analysis = value_batches(batch_risk_analysis, price_data)
+        record['cache'] = cache_status('cached_batch_risk_analysis')
+        record['rows'] = len(batch_data)
 
-# 分析批次风险
-batch_risk_analysis = analyze_batch_risk(batch_data, actual_data, forecast_data, price_data)
+# 批次风险结果的版本标识，风险图表按此标识和筛选条件缓存
+risk_version = '|'.join([batch_version, actual_version, forecast_version, price_version, analysis_date])
 
 # 创建产品代码到名称的映射
 product_names_map = {}
@@ -3009,26 +1860,34 @@ if not product_info.empty:
     for _, row in product_info.iterrows():
         product_names_map[row['产品代码']] = row['产品名称']
 
-# 筛选共有月份数据
-common_months = get_common_months(actual_data, forecast_data)
-actual_data_filtered = actual_data[actual_data['所属年月'].isin(common_months)]
-forecast_data_filtered = forecast_data[forecast_data['所属年月'].isin(common_months)]
-
-# 处理数据
-processed_data = process_data(actual_data_filtered, forecast_data_filtered, product_info)
-
-# 获取数据的所有月份
-all_months = sorted(processed_data['merged_monthly']['所属年月'].unique())
+# 处理数据（快照中已包含处理结果）
+if use_snapshot:
+    processed_data = snapshot_results['processed_data']
+else:
+    # 出货和预测数据未变化时直接复用缓存结果
+    with perf_stage("汇总与准确率（process_data）") as record:
+        processed_data = cached_process_data(actual_version, forecast_version, actual_summary, forecast_data,
+                                             product_info)
+        record['cache'] = cache_status('cached_process_data')
+        record['rows'] = len(actual_summary) + len(forecast_data)
+
+# 各标签页的汇总视图都从销售立方体切片得到
+sales_cube = processed_data['sales_cube']
+
+# 获取数据的所有月份和区域（各标签页的筛选器共用）
+all_months = list(sales_cube['members']['所属年月'])
+all_regions = list(sales_cube['members']['所属区域'])
 latest_month = all_months[-1] if all_months else None
 
 # 获取最近3个月
 last_three_months = get_last_three_months()
 valid_last_three_months = [month for month in last_three_months if month in all_months]
 
-# 创建标签页 - 更新标签页结构
-tabs = st.tabs(["📊 总览与历史", "🔍 预测差异分析", "📈 产品趋势", "🔍 重点SKU分析", "🚨 库存风险管理"])
 
-with tabs[0]:  # 总览与历史标签页
+# 函数：总览与历史标签页（作为独立片段运行，筛选条件变化时只重新执行本标签页）
+@st.fragment
+@timed_fragment("总览与历史")
+def render_overview_tab():
     # 在标签页内添加筛选器
     st.markdown("### 📊 分析筛选")
     with st.expander("筛选条件", expanded=True):
@@ -3041,21 +1900,19 @@ with tabs[0]:  # 总览与历史标签页
             )
 
         with col2:
-            all_regions = sorted(processed_data['merged_monthly']['所属区域'].unique())
             selected_regions = st.multiselect(
                 "选择区域",
                 options=all_regions,
                 default=all_regions
             )
 
-    # 根据筛选条件过滤数据
-    filtered_monthly = filter_data(processed_data['merged_monthly'], selected_months, selected_regions)
-    filtered_salesperson = filter_data(processed_data['merged_by_salesperson'], selected_months, selected_regions)
-
     # 检查选定月份和区域是否为空
     if not selected_months or not selected_regions:
         st.warning("请选择至少一个月份和一个区域进行分析。")
     else:
+        # 根据筛选条件从销售立方体切片汇总（按月份和区域）
+        filtered_monthly = cube_view(['所属年月', '所属区域'], selected_months, selected_regions)
+
         # 计算总览KPI
         total_actual_qty = filtered_monthly['求和项:数量（箱）'].sum()
         total_forecast_qty = filtered_monthly['预计销售量'].sum()
@@ -3135,10 +1992,7 @@ with tabs[0]:  # 总览与历史标签页
         st.markdown('<div class="sub-header">📊 区域销售分析</div>', unsafe_allow_html=True)
 
         # 计算每个区域的销售量和预测量
-        region_sales_comparison = filtered_monthly.groupby('所属区域').agg({
-            '求和项:数量（箱）': 'sum',
-            '预计销售量': 'sum'
-        }).reset_index()
+        region_sales_comparison = cube_view(['所属区域'], selected_months, selected_regions)
 
         # 计算差异
         region_sales_comparison['差异'] = region_sales_comparison['求和项:数量（箱）'] - region_sales_comparison[
@@ -3195,19 +2049,23 @@ with tabs[0]:  # 总览与历史标签页
             plot_bgcolor='white'
         )
 
-        # 为每个区域准备详细信息
+        # 为每个区域准备详细信息，区域×产品和区域×产品×销售员的汇总各切片一次
+        region_products = dict(tuple(
+            cube_view(['所属区域', '产品代码'], selected_months, selected_regions).groupby('所属区域')
+        ))
+        region_product_sales = cube_view(['所属区域', '产品代码', '销售员'],
+                                         selected_months, selected_regions)
+        region_product_sales = dict(tuple(region_product_sales.groupby(['所属区域', '产品代码'])))
+
         region_details = []
         for _, region_row in region_sales_comparison.iterrows():
             region = region_row['所属区域']
             # 获取该区域数据
-            region_data = filtered_monthly[filtered_monthly['所属区域'] == region]
+            region_data = region_products.get(region, pd.DataFrame())
 
             if not region_data.empty:
                 # 找出差异最大的产品
-                product_diff = region_data.groupby('产品代码').agg({
-                    '求和项:数量（箱）': 'sum',
-                    '预计销售量': 'sum'
-                })
+                product_diff = region_data.set_index('产品代码')[['求和项:数量（箱）', '预计销售量']].copy()
                 product_diff['差异'] = product_diff['求和项:数量（箱）'] - product_diff['预计销售量']
                 product_diff['差异率'] = product_diff.apply(
                     lambda row: (row['差异'] / row['求和项:数量（箱）'] * 100) if row['求和项:数量（箱）'] > 0 else 0,
@@ -3224,15 +2082,10 @@ with tabs[0]:  # 总览与历史标签页
                     diff_rate = product_diff.loc[max_diff_idx, '差异率']
 
                     # 找该产品的主要销售员
-                    product_sales = filtered_salesperson[
-                        (filtered_salesperson['所属区域'] == region) &
-                        (filtered_salesperson['产品代码'] == product_code)
-                        ]
+                    product_sales = region_product_sales.get((region, product_code), pd.DataFrame())
 
                     if not product_sales.empty:
-                        sales_by_person = product_sales.groupby('销售员').agg({
-                            '求和项:数量（箱）': 'sum'
-                        })
+                        sales_by_person = product_sales.set_index('销售员')[['求和项:数量（箱）']]
                         top_salesperson = sales_by_person[
                             '求和项:数量（箱）'].idxmax() if not sales_by_person.empty else "未知"
                     else:
@@ -3298,7 +2151,7 @@ with tabs[0]:  # 总览与历史标签页
 
         with col1:
             # 创建风险分布饼图
-            risk_chart = create_risk_distribution_chart(batch_risk_analysis)
+            risk_chart = risk_chart_view(create_risk_distribution_chart, batch_risk_analysis)
             if risk_chart:
                 st.plotly_chart(risk_chart, use_container_width=True)
             else:
@@ -3306,7 +2159,7 @@ with tabs[0]:  # 总览与历史标签页
 
         with col2:
             # 高风险批次库龄分布图
-            high_risk_chart = create_high_risk_batches_chart(batch_risk_analysis)
+            high_risk_chart = risk_chart_view(create_high_risk_batches_chart, batch_risk_analysis)
             if high_risk_chart:
                 st.plotly_chart(high_risk_chart, use_container_width=True)
             else:
@@ -3340,21 +2193,15 @@ with tabs[0]:  # 总览与历史标签页
         # 添加历史趋势分析部分
         st.markdown('<div class="sub-header">📊 销售与预测历史趋势</div>', unsafe_allow_html=True)
 
-        # 准备历史趋势数据
-        monthly_trend = filtered_monthly.groupby(['所属年月', '所属区域']).agg({
-            '求和项:数量（箱）': 'sum',
-            '预计销售量': 'sum'
-        }).reset_index()
+        # 准备历史趋势数据（切片已按月份和区域汇总）
+        monthly_trend = filtered_monthly
 
         # 使用全国数据，不再提供区域选择器
         selected_region_for_trend = '全国'
 
         if selected_region_for_trend == '全国':
             # 计算全国趋势
-            national_trend = monthly_trend.groupby('所属年月').agg({
-                '求和项:数量（箱）': 'sum',
-                '预计销售量': 'sum'
-            }).reset_index()
+            national_trend = cube_view(['所属年月'], selected_months, selected_regions)
 
             trend_data = national_trend
         else:
@@ -3482,20 +2329,12 @@ with tabs[0]:  # 总览与历史标签页
                 # 检查是否有季节性模式
                 month_numbers = [int(m.split('-')[1]) for m in trend_data['所属年月']]
                 if len(month_numbers) >= 12:
-                    spring_diff = abs(trend_data[trend_data['所属年月'].str.contains(r'-0[345])]['
-                    差异率
-                    ']).mean()
-                    summer_diff = abs(trend_data[trend_data['所属年月'].str.contains(r'-0[678])]['
-                    差异率
-                    ']).mean()
+                    spring_diff = abs(trend_data[trend_data['所属年月'].str.contains(r'-0[345]')]['差异率']).mean()
+                    summer_diff = abs(trend_data[trend_data['所属年月'].str.contains(r'-0[678]')]['差异率']).mean()
                     autumn_diff = abs(
-                        trend_data[trend_data['所属年月'].str.contains(r'-0[9]$|10|11)]['
-                    差异率
-                    ']).mean()
+                        trend_data[trend_data['所属年月'].str.contains(r'-0[9]$|10|11')]['差异率']).mean()
                     winter_diff = abs(
-                        trend_data[trend_data['所属年月'].str.contains(r'-12$|-0[12])]['
-                    差异率
-                    ']).mean()
+                        trend_data[trend_data['所属年月'].str.contains(r'-12$|-0[12]')]['差异率']).mean()
 
                     seasons = [('春季', spring_diff), ('夏季', summer_diff), ('秋季', autumn_diff),
                                ('冬季', winter_diff)]
@@ -3504,217 +2343,216 @@ with tabs[0]:  # 总览与历史标签页
                     trend_explanation += f"特别注意{worst_season[0]}月份的预测，历史上这些月份差异率较大({worst_season[1]:.1f}%)；"
 
                     trend_explanation += "考虑在预测模型中增加季节性因素，提高季节性预测的准确性。"
-                    else:
-                    trend_explanation += f"{selected_region_for_trend}的销售预测整体表现良好，建议保持当前预测方法，"
-                    trend_explanation += "持续监控销售趋势变化，及时调整预测模型。"
-
-                    add_chart_explanation(trend_explanation)
-
-                    with tabs[1]:  # 预测差异分析标签页
-                    # 在标签页内添加筛选器
-                        st.markdown("### 📊 预测差异分析筛选")
-                    with st.expander("筛选条件", expanded=True):
-                        col1, col2, col3 = st.columns(3)
-
-                    with col1:
-                        diff_selected_months = st.multiselect(
-                            "选择分析月份",
-                            options=all_months,
-                            default=valid_last_three_months if valid_last_three_months else (
-                                [all_months[-1]] if all_months else []),
-                            key="diff_months"
-                        )
+            else:
+                trend_explanation += f"{selected_region_for_trend}的销售预测整体表现良好，建议保持当前预测方法，"
+                trend_explanation += "持续监控销售趋势变化，及时调整预测模型。"
 
-                    with col2:
-                        diff_selected_regions = st.multiselect(
-                            "选择区域",
-                            options=all_regions,
-                            default=all_regions,
-                            key="diff_regions"
-                        )
+        add_chart_explanation(trend_explanation)
 
-                    with col3:
-                        analysis_dimension = st.selectbox(
-                            "选择分析维度",
-                            options=['产品', '销售员'],
-                            key="dimension_select"
-                        )
 
-                    # 筛选数据
-                    diff_filtered_monthly = filter_data(processed_data['merged_monthly'], diff_selected_months,
-                                                        diff_selected_regions)
-                    diff_filtered_salesperson = filter_data(processed_data['merged_by_salesperson'],
-                                                            diff_selected_months,
-                                                            diff_selected_regions)
+# 函数：预测差异分析标签页（作为独立片段运行，筛选条件变化时只重新执行本标签页）
+@st.fragment
+@timed_fragment("预测差异分析")
+def render_forecast_diff_tab():
+    # 在标签页内添加筛选器
+    st.markdown("### 📊 预测差异分析筛选")
+    with st.expander("筛选条件", expanded=True):
+        col1, col2, col3 = st.columns(3)
 
-                    # 检查筛选条件是否有效
-                    if not diff_selected_months or not diff_selected_regions:
-                        st.warning("请选择至少一个月份和一个区域进行分析。")
-                    else:
-                        st.markdown("### 预测差异详细分析")
-
-                    # 使用全国数据，不再提供区域选择
-                    selected_region_for_diff = '全国'
-
-                    # 准备数据
-                    if selected_region_for_diff == '全国':
-                    # 全国数据，按选定维度汇总
-                        if
-                    analysis_dimension == '产品':
-                    diff_data = diff_filtered_monthly.groupby(['产品代码', '所属区域']).agg({
-                        '求和项:数量（箱）': 'sum',
-                        '预计销售量': 'sum',
-                    }).reset_index()
-
-                    # 合并销售员信息(按区域和产品分组)
-                    sales_info = diff_filtered_salesperson.groupby(['所属区域', '产品代码', '销售员']).agg({
-                        '求和项:数量（箱）': 'sum'
-                    }).reset_index()
-
-                    # 对每个产品找出主要销售员(销量最大的)
-                    top_sales = sales_info.loc[sales_info.groupby(['所属区域', '产品代码'])['求和项:数量（箱）'].idxmax()]
-                    top_sales = top_sales[['所属区域', '产品代码', '销售员']]
-
-                    # 将销售员信息合并到差异数据中
-                    diff_data = pd.merge(diff_data, top_sales, on=['所属区域', '产品代码'], how='left')
-
-                    # 汇总到产品级别
-                    diff_summary = diff_data.groupby('产品代码').agg({
-                        '求和项:数量（箱）': 'sum',
-                        '预计销售量': 'sum'
-                    }).reset_index()
-
-                    else:  # 销售员维度
-                    diff_data = diff_filtered_salesperson.groupby(['销售员', '所属区域', '产品代码']).agg({
-                        '求和项:数量（箱）': 'sum',
-                        '预计销售量': 'sum'
-                    }).reset_index()
-
-                    # 对每个销售员找出主要产品(销量最大的)
-                    top_products = diff_data.loc[diff_data.groupby(['销售员', '所属区域'])['求和项:数量（箱）'].idxmax()]
-                    top_products = top_products[['销售员', '所属区域', '产品代码']]
-
-                    # 汇总到销售员级别
-                    diff_summary = diff_data.groupby('销售员').agg({
-                        '求和项:数量（箱）': 'sum',
-                        '预计销售量': 'sum'
-                    }).reset_index()
-                    else:
-                    # 选定区域数据，按选定维度汇总
-                    region_filtered = diff_filtered_monthly[
-                        diff_filtered_monthly['所属区域'] == selected_region_for_diff]
-                    region_filtered_salesperson = diff_filtered_salesperson[
-                        diff_filtered_salesperson['所属区域'] == selected_region_for_diff]
-
-                    if analysis_dimension == '产品':
-                        diff_data = region_filtered.groupby(['产品代码']).agg({
-                            '求和项:数量（箱）': 'sum',
-                            '预计销售量': 'sum'
-                        }).reset_index()
-
-                    # 合并销售员信息
-                    sales_info = region_filtered_salesperson.groupby(['产品代码', '销售员']).agg({
-                        '求和项:数量（箱）': 'sum'
-                    }).reset_index()
-
-                    # 对每个产品找出主要销售员(销量最大的)
-                    top_sales = sales_info.loc[sales_info.groupby('产品代码')['求和项:数量（箱）'].idxmax()]
-                    top_sales = top_sales[['产品代码', '销售员']]
-
-                    # 将销售员信息合并到差异数据中
-                    diff_data = pd.merge(diff_data, top_sales, on='产品代码', how='left')
-
-                    # 汇总和差异数据保持一致
-                    diff_summary = diff_data.copy()
-
-                    else:  # 销售员维度
-                    diff_data = region_filtered_salesperson.groupby(['销售员', '产品代码']).agg({
-                        '求和项:数量（箱）': 'sum',
-                        '预计销售量': 'sum'
-                    }).reset_index()
-
-                    # 对每个销售员找出主要产品(销量最大的)
-                    top_products = diff_data.loc[diff_data.groupby('销售员')['求和项:数量（箱）'].idxmax()]
-                    top_products = top_products[['销售员', '产品代码']]
-
-                    # 汇总到销售员级别
-                    diff_summary = diff_data.groupby('销售员').agg({
-                        '求和项:数量（箱）': 'sum',
-                        '预计销售量': 'sum'
-                    }).reset_index()
-
-                    # 计算差异和差异率
-                    diff_summary['数量差异'] = diff_summary['求和项:数量（箱）'] - diff_summary['预计销售量']
-                    diff_summary['数量差异率'] = diff_summary['数量差异'] / diff_summary['求和项:数量（箱）'] * 100
-
-                    # 处理产品名称显示
-                    if analysis_dimension == '产品':
-                        diff_summary['产品名称'] = diff_summary['产品代码'].apply(
-                            lambda x: product_names_map.get(x, ''))
-                    diff_summary['产品显示'] = diff_summary.apply(
-                        lambda row: format_product_code(row['产品代码'], product_info, include_name=True),
-                        axis=1
-                    )
-                    dimension_column = '产品显示'
-                    else:
-                    dimension_column = '销售员'
-
-                    # 按差异率绝对值降序排序（差异最大的排在前面）
-                    diff_summary = diff_summary.sort_values('数量差异率', key=abs, ascending=False)
-
-                    # 显示所有数据，不再限制数量
-                    top_diff_items = diff_summary
-
-                    # 准备详细信息用于悬停显示
-                    hover_data = []
-                    for idx, row in top_diff_items.iterrows():
-                        if
-                    analysis_dimension == '产品':
-                    # 找到该产品的详细信息
-                    if selected_region_for_diff == '全国':
-                    # 查找该产品在所有选定月份的数据
-                        product_details = diff_filtered_monthly[diff_filtered_monthly['产品代码'] == row['产品代码']]
-                    product_details = product_details.sort_values('所属年月')
-
-                    # 按月份汇总
+        with col1:
+            diff_selected_months = st.multiselect(
+                "选择分析月份",
+                options=all_months,
+                default=valid_last_three_months if valid_last_three_months else (
+                    [all_months[-1]] if all_months else []),
+                key="diff_months"
+            )
+
+        with col2:
+            diff_selected_regions = st.multiselect(
+                "选择区域",
+                options=all_regions,
+                default=all_regions,
+                key="diff_regions"
+            )
+
+        with col3:
+            analysis_dimension = st.selectbox(
+                "选择分析维度",
+                options=['产品', '销售员'],
+                key="dimension_select"
+            )
+
+    # 检查筛选条件是否有效
+    if not diff_selected_months or not diff_selected_regions:
+        st.warning("请选择至少一个月份和一个区域进行分析。")
+    else:
+        st.markdown("### 预测差异详细分析")
+
+        # 使用全国数据，不再提供区域选择
+        selected_region_for_diff = '全国'
+
+        # 分析范围内的区域
+        if selected_region_for_diff == '全国':
+            diff_scope_regions = diff_selected_regions
+        else:
+            diff_scope_regions = [selected_region_for_diff]
+
+        # 准备数据
+        if selected_region_for_diff == '全国':
+            # 全国数据，按选定维度汇总
+            if analysis_dimension == '产品':
+                diff_data = cube_view(['产品代码', '所属区域'], diff_selected_months,
+                                      diff_selected_regions)
+
+                # 合并销售员信息(按区域和产品分组)
+                sales_info = cube_view(['所属区域', '产品代码', '销售员'], diff_selected_months,
+                                       diff_selected_regions)[['所属区域', '产品代码', '销售员', '求和项:数量（箱）']]
+
+                # 对每个产品找出主要销售员(销量最大的)
+                top_sales = sales_info.loc[sales_info.groupby(['所属区域', '产品代码'])['求和项:数量（箱）'].idxmax()]
+                top_sales = top_sales[['所属区域', '产品代码', '销售员']]
+
+                # 将销售员信息合并到差异数据中
+                diff_data = pd.merge(diff_data, top_sales, on=['所属区域', '产品代码'], how='left')
+
+                # 汇总到产品级别
+                diff_summary = cube_view(['产品代码'], diff_selected_months, diff_selected_regions)
+
+            else:  # 销售员维度
+                diff_data = cube_view(['销售员', '所属区域', '产品代码'], diff_selected_months,
+                                      diff_selected_regions)
+
+                # 对每个销售员找出主要产品(销量最大的)
+                top_products = diff_data.loc[diff_data.groupby(['销售员', '所属区域'])['求和项:数量（箱）'].idxmax()]
+                top_products = top_products[['销售员', '所属区域', '产品代码']]
+
+                # 汇总到销售员级别
+                diff_summary = cube_view(['销售员'], diff_selected_months, diff_selected_regions)
+        else:
+            # 选定区域数据，按选定维度汇总
+            if analysis_dimension == '产品':
+                diff_data = cube_view(['产品代码'], diff_selected_months, diff_scope_regions)
+
+                # 合并销售员信息
+                sales_info = cube_view(['产品代码', '销售员'], diff_selected_months,
+                                       diff_scope_regions)[['产品代码', '销售员', '求和项:数量（箱）']]
+
+                # 对每个产品找出主要销售员(销量最大的)
+                top_sales = sales_info.loc[sales_info.groupby('产品代码')['求和项:数量（箱）'].idxmax()]
+                top_sales = top_sales[['产品代码', '销售员']]
+
+                # 将销售员信息合并到差异数据中
+                diff_data = pd.merge(diff_data, top_sales, on='产品代码', how='left')
+
+                # 汇总和差异数据保持一致
+                diff_summary = diff_data.copy()
+
+            else:  # 销售员维度
+                diff_data = cube_view(['销售员', '产品代码'], diff_selected_months,
+                                      diff_scope_regions)
+
+                # 对每个销售员找出主要产品(销量最大的)
+                top_products = diff_data.loc[diff_data.groupby('销售员')['求和项:数量（箱）'].idxmax()]
+                top_products = top_products[['销售员', '产品代码']]
+
+                # 汇总到销售员级别
+                diff_summary = cube_view(['销售员'], diff_selected_months, diff_scope_regions)
+
+        # 计算差异和差异率
+        diff_summary['数量差异'] = diff_summary['求和项:数量（箱）'] - diff_summary['预计销售量']
+        diff_summary['数量差异率'] = diff_summary['数量差异'] / diff_summary['求和项:数量（箱）'] * 100
+
+        # 处理产品名称显示
+        if analysis_dimension == '产品':
+            diff_summary['产品名称'] = diff_summary['产品代码'].apply(
+                lambda x: product_names_map.get(x, ''))
+            diff_summary['产品显示'] = diff_summary.apply(
+                lambda row: format_product_code(row['产品代码'], product_info, include_name=True),
+                axis=1
+            )
+            dimension_column = '产品显示'
+        else:
+            dimension_column = '销售员'
+
+        # 按差异率绝对值降序排序（差异最大的排在前面）
+        diff_summary = diff_summary.sort_values('数量差异率', key=abs, ascending=False)
+
+        # 显示所有数据，不再限制数量
+        top_diff_items = diff_summary
+
+        # 悬停信息所需的明细切片，按产品或销售员分组后逐行查找
+        if analysis_dimension == '产品':
+            if selected_region_for_diff == '全国':
+                product_months = dict(tuple(cube_view(
+                    ['产品代码', '所属年月'], diff_selected_months, diff_scope_regions
+                ).groupby('产品代码')))
+                product_regions = dict(tuple(cube_view(
+                    ['产品代码', '所属区域'], diff_selected_months, diff_scope_regions
+                ).groupby('产品代码')))
+                product_region_sales = cube_view(
+                    ['产品代码', '所属区域', '销售员'], diff_selected_months, diff_scope_regions
+                )
+                product_region_top_salesperson = product_region_sales.loc[
+                    product_region_sales.groupby(['产品代码', '所属区域'])['求和项:数量（箱）'].idxmax()
+                ].set_index(['产品代码', '所属区域'])['销售员'].to_dict()
+            else:
+                product_salespersons = dict(tuple(cube_view(
+                    ['产品代码', '销售员'], diff_selected_months, diff_scope_regions
+                ).groupby('产品代码')))
+        elif selected_region_for_diff == '全国':
+            salesperson_products = dict(tuple(cube_view(
+                ['销售员', '产品代码'], diff_selected_months, diff_scope_regions
+            ).groupby('销售员')))
+        else:
+            salesperson_products = dict(tuple(diff_data.groupby('销售员')))
+
+        # 高风险批次按产品、责任人预先分组
+        high_risk_batches = batch_risk_analysis[
+            batch_risk_analysis['风险程度'].isin(['极高风险', '高风险'])] if not batch_risk_analysis.empty \
+            else pd.DataFrame(columns=['产品代码', '责任人', '责任区域', '批次价值'])
+        high_risk_by_product = dict(tuple(high_risk_batches.groupby('产品代码')))
+
+        # 准备详细信息用于悬停显示
+        hover_data = []
+        for idx, row in top_diff_items.iterrows():
+            if analysis_dimension == '产品':
+                # 找到该产品的详细信息
+                if selected_region_for_diff == '全国':
+                    # 按月份汇总该产品在所有选定月份的数据
+                    product_month_data = product_months.get(row['产品代码'], pd.DataFrame())
                     monthly_info = []
-                    for month, month_data in product_details.groupby('所属年月'):
-                        actual = month_data['求和项:数量（箱）'].sum()
-                    forecast = month_data['预计销售量'].sum()
-                    diff_rate = (actual - forecast) / actual * 100 if actual > 0 else 0
-                    monthly_info.append(
-                        f"{month}月: 实际 {actual:.0f}箱, 预测 {forecast:.0f}箱, 差异 {diff_rate:.1f}%"
-                    )
+                    for _, month_data in product_month_data.iterrows():
+                        actual = month_data['求和项:数量（箱）']
+                        forecast = month_data['预计销售量']
+                        diff_rate = (actual - forecast) / actual * 100 if actual > 0 else 0
+                        monthly_info.append(
+                            f"{month_data['所属年月']}月: 实际 {actual:.0f}箱, 预测 {forecast:.0f}箱, 差异 {diff_rate:.1f}%"
+                        )
 
                     # 分析区域和销售员
                     region_info = []
-                    for region, region_data in product_details.groupby('所属区域'):
-                        region_actual = region_data['求和项:数量（箱）'].sum()
-                    region_forecast = region_data['预计销售量'].sum()
-                    region_diff = (
-                                          region_actual - region_forecast) / region_actual * 100 if region_actual > 0 else 0
-
-                    # 找出该区域主要销售员
-                    region_salesperson = diff_filtered_salesperson[
-                        (diff_filtered_salesperson['产品代码'] == row['产品代码']) &
-                        (diff_filtered_salesperson['所属区域'] == region)
-                        ]
-
-                    if not region_salesperson.empty:
-                        top_salesperson = region_salesperson.groupby('销售员')['求和项:数量（箱）'].sum().idxmax()
-                    region_info.append(
-                        f"{region}区域: 差异 {region_diff:.1f}%, 主要销售员: {top_salesperson}"
-                    )
+                    for _, region_data in product_regions.get(row['产品代码'], pd.DataFrame()).iterrows():
+                        region = region_data['所属区域']
+                        region_actual = region_data['求和项:数量（箱）']
+                        region_forecast = region_data['预计销售量']
+                        region_diff = (
+                                              region_actual - region_forecast) / region_actual * 100 if region_actual > 0 else 0
+
+                        # 找出该区域主要销售员
+                        top_salesperson = product_region_top_salesperson.get((row['产品代码'], region))
+                        if top_salesperson is not None:
+                            region_info.append(
+                                f"{region}区域: 差异 {region_diff:.1f}%, 主要销售员: {top_salesperson}"
+                            )
 
                     # 备货建议
-                    recent_sales = product_details.sort_values('所属年月', ascending=False)
                     recent_trend = 0
-                    if len(recent_sales) >= 2:
-                        recent_values = recent_sales.groupby('所属年月')['求和项:数量（箱）'].sum()
-                    if len(recent_values) >= 2:
+                    if len(product_month_data) >= 2:
+                        recent_values = product_month_data['求和项:数量（箱）']
                         latest_values = recent_values.iloc[:2].values
-                    if latest_values[1] > 0:  # 避免除以零
-                        recent_trend = (latest_values[0] - latest_values[1]) / latest_values[1] * 100
+                        if latest_values[1] > 0:  # 避免除以零
+                            recent_trend = (latest_values[0] - latest_values[1]) / latest_values[1] * 100
 
                     recommendation = "<b>备货建议:</b><br>"
                     if recent_trend > 15:
@@ -3725,98 +2563,85 @@ with tabs[0]:  # 总览与历史标签页
                         recommendation += "销量较稳定，建议维持当前备货水平，关注区域差异"
 
                     # 添加库存风险信息
-                    if not batch_risk_analysis.empty:
-                        product_batches = batch_risk_analysis[batch_risk_analysis['产品代码'] == row['产品代码']]
-                    if not product_batches.empty:
-                        high_risk_batches = product_batches[product_batches['风险程度'].isin(['极高风险', '高风险'])]
-                    if not high_risk_batches.empty:
-                        avg_age = high_risk_batches['库龄'].mean()
-                    total_qty = high_risk_batches['批次库存'].sum()
-                    total_value = high_risk_batches['批次价值'].sum()
-
-                    recommendation += f"<br><b>库存风险警示:</b><br>"
-                    recommendation += f"有{len(high_risk_batches)}个高风险批次，共{total_qty}箱，价值{total_value:,.2f}元，平均库龄{avg_age:.1f}天"
-                    recommendation += f"<br>建议采取积极清库措施，减少库存积压"
+                    product_high_risk = high_risk_by_product.get(row['产品代码'])
+                    if product_high_risk is not None and not product_high_risk.empty:
+                        avg_age = product_high_risk['库龄'].mean()
+                        total_qty = product_high_risk['批次库存'].sum()
+                        total_value = product_high_risk['批次价值'].sum()
+
+                        recommendation += f"<br><b>库存风险警示:</b><br>"
+                        recommendation += f"有{len(product_high_risk)}个高风险批次，共{total_qty}箱，价值{total_value:,.2f}元，平均库龄{avg_age:.1f}天"
+                        recommendation += f"<br>建议采取积极清库措施，减少库存积压"
 
                     # 合并所有信息
                     hover_info = "<br>".join(monthly_info) + "<br><br>" + "<br>".join(
                         region_info) + "<br><br>" + recommendation
 
-                    else:
+                else:
                     # 区域内该产品的销售员差异情况
-                    sales_details = region_filtered_salesperson[
-                        region_filtered_salesperson['产品代码'] == row['产品代码']]
+                    sales_details = product_salespersons.get(row['产品代码'], pd.DataFrame())
 
                     if not sales_details.empty:
-                    # 计算销售员差异
-                        sales_grouped = sales_details.groupby('销售员').agg({
-                            '求和项:数量（箱）': 'sum',
-                            '预计销售量': 'sum'
-                        })
-                    sales_grouped['数量差异'] = sales_grouped['求和项:数量（箱）'] - sales_grouped['预计销售量']
-                    sales_grouped['数量差异率'] = sales_grouped.apply(
-                        lambda x: (x['数量差异'] / x['求和项:数量（箱）'] * 100) if x['求和项:数量（箱）'] > 0 else 0,
-                        axis=1
-                    )
-                    sales_grouped = sales_grouped.sort_values(by='数量差异率', key=abs, ascending=False)
-
-                    # 构建悬停信息
-                    sales_info = []
-                    for salesperson, detail in sales_grouped.iterrows():
-                        sales_info.append(
-                            f"销售员 {salesperson}: 差异 {detail['数量差异率']:.1f}%, "
-                            f"实际 {detail['求和项:数量（箱）']:.0f}箱, 预测 {detail['预计销售量']:.0f}箱"
+                        # 计算销售员差异
+                        sales_grouped = sales_details.set_index('销售员')[['求和项:数量（箱）', '预计销售量']].copy()
+                        sales_grouped['数量差异'] = sales_grouped['求和项:数量（箱）'] - sales_grouped['预计销售量']
+                        sales_grouped['数量差异率'] = sales_grouped.apply(
+                            lambda x: (x['数量差异'] / x['求和项:数量（箱）'] * 100) if x['求和项:数量（箱）'] > 0 else 0,
+                            axis=1
                         )
+                        sales_grouped = sales_grouped.sort_values(by='数量差异率', key=abs, ascending=False)
+
+                        # 构建悬停信息
+                        sales_info = []
+                        for salesperson, detail in sales_grouped.iterrows():
+                            sales_info.append(
+                                f"销售员 {salesperson}: 差异 {detail['数量差异率']:.1f}%, "
+                                f"实际 {detail['求和项:数量（箱）']:.0f}箱, 预测 {detail['预计销售量']:.0f}箱"
+                            )
+
+                        # 备货建议
+                        recommendation = "<b>备货建议:</b><br>"
+                        overestimated = sales_grouped[sales_grouped['数量差异率'] < -10]
+                        underestimated = sales_grouped[sales_grouped['数量差异率'] > 10]
+
+                        if len(sales_grouped) > 0:
+                            if len(overestimated) > len(underestimated) * 1.5:
+                                recommendation += f"整体预测偏高，建议下调{min(30, round(abs(sales_grouped['数量差异率'].mean())))}%"
+                            elif len(underestimated) > len(overestimated) * 1.5:
+                                recommendation += f"整体预测偏低，建议上调{min(30, round(abs(sales_grouped['数量差异率'].mean())))}%"
+                            else:
+                                recommendation += "需针对具体销售员调整"
+                        else:
+                            recommendation += "数据不足，无法提供建议"
 
-                    # 备货建议
-                    recommendation = "<b>备货建议:</b><br>"
-                    overestimated = sales_grouped[sales_grouped['数量差异率'] < -10]
-                    underestimated = sales_grouped[sales_grouped['数量差异率'] > 10]
-
-                    if len(sales_grouped) > 0:
-                        if
-                    len(overestimated) > len(underestimated) * 1.5:
-                    recommendation += f"整体预测偏高，建议下调{min(30, round(abs(sales_grouped['数量差异率'].mean())))}%"
-                    elif len(underestimated) > len(overestimated) * 1.5:
-                    recommendation += f"整体预测偏低，建议上调{min(30, round(abs(sales_grouped['数量差异率'].mean())))}%"
-                    else:
-                    recommendation += "需针对具体销售员调整"
-                    else:
-                    recommendation += "数据不足，无法提供建议"
+                        # 添加库存风险信息
+                        product_high_risk = high_risk_by_product.get(row['产品代码'])
+                        if product_high_risk is not None and not product_high_risk.empty:
+                            avg_age = product_high_risk['库龄'].mean()
+                            total_qty = product_high_risk['批次库存'].sum()
+                            total_value = product_high_risk['批次价值'].sum()
 
-                    # 添加库存风险信息
-                    if not batch_risk_analysis.empty:
-                        product_batches = batch_risk_analysis[batch_risk_analysis['产品代码'] == row['产品代码']]
-                    if not product_batches.empty:
-                        high_risk_batches = product_batches[product_batches['风险程度'].isin(['极高风险', '高风险'])]
-                    if not high_risk_batches.empty:
-                        avg_age = high_risk_batches['库龄'].mean()
-                    total_qty = high_risk_batches['批次库存'].sum()
-                    total_value = high_risk_batches['批次价值'].sum()
-
-                    recommendation += f"<br><b>库存风险警示:</b><br>"
-                    recommendation += f"有{len(high_risk_batches)}个高风险批次，共{total_qty}箱，价值{total_value:,.2f}元，平均库龄{avg_age:.1f}天"
-                    recommendation += f"<br>建议采取积极清库措施，减少库存积压"
-
-                    hover_info = "<br>".join(sales_info) + "<br><br>" + recommendation
+                            recommendation += f"<br><b>库存风险警示:</b><br>"
+                            recommendation += f"有{len(product_high_risk)}个高风险批次，共{total_qty}箱，价值{total_value:,.2f}元，平均库龄{avg_age:.1f}天"
+                            recommendation += f"<br>建议采取积极清库措施，减少库存积压"
+
+                        hover_info = "<br>".join(sales_info) + "<br><br>" + recommendation
                     else:
-                    hover_info = "无详细销售员数据"
+                        hover_info = "无详细销售员数据"
 
-                    else:  # 销售员维度
-                    if selected_region_for_diff == '全国':
+            else:  # 销售员维度
+                if selected_region_for_diff == '全国':
                     # 查找该销售员的所有产品差异
-                        salesperson_products = diff_data[diff_data['销售员'] == row['销售员']]
+                    person_products = salesperson_products.get(row['销售员'], pd.DataFrame())
 
-                    # 按产品分组并计算差异
-                    product_grouped = salesperson_products.groupby('产品代码').agg({
-                        '求和项:数量（箱）': 'sum',
-                        '预计销售量': 'sum'
-                    })
+                    # 按产品计算差异
+                    product_grouped = person_products.set_index('产品代码')[['求和项:数量（箱）', '预计销售量']].copy() \
+                        if not person_products.empty else pd.DataFrame(columns=['求和项:数量（箱）', '预计销售量'])
                     product_grouped['数量差异'] = product_grouped['求和项:数量（箱）'] - product_grouped['预计销售量']
                     product_grouped['数量差异率'] = product_grouped.apply(
                         lambda x: (x['数量差异'] / x['求和项:数量（箱）'] * 100) if x['求和项:数量（箱）'] > 0 else 0,
                         axis=1
-                    )
+                    ) if not product_grouped.empty else []
                     # 按差异率绝对值排序
                     product_grouped = product_grouped.sort_values(by='数量差异率', key=abs, ascending=False)
 
@@ -3824,10 +2649,10 @@ with tabs[0]:  # 总览与历史标签页
                     products_info = []
                     for product_code, detail in product_grouped.head(10).iterrows():
                         product_name = format_product_code(product_code, product_info, include_name=True)
-                    products_info.append(
-                        f"{product_name}: 差异率 {detail['数量差异率']:.1f}%, "
-                        f"实际 {detail['求和项:数量（箱）']:.0f}箱, 预测 {detail['预计销售量']:.0f}箱"
-                    )
+                        products_info.append(
+                            f"{product_name}: 差异率 {detail['数量差异率']:.1f}%, "
+                            f"实际 {detail['求和项:数量（箱）']:.0f}箱, 预测 {detail['预计销售量']:.0f}箱"
+                        )
 
                     # 生成备货建议
                     recommendation = "<b>备货建议:</b><br>"
@@ -3835,289 +2660,271 @@ with tabs[0]:  # 总览与历史标签页
                     underestimated = product_grouped[product_grouped['数量差异率'] > 10]
 
                     if len(product_grouped) > 0:
-                        if
-                    len(overestimated) > len(underestimated) * 1.5:
-                    recommendation += f"该销售员整体高估趋势，建议下调预测10-15%<br>"
-                    elif len(underestimated) > len(overestimated) * 1.5:
-                    recommendation += f"该销售员整体低估趋势，建议上调预测10-15%<br>"
-                    else:
-                    recommendation += "需针对具体产品调整:<br>"
+                        if len(overestimated) > len(underestimated) * 1.5:
+                            recommendation += f"该销售员整体高估趋势，建议下调预测10-15%<br>"
+                        elif len(underestimated) > len(overestimated) * 1.5:
+                            recommendation += f"该销售员整体低估趋势，建议上调预测10-15%<br>"
+                        else:
+                            recommendation += "需针对具体产品调整:<br>"
 
-                    # 添加最需要调整的3个产品建议
-                    top_products = 0
-                    for product_code, detail in product_grouped.head(5).iterrows():
-                        if
-                    abs(detail['数量差异率']) > 10 and top_products < 3:
-                    product_name = format_product_code(product_code, product_info, include_name=True)
-                    adjustment = min(50, abs(round(detail['数量差异率'])))
+                            # 添加最需要调整的3个产品建议
+                            top_products = 0
+                            for product_code, detail in product_grouped.head(5).iterrows():
+                                if abs(detail['数量差异率']) > 10 and top_products < 3:
+                                    product_name = format_product_code(product_code, product_info, include_name=True)
+                                    adjustment = min(50, abs(round(detail['数量差异率'])))
 
-                    if detail['数量差异率'] > 10:
-                        recommendation += f"· {product_name}: 上调预测{adjustment}%<br>"
-                    else:
-                        recommendation += f"· {product_name}: 下调预测{adjustment}%<br>"
+                                    if detail['数量差异率'] > 10:
+                                        recommendation += f"· {product_name}: 上调预测{adjustment}%<br>"
+                                    else:
+                                        recommendation += f"· {product_name}: 下调预测{adjustment}%<br>"
 
-                    top_products += 1
+                                    top_products += 1
                     else:
-                    recommendation += "数据不足，无法提供建议"
+                        recommendation += "数据不足，无法提供建议"
 
                     # 添加库存风险责任信息
-                    if not batch_risk_analysis.empty:
-                        person_responsibility = batch_risk_analysis[batch_risk_analysis['责任人'] == row['销售员']]
-                    if not person_responsibility.empty:
-                        high_risk_count =
-                        person_responsibility[person_responsibility['风险程度'].isin(['极高风险', '高风险'])].shape[0]
+                    person_high_risk = high_risk_batches[high_risk_batches['责任人'] == row['销售员']]
+                    high_risk_count = person_high_risk.shape[0]
                     if high_risk_count > 0:
-                        total_value =
-                        person_responsibility[person_responsibility['风险程度'].isin(['极高风险', '高风险'])][
-                            '批次价值'].sum()
+                        total_value = person_high_risk['批次价值'].sum()
 
-                    recommendation += f"<br><b>库存责任警示:</b><br>"
-                    recommendation += f"该销售员负责{high_risk_count}个高风险批次，价值{total_value:,.2f}元"
-                    recommendation += f"<br>建议提高预测准确性，减少未来库存积压"
+                        recommendation += f"<br><b>库存责任警示:</b><br>"
+                        recommendation += f"该销售员负责{high_risk_count}个高风险批次，价值{total_value:,.2f}元"
+                        recommendation += f"<br>建议提高预测准确性，减少未来库存积压"
 
                     hover_info = "<br>".join(products_info) + "<br><br>" + recommendation
 
-                    else:
+                else:
                     # 区域内该销售员的产品差异情况
-                    product_details = diff_data[diff_data['销售员'] == row['销售员']]
+                    product_details = salesperson_products.get(row['销售员'], pd.DataFrame())
                     if not product_details.empty:
-                    # 计算产品差异
+                        # 计算产品差异
+                        product_details = product_details.copy()
                         product_details['数量差异'] = product_details['求和项:数量（箱）'] - product_details['预计销售量']
-                    product_details['数量差异率'] = product_details.apply(
-                        lambda x: (x['数量差异'] / x['求和项:数量（箱）'] * 100) if x['求和项:数量（箱）'] > 0 else 0,
-                        axis=1
-                    )
-                    product_details = product_details.sort_values(by='数量差异率', key=abs, ascending=False)
-
-                    # 构建悬停信息（最多10个产品）
-                    products_info = []
-                    for _, detail in product_details.head(10).iterrows():
-                        product_name = format_product_code(detail['产品代码'], product_info, include_name=True)
-                    products_info.append(
-                        f"{product_name}: 差异率 {detail['数量差异率']:.1f}%, "
-                        f"实际 {detail['求和项:数量（箱）']:.0f}箱, 预测 {detail['预计销售量']:.0f}箱"
-                    )
+                        product_details['数量差异率'] = product_details.apply(
+                            lambda x: (x['数量差异'] / x['求和项:数量（箱）'] * 100) if x['求和项:数量（箱）'] > 0 else 0,
+                            axis=1
+                        )
+                        product_details = product_details.sort_values(by='数量差异率', key=abs, ascending=False)
+
+                        # 构建悬停信息（最多10个产品）
+                        products_info = []
+                        for _, detail in product_details.head(10).iterrows():
+                            product_name = format_product_code(detail['产品代码'], product_info, include_name=True)
+                            products_info.append(
+                                f"{product_name}: 差异率 {detail['数量差异率']:.1f}%, "
+                                f"实际 {detail['求和项:数量（箱）']:.0f}箱, 预测 {detail['预计销售量']:.0f}箱"
+                            )
+
+                        # 备货建议
+                        recommendation = "<b>备货建议:</b><br>"
+                        overestimated = product_details[product_details['数量差异率'] < -10]
+                        underestimated = product_details[product_details['数量差异率'] > 10]
+
+                        if len(overestimated) > len(underestimated) * 1.5:
+                            recommendation += f"该销售员在{selected_region_for_diff}区域整体高估，建议下调预测{min(30, round(abs(product_details['数量差异率'].mean())))}%"
+                        elif len(underestimated) > len(overestimated) * 1.5:
+                            recommendation += f"该销售员在{selected_region_for_diff}区域整体低估，建议上调预测{min(30, round(abs(product_details['数量差异率'].mean())))}%"
+                        else:
+                            recommendation += "需针对具体产品调整:<br>"
+                            # 添加前3个差异最大产品的建议
+                            for detail in product_details.head(3).itertuples():
+                                if hasattr(detail, '数量差异率') and abs(detail.数量差异率) > 10:
+                                    product_name = format_product_code(detail.产品代码, product_info, include_name=True)
+                                    adjustment = min(50, abs(round(detail.数量差异率)))
+                                    if detail.数量差异率 > 10:
+                                        recommendation += f"· {product_name}: 上调预测{adjustment}%<br>"
+                                    else:
+                                        recommendation += f"· {product_name}: 下调预测{adjustment}%<br>"
+
+                        # 添加库存风险责任信息
+                        person_high_risk = high_risk_batches[
+                            (high_risk_batches['责任人'] == row['销售员']) &
+                            (high_risk_batches['责任区域'] == selected_region_for_diff)
+                            ]
+                        high_risk_count = person_high_risk.shape[0]
+                        if high_risk_count > 0:
+                            total_value = person_high_risk['批次价值'].sum()
 
-                    # 备货建议
-                    recommendation = "<b>备货建议:</b><br>"
-                    overestimated = product_details[product_details['数量差异率'] < -10]
-                    underestimated = product_details[product_details['数量差异率'] > 10]
+                            recommendation += f"<br><b>库存责任警示:</b><br>"
+                            recommendation += f"该销售员在此区域负责{high_risk_count}个高风险批次，价值{total_value:,.2f}元"
+                            recommendation += f"<br>建议提高预测准确性，减少未来库存积压"
 
-                    if len(overestimated) > len(underestimated) * 1.5:
-                        recommendation += f"该销售员在{selected_region_for_diff}区域整体高估，建议下调预测{min(30, round(abs(product_details['数量差异率'].mean())))}%"
-                    elif len(underestimated) > len(overestimated) * 1.5:
-                        recommendation += f"该销售员在{selected_region_for_diff}区域整体低估，建议上调预测{min(30, round(abs(product_details['数量差异率'].mean())))}%"
-                    else:
-                        recommendation += "需针对具体产品调整:<br>"
-                    # 添加前3个差异最大产品的建议
-                    for idx, detail in enumerate(product_details.head(3).itertuples()):
-                        if
-                    hasattr(detail, '数量差异率') and abs(detail.数量差异率) > 10:
-                    product_name = format_product_code(detail.产品代码, product_info, include_name=True)
-                    adjustment = min(50, abs(round(detail.数量差异率)))
-                    if detail.数量差异率 > 10:
-                        recommendation += f"· {product_name}: 上调预测{adjustment}%<br>"
+                        hover_info = "<br>".join(products_info) + "<br><br>" + recommendation
                     else:
-                        recommendation += f"· {product_name}: 下调预测{adjustment}%<br>"
+                        hover_info = "无详细产品数据"
 
-                    # 添加库存风险责任信息
-                    if not batch_risk_analysis.empty:
-                        person_responsibility = batch_risk_analysis[
-                            (batch_risk_analysis['责任人'] == row['销售员']) &
-                            (batch_risk_analysis['责任区域'] == selected_region_for_diff)
-                            ]
-                    if not person_responsibility.empty:
-                        high_risk_count =
-                        person_responsibility[person_responsibility['风险程度'].isin(['极高风险', '高风险'])].shape[0]
-                    if high_risk_count > 0:
-                        total_value =
-                        person_responsibility[person_responsibility['风险程度'].isin(['极高风险', '高风险'])][
-                            '批次价值'].sum()
+            hover_data.append(hover_info)
 
-                    recommendation += f"<br><b>库存责任警示:</b><br>"
-                    recommendation += f"该销售员在此区域负责{high_risk_count}个高风险批次，价值{total_value:,.2f}元"
-                    recommendation += f"<br>建议提高预测准确性，减少未来库存积压"
+        # 创建水平堆叠柱状图
+        fig_diff = go.Figure()
 
-                    hover_info = "<br>".join(products_info) + "<br><br>" + recommendation
-                    else:
-                    hover_info = "无详细产品数据"
-
-                    hover_data.append(hover_info)
-
-                    # 创建水平堆叠柱状图
-                    fig_diff = go.Figure()
-
-                    # 添加实际销售量柱
-                    fig_diff.add_trace(go.Bar(
-                        y=top_diff_items[dimension_column],
-                        x=top_diff_items['求和项:数量（箱）'],
-                        name='实际销售量',
-                        marker_color='royalblue',
-                        orientation='h',
-                        customdata=hover_data,
-                        hovertemplate='<b>%{y}</b><br>实际销售量: %{x:,.0f}箱<br><br><b>详细差异来源:</b><br>%{customdata}<extra></extra>'
-                    ))
-
-                    # 添加预测销售量柱
-                    fig_diff.add_trace(go.Bar(
-                        y=top_diff_items[dimension_column],
-                        x=top_diff_items['预计销售量'],
-                        name='预测销售量',
-                        marker_color='lightcoral',
-                        orientation='h',
-                        hovertemplate='<b>%{y}</b><br>预测销售量: %{x:,.0f}箱<extra></extra>'
-                    ))
-
-                    # 添加差异率点
-                    fig_diff.add_trace(go.Scatter(
-                        y=top_diff_items[dimension_column],
-                        x=[top_diff_items['求和项:数量（箱）'].max() * 1.05] * len(top_diff_items),  # 放在右侧
-                        mode='markers+text',
-                        marker=dict(
-                            color=top_diff_items['数量差异率'].apply(lambda x: 'green' if x > 0 else 'red'),
-                            size=10
-                        ),
-                        text=[f"{x:.1f}%" for x in top_diff_items['数量差异率']],
-                        textposition='middle right',
-                        name='差异率 (%)',
-                        hovertemplate='<b>%{y}</b><br>差异率: %{text}<extra></extra>'
-                    ))
-
-                    # 更新布局
-                    title = f"{selected_region_for_diff}预测与实际销售对比 (按{analysis_dimension}维度，差异率降序)"
-                    fig_diff.update_layout(
-                        title=title,
-                        xaxis=dict(
-                            title="销售量 (箱)",
-                            tickformat=",",
-                            showexponent="none"
-                        ),
-                        yaxis=dict(title=analysis_dimension),
-                        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                        barmode='group',
-                        plot_bgcolor='white',
-                        hoverlabel=dict(
-                            bgcolor="white",
-                            font_size=12
-                        ),
-                        height=max(600, len(top_diff_items) * 25)  # 动态调整高度以适应数据量
-                    )
+        # 添加实际销售量柱
+        fig_diff.add_trace(go.Bar(
+            y=top_diff_items[dimension_column],
+            x=top_diff_items['求和项:数量（箱）'],
+            name='实际销售量',
+            marker_color='royalblue',
+            orientation='h',
+            customdata=hover_data,
+            hovertemplate='<b>%{y}</b><br>实际销售量: %{x:,.0f}箱<br><br><b>详细差异来源:</b><br>%{customdata}<extra></extra>'
+        ))
+
+        # 添加预测销售量柱
+        fig_diff.add_trace(go.Bar(
+            y=top_diff_items[dimension_column],
+            x=top_diff_items['预计销售量'],
+            name='预测销售量',
+            marker_color='lightcoral',
+            orientation='h',
+            hovertemplate='<b>%{y}</b><br>预测销售量: %{x:,.0f}箱<extra></extra>'
+        ))
 
-                    st.plotly_chart(fig_diff, use_container_width=True)
+        # 添加差异率点
+        fig_diff.add_trace(go.Scatter(
+            y=top_diff_items[dimension_column],
+            x=[top_diff_items['求和项:数量（箱）'].max() * 1.05] * len(top_diff_items),  # 放在右侧
+            mode='markers+text',
+            marker=dict(
+                color=top_diff_items['数量差异率'].apply(lambda x: 'green' if x > 0 else 'red'),
+                size=10
+            ),
+            text=[f"{x:.1f}%" for x in top_diff_items['数量差异率']],
+            textposition='middle right',
+            name='差异率 (%)',
+            hovertemplate='<b>%{y}</b><br>差异率: %{text}<extra></extra>'
+        ))
 
-                    # 预测偏差与库存风险关系分析
-                    st.markdown('<div class="sub-header">📊 预测偏差与库存风险关系分析</div>', unsafe_allow_html=True)
+        # 更新布局
+        title = f"{selected_region_for_diff}预测与实际销售对比 (按{analysis_dimension}维度，差异率降序)"
+        fig_diff.update_layout(
+            title=title,
+            xaxis=dict(
+                title="销售量 (箱)",
+                tickformat=",",
+                showexponent="none"
+            ),
+            yaxis=dict(title=analysis_dimension),
+            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+            barmode='group',
+            plot_bgcolor='white',
+            hoverlabel=dict(
+                bgcolor="white",
+                font_size=12
+            ),
+            height=max(600, len(top_diff_items) * 25)  # 动态调整高度以适应数据量
+        )
 
-                    # 创建预测偏差分析图
-                    bias_chart = create_forecast_bias_chart(batch_risk_analysis, actual_data, forecast_data)
-                    if bias_chart:
-                        st.plotly_chart(bias_chart, use_container_width=True)
-                    else:
-                        st.info("没有足够的数据来生成预测偏差分析图")
+        st.plotly_chart(fig_diff, use_container_width=True)
+
+        # 预测偏差与库存风险关系分析
+        st.markdown('<div class="sub-header">📊 预测偏差与库存风险关系分析</div>', unsafe_allow_html=True)
 
-                    # 预测偏差与库存风险关系解读
-                    bias_explanation = """
+        # 创建预测偏差分析图
+        bias_chart = risk_chart_view(create_forecast_bias_chart, batch_risk_analysis, actual_data, forecast_data)
+        if bias_chart:
+            st.plotly_chart(bias_chart, use_container_width=True)
+        else:
+            st.info("没有足够的数据来生成预测偏差分析图")
+
+        # 预测偏差与库存风险关系解读
+        bias_explanation = """
         <b>图表解读：</b> 此图分析了预测准确性对库存积压的影响。红色表示预测过高(实际销量低于预测)，导致不必要的库存积压；蓝色表示预测过低(实际销量高于预测)，可能导致缺货和销售机会损失。图表按偏差绝对值大小排序，展示偏差最显著的批次。
         """
 
-                    # 添加具体分析
-                    if not batch_risk_analysis.empty:
-                        high_risk_batches = batch_risk_analysis[
-                            batch_risk_analysis['风险程度'].isin(['极高风险', '高风险'])]
-                    if not high_risk_batches.empty:
-                        high_pred_count = sum(
-                            1 for bias in high_risk_batches['日均出货'] / high_risk_batches['批次库存'] * 100 if
-                            bias < 30)
-                    bias_explanation += f"<br><b>关键发现：</b> {high_pred_count}个高风险批次的日均出货量不到批次库存的30%，表明预测过高导致库存积压。"
-                    bias_explanation += f"预测准确性与库存健康度密切相关，提高预测准确性是减少库存积压的关键。"
-
-                    # 重点人员分析
-                    top_persons = high_risk_batches['责任人'].value_counts().head(3)
-                    if not top_persons.empty:
-                        persons_list = [f"{person}({count}个批次)" for person, count in top_persons.items()]
-                    bias_explanation += f"<br><b>重点关注人员：</b> {', '.join(persons_list)}的预测准确性问题是库存积压的主要来源，应优先提高这些人员的预测能力。"
-
-                    add_chart_explanation(bias_explanation)
-
-                    # 动态解读
-                    diff_explanation = f"""
+        # 添加具体分析
+        if not high_risk_batches.empty:
+            high_pred_count = sum(
+                1 for bias in high_risk_batches['日均出货'] / high_risk_batches['批次库存'] * 100 if
+                bias < 30)
+            bias_explanation += f"<br><b>关键发现：</b> {high_pred_count}个高风险批次的日均出货量不到批次库存的30%，表明预测过高导致库存积压。"
+            bias_explanation += f"预测准确性与库存健康度密切相关，提高预测准确性是减少库存积压的关键。"
+
+            # 重点人员分析
+            top_persons = high_risk_batches['责任人'].value_counts().head(3)
+            if not top_persons.empty:
+                persons_list = [f"{person}({count}个批次)" for person, count in top_persons.items()]
+                bias_explanation += f"<br><b>重点关注人员：</b> {', '.join(persons_list)}的预测准确性问题是库存积压的主要来源，应优先提高这些人员的预测能力。"
+
+        add_chart_explanation(bias_explanation)
+
+        # 动态解读
+        diff_explanation = f"""
         <b>图表解读：</b> 此图展示{selected_region_for_diff}的{analysis_dimension}维度预测差异情况，蓝色代表实际销售量，红色代表预测销售量，点的颜色表示差异率(绿色为低估，红色为高估)。
         悬停在"实际销售量"条形上，可以查看详细的差异来源，包括区域、销售员或产品的具体信息。这有助于精确定位预测不准确的具体原因。
         """
 
-                    # 添加数据钻取分析建议
-                    diff_explanation += f"<br><b>差异分析建议：</b> "
+        # 添加数据钻取分析建议
+        diff_explanation += f"<br><b>差异分析建议：</b> "
 
-                    if analysis_dimension == '产品':
-                        diff_explanation += "对于差异较大的产品，建议分析产品在不同区域和销售员间的表现差异，识别特定产品预测准确性的影响因素；"
-                    if selected_region_for_diff == '全国':
-                        diff_explanation += "可进一步选择特定区域，深入分析该区域内产品的销售员层面差异。"
-                    else:
-                        diff_explanation += "可切换到销售员维度，分析本区域内销售员对产品预测的准确程度。"
-                    else:  # 销售员维度
-                    diff_explanation += "对于差异较大的销售员，建议分析其销售的产品组合和区域分布，识别特定销售员预测准确性的影响因素；"
-                    if selected_region_for_diff == '全国':
-                        diff_explanation += "可进一步选择特定区域，深入分析该区域内销售员的产品层面差异。"
-                    else:
-                        diff_explanation += "可切换到产品维度，分析本区域内产品的销售员层面差异。"
-
-                    add_chart_explanation(diff_explanation)
-
-                    with tabs[2]:  # 产品趋势标签页
-                    # 在标签页内添加筛选器
-                        st.markdown("### 📊 分析筛选")
-                    with st.expander("筛选条件", expanded=True):
-                        col1, col2 = st.columns(2)
-                    with col1:
-                        trend_selected_months = st.multiselect(
-                            "选择分析月份",
-                            options=all_months,
-                            default=valid_last_three_months if valid_last_three_months else (
-                                [all_months[-1]] if all_months else []),
-                            key="trend_months"
-                        )
+        if analysis_dimension == '产品':
+            diff_explanation += "对于差异较大的产品，建议分析产品在不同区域和销售员间的表现差异，识别特定产品预测准确性的影响因素；"
+            if selected_region_for_diff == '全国':
+                diff_explanation += "可进一步选择特定区域，深入分析该区域内产品的销售员层面差异。"
+            else:
+                diff_explanation += "可切换到销售员维度，分析本区域内销售员对产品预测的准确程度。"
+        else:  # 销售员维度
+            diff_explanation += "对于差异较大的销售员，建议分析其销售的产品组合和区域分布，识别特定销售员预测准确性的影响因素；"
+            if selected_region_for_diff == '全国':
+                diff_explanation += "可进一步选择特定区域，深入分析该区域内销售员的产品层面差异。"
+            else:
+                diff_explanation += "可切换到产品维度，分析本区域内产品的销售员层面差异。"
 
-                    with col2:
-                        trend_selected_regions = st.multiselect(
-                            "选择区域",
-                            options=all_regions,
-                            default=all_regions,
-                            key="trend_regions"
-                        )
+        add_chart_explanation(diff_explanation)
 
-                    # 筛选数据
-                    trend_filtered_monthly = filter_data(processed_data['merged_monthly'], trend_selected_months,
-                                                         trend_selected_regions)
-                    trend_filtered_salesperson = filter_data(processed_data['merged_by_salesperson'],
-                                                             trend_selected_months,
-                                                             trend_selected_regions)
 
-                    # 检查筛选条件是否有效
-                    if not trend_selected_months or not trend_selected_regions:
-                        st.warning("请选择至少一个月份和一个区域进行分析。")
-                    else:
-                        st.markdown("### 产品销售趋势分析")
-
-                    # 动态计算所选区域的产品增长率 - 移除缓存装饰器确保响应筛选
-                    product_growth = calculate_product_growth(actual_monthly=actual_data,
-                                                              regions=trend_selected_regions,
-                                                              months=trend_selected_months)
-
-                    if 'latest_growth' in product_growth and not product_growth['latest_growth'].empty:
-                    # 简要统计
-                        latest_growth = product_growth['latest_growth']
-                    growth_stats = {
-                        '强劲增长': len(latest_growth[latest_growth['趋势'] == '强劲增长']),
-                        '增长': len(latest_growth[latest_growth['趋势'] == '增长']),
-                        '轻微下降': len(latest_growth[latest_growth['趋势'] == '轻微下降']),
-                        '显著下降': len(latest_growth[latest_growth['趋势'] == '显著下降'])
-                    }
-
-                    # 统计指标卡
-                    col1, col2, col3, col4 = st.columns(4)
-
-                    with col1:
-                        st.markdown(f"""
+# 函数：产品趋势标签页（作为独立片段运行，筛选条件变化时只重新执行本标签页）
+@st.fragment
+@timed_fragment("产品趋势")
+def render_trend_tab():
+    # 在标签页内添加筛选器
+    st.markdown("### 📊 分析筛选")
+    with st.expander("筛选条件", expanded=True):
+        col1, col2 = st.columns(2)
+        with col1:
+            trend_selected_months = st.multiselect(
+                "选择分析月份",
+                options=all_months,
+                default=valid_last_three_months if valid_last_three_months else (
+                    [all_months[-1]] if all_months else []),
+                key="trend_months"
+            )
+
+        with col2:
+            trend_selected_regions = st.multiselect(
+                "选择区域",
+                options=all_regions,
+                default=all_regions,
+                key="trend_regions"
+            )
+
+    # 检查筛选条件是否有效
+    if not trend_selected_months or not trend_selected_regions:
+        st.warning("请选择至少一个月份和一个区域进行分析。")
+    else:
+        st.markdown("### 产品销售趋势分析")
+
+        # 动态计算所选区域的产品增长率 - 按出货数据版本和筛选条件缓存
+        product_growth = product_growth_for_view(actual_version, actual_summary,
+                                                 trend_selected_regions, trend_selected_months,
+                                                 snapshot_results)
+
+        if 'latest_growth' in product_growth and not product_growth['latest_growth'].empty:
+            # 简要统计
+            latest_growth = product_growth['latest_growth']
+            growth_stats = {
+                '强劲增长': len(latest_growth[latest_growth['趋势'] == '强劲增长']),
+                '增长': len(latest_growth[latest_growth['趋势'] == '增长']),
+                '轻微下降': len(latest_growth[latest_growth['趋势'] == '轻微下降']),
+                '显著下降': len(latest_growth[latest_growth['趋势'] == '显著下降'])
+            }
+
+            # 统计指标卡
+            col1, col2, col3, col4 = st.columns(4)
+
+            with col1:
+                st.markdown(f"""
                 <div class="metric-card" style="border-left: 0.5rem solid #2E8B57;">
                     <p class="card-header">强劲增长产品</p>
                     <p class="card-value">{growth_stats['强劲增长']}</p>
@@ -4125,8 +2932,8 @@ with tabs[0]:  # 总览与历史标签页
                 </div>
                 """, unsafe_allow_html=True)
 
-                    with col2:
-                        st.markdown(f"""
+            with col2:
+                st.markdown(f"""
                 <div class="metric-card" style="border-left: 0.5rem solid #4CAF50;">
                     <p class="card-header">增长产品</p>
                     <p class="card-value">{growth_stats['增长']}</p>
@@ -4134,8 +2941,8 @@ with tabs[0]:  # 总览与历史标签页
                 </div>
                 """, unsafe_allow_html=True)
 
-                    with col3:
-                        st.markdown(f"""
+            with col3:
+                st.markdown(f"""
                 <div class="metric-card" style="border-left: 0.5rem solid #FFA500;">
                     <p class="card-header">轻微下降产品</p>
                     <p class="card-value">{growth_stats['轻微下降']}</p>
@@ -4143,8 +2950,8 @@ with tabs[0]:  # 总览与历史标签页
                 </div>
                 """, unsafe_allow_html=True)
 
-                    with col4:
-                        st.markdown(f"""
+            with col4:
+                st.markdown(f"""
                 <div class="metric-card" style="border-left: 0.5rem solid #F44336;">
                     <p class="card-header">显著下降产品</p>
                     <p class="card-value">{growth_stats['显著下降']}</p>
@@ -4152,30 +2959,30 @@ with tabs[0]:  # 总览与历史标签页
                 </div>
                 """, unsafe_allow_html=True)
 
-                    # 显示备货建议表格 - 使用修改后的函数避免乱码
-                    display_recommendations_table(latest_growth, product_info)
+            # 显示备货建议表格 - 使用修改后的函数避免乱码
+            display_recommendations_table(latest_growth, product_info)
 
-                    # 清库预测分析
-                    st.markdown('<div class="sub-header">📊 产品清库预测分析</div>', unsafe_allow_html=True)
+            # 清库预测分析
+            st.markdown('<div class="sub-header">📊 产品清库预测分析</div>', unsafe_allow_html=True)
 
-                    # 创建清库预测图
-                    clearance_chart = create_clearance_forecast_chart(batch_risk_analysis)
-                    if clearance_chart:
-                        st.plotly_chart(clearance_chart, use_container_width=True)
-                    else:
-                        st.info("没有高风险批次数据来生成清库预测图")
+            # 创建清库预测图
+            clearance_chart = risk_chart_view(create_clearance_forecast_chart, batch_risk_analysis)
+            if clearance_chart:
+                st.plotly_chart(clearance_chart, use_container_width=True)
+            else:
+                st.info("没有高风险批次数据来生成清库预测图")
 
-                    # 清库预测解读
-                    clearance_explanation = """
+            # 清库预测解读
+            clearance_explanation = """
             <b>图表解读：</b> 此图对比展示了高风险批次的预计清库天数(红色)和当前库龄(蓝色)。预计清库天数基于当前日均销量计算，表示在当前销售速度下消化完该批次库存所需的时间。垂直红线表示90天高风险阈值。
             """
 
-                    # 添加具体分析
-                    if not batch_risk_analysis.empty:
-                        high_risk_batches = batch_risk_analysis[
-                            batch_risk_analysis['风险程度'].isin(['极高风险', '高风险'])]
-                    if not high_risk_batches.empty:
-                        avg_clearance = high_risk_batches['预计清库天数'].replace(float('inf'), 365).mean()
+            # 添加具体分析
+            if not batch_risk_analysis.empty:
+                high_risk_batches = batch_risk_analysis[
+                    batch_risk_analysis['风险程度'].isin(['极高风险', '高风险'])]
+                if not high_risk_batches.empty:
+                    avg_clearance = high_risk_batches['预计清库天数'].replace(float('inf'), 365).mean()
                     infinite_count = sum(1 for x in high_risk_batches['预计清库天数'] if x == float('inf'))
 
                     clearance_explanation += f"<br><b>关键发现：</b> 分析显示高风险批次平均清库时间约{avg_clearance:.1f}天，远超90天风险阈值。"
@@ -4184,88 +2991,83 @@ with tabs[0]:  # 总览与历史标签页
 
                     clearance_explanation += f"<br>库存处理优先级应是：无销量批次 > 清库天数超过180天批次 > 其余高风险批次。建议采取促销、转仓、调配或特价处理等措施加速库存周转。"
 
-                    add_chart_explanation(clearance_explanation)
-                    else:
-                    st.warning("没有足够的历史数据来计算产品增长率。需要至少两年的销售数据才能计算同比增长。")
-
-                    with tabs[3]:  # 重点SKU分析标签页
-                    # 添加筛选器 - 增加月份筛选
-                        st.markdown("### 📊 分析筛选")
-                    with st.expander("筛选条件", expanded=True):
-                        col1, col2 = st.columns(2)
-
-                    # 获取当前系统月份作为默认值
-                    current_month = datetime.now().strftime('%Y-%m')
-                    current_month_in_data = False
-
-                    # 检查当前月份是否在数据集中
-                    if current_month in all_months:
-                        current_month_in_data = True
-                    default_month = [current_month]
-                    else:
-                    # 如果当前月份不在数据中，使用数据中的最新月份
-                    default_month = [all_months[-1]] if all_months else []
-
-                    with col1:
-                        sku_selected_months = st.multiselect(
-                            "选择分析月份",
-                            options=all_months,
-                            default=default_month,
-                            key="sku_months"
-                        )
-                    with col2:
-                        sku_selected_regions = st.multiselect(
-                            "选择区域",
-                            options=all_regions,
-                            default=all_regions,
-                            key="sku_regions"
-                        )
+            add_chart_explanation(clearance_explanation)
+        else:
+            st.warning("没有足够的历史数据来计算产品增长率。需要至少两年的销售数据才能计算同比增长。")
 
-                    # 筛选数据
-                    sku_filtered_monthly = filter_data(processed_data['merged_monthly'], sku_selected_months,
-                                                       sku_selected_regions)
-                    sku_filtered_salesperson = filter_data(processed_data['merged_by_salesperson'], sku_selected_months,
-                                                           sku_selected_regions)
 
-                    # 重新计算重点SKU，而非使用预计算的结果
-                    filtered_national_top_skus = calculate_top_skus(sku_filtered_monthly, by_region=False)
-                    filtered_regional_top_skus = calculate_top_skus(sku_filtered_monthly, by_region=True)
+# 函数：重点SKU分析标签页（作为独立片段运行，筛选条件变化时只重新执行本标签页）
+@st.fragment
+@timed_fragment("重点SKU分析")
+def render_key_sku_tab():
+    # 添加筛选器 - 增加月份筛选
+    st.markdown("### 📊 分析筛选")
+    with st.expander("筛选条件", expanded=True):
+        col1, col2 = st.columns(2)
 
-                    # 使用新计算的结果
-                    national_top_skus = filtered_national_top_skus
-                    regional_top_skus = filtered_regional_top_skus
+        # 获取当前系统月份作为默认值
+        current_month = datetime.now().strftime('%Y-%m')
+        current_month_in_data = False
 
-                    # 检查筛选条件是否有效
-                    if not sku_selected_months or not sku_selected_regions:
-                        st.warning("请选择至少一个月份和一个区域进行分析。")
-                    else:
-                        st.markdown("### 销售量占比80%重点SKU分析")
-
-                    # 默认使用全国数据，不再提供选择器
-                    selected_scope = "全国"
-
-                    # 根据用户选择显示相应数据
-                    if selected_scope == "全国":
-                    # 显示全国重点SKU分析
-                        if
-                    not national_top_skus.empty:
-                    # 格式化准确率为百分比
-                    national_top_skus['数量准确率'] = national_top_skus['数量准确率'] * 100
-
-                    # 添加产品名称
-                    national_top_skus['产品名称'] = national_top_skus['产品代码'].apply(
-                        lambda x: product_names_map.get(x, '') if product_names_map else ''
-                    )
-                    national_top_skus['产品显示'] = national_top_skus.apply(
-                        lambda row: format_product_code(row['产品代码'], product_info, include_name=True),
-                        axis=1
-                    )
+        # 检查当前月份是否在数据集中
+        if current_month in all_months:
+            current_month_in_data = True
+            default_month = [current_month]
+        else:
+            # 如果当前月份不在数据中，使用数据中的最新月份
+            default_month = [all_months[-1]] if all_months else []
 
-                    # 合并增长率数据和备货建议
+        with col1:
+            sku_selected_months = st.multiselect(
+                "选择分析月份",
+                options=all_months,
+                default=default_month,
+                key="sku_months"
+            )
+        with col2:
+            sku_selected_regions = st.multiselect(
+                "选择区域",
+                options=all_regions,
+                default=all_regions,
+                key="sku_regions"
+            )
+
+    # 检查筛选条件是否有效
+    if not sku_selected_months or not sku_selected_regions:
+        st.warning("请选择至少一个月份和一个区域进行分析。")
+    else:
+        st.markdown("### 销售量占比80%重点SKU分析")
+
+        # 从销售立方体切片出区域×产品汇总，重新计算重点SKU而非使用预计算的结果
+        sku_region_products = cube_view(['所属区域', '产品代码'], sku_selected_months,
+                                        sku_selected_regions)
+        national_top_skus = calculate_top_skus(sku_region_products, by_region=False)
+        regional_top_skus = calculate_top_skus(sku_region_products, by_region=True)
+
+        # 默认使用全国数据，不再提供选择器
+        selected_scope = "全国"
+
+        # 根据用户选择显示相应数据
+        if selected_scope == "全国":
+            # 显示全国重点SKU分析
+            if not national_top_skus.empty:
+                # 格式化准确率为百分比
+                national_top_skus['数量准确率'] = national_top_skus['数量准确率'] * 100
+
+                # 添加产品名称
+                national_top_skus['产品名称'] = national_top_skus['产品代码'].apply(
+                    lambda x: product_names_map.get(x, '') if product_names_map else ''
+                )
+                national_top_skus['产品显示'] = national_top_skus.apply(
+                    lambda row: format_product_code(row['产品代码'], product_info, include_name=True),
+                    axis=1
+                )
+
+                # 合并增长率数据和备货建议
                 try:
                     # 使用当前选择的区域和月份计算增长率
-                    product_growth_data = calculate_product_growth(
-                        actual_monthly=actual_data,
+                    product_growth_data = cached_product_growth(
+                        actual_version, actual_summary,
                         regions=sku_selected_regions,
                         months=sku_selected_months
                     ).get('latest_growth', pd.DataFrame())
@@ -4443,8 +3245,8 @@ with tabs[0]:  # 总览与历史标签页
                 # 合并增长率数据和备货建议
                 try:
                     # 使用当前选择的区域和月份计算增长率
-                    product_growth_data = calculate_product_growth(
-                        actual_monthly=actual_data,
+                    product_growth_data = cached_product_growth(
+                        actual_version, actual_summary,
                         regions=[selected_scope],  # 只使用所选区域
                         months=sku_selected_months
                     ).get('latest_growth', pd.DataFrame())
@@ -4688,7 +3490,11 @@ with tabs[0]:  # 总览与历史标签页
             else:
                 st.warning("缺少对比所需的数据。")
 
-with tabs[4]:  # 库存风险管理标签页
+
+# 函数：库存风险管理标签页（作为独立片段运行，筛选条件变化时只重新执行本标签页）
+@st.fragment
+@timed_fragment("库存风险管理")
+def render_risk_tab():
     # 在标签页内添加筛选器
     st.markdown("### 📊 库存风险分析筛选")
     with st.expander("筛选条件", expanded=True):
@@ -4721,6 +3527,7 @@ with tabs[4]:  # 库存风险管理标签页
             )
 
     # 应用筛选条件
+    risk_filters = (tuple(risk_filter), tuple(region_filter), tuple(person_filter))
     filtered_risk_data = batch_risk_analysis
 
     if risk_filter:
@@ -4801,13 +3608,13 @@ with tabs[4]:  # 库存风险管理标签页
 
         with col1:
             # 创建风险分布饼图
-            risk_chart = create_risk_distribution_chart(filtered_risk_data)
+            risk_chart = risk_chart_view(create_risk_distribution_chart, filtered_risk_data, filters=risk_filters)
             if risk_chart:
                 st.plotly_chart(risk_chart, use_container_width=True)
 
         with col2:
             # 责任区域分布
-            region_chart = create_responsibility_region_chart(filtered_risk_data)
+            region_chart = risk_chart_view(create_responsibility_region_chart, filtered_risk_data, filters=risk_filters)
             if region_chart:
                 st.plotly_chart(region_chart, use_container_width=True)
 
@@ -4815,7 +3622,7 @@ with tabs[4]:  # 库存风险管理标签页
         st.markdown('<div class="sub-header">👤 责任人库存风险分析</div>', unsafe_allow_html=True)
 
         # 责任人分布图
-        person_chart = create_responsibility_person_chart(filtered_risk_data)
+        person_chart = risk_chart_view(create_responsibility_person_chart, filtered_risk_data, filters=risk_filters)
         if person_chart:
             st.plotly_chart(person_chart, use_container_width=True)
 
@@ -4866,58 +3673,83 @@ with tabs[4]:  # 库存风险管理标签页
             # 确保所有要显示的列都存在于数据中
             display_columns = [col for col in display_columns if col in filtered_risk_data.columns]
 
-            # 格式化预计清库天数列
-            filtered_risk_data_display = filtered_risk_data.copy()
-            filtered_risk_data_display['预计清库天数'] = filtered_risk_data_display['预计清库天数'].apply(
-                lambda x: "无法清库" if x == float('inf') else f"{int(x)}天"
-            )
-
-
-            # 创建带有颜色标记的风险等级列
-            def highlight_risk(risk_level):
-                if risk_level == '极高风险':
-                    return f'<span class="risk-extreme-high">{risk_level}</span>'
-                elif risk_level == '高风险':
-                    return f'<span class="risk-high">{risk_level}</span>'
-                elif risk_level == '中风险':
-                    return f'<span class="risk-medium">{risk_level}</span>'
-                elif risk_level == '低风险':
-                    return f'<span class="risk-low">{risk_level}</span>'
-                else:
-                    return f'<span class="risk-extreme-low">{risk_level}</span>'
-
-
-            filtered_risk_data_display['风险程度'] = filtered_risk_data_display['风险程度'].apply(highlight_risk)
-
-            # 显示表格
-            st.markdown(filtered_risk_data_display[display_columns].to_html(
-                escape=False, index=False, formatters={
-                    '批次价值': lambda x: f"¥{x:,.2f}",
-                    '日均出货': lambda x: f"{x:.2f}箱/天"
-                }
-            ), unsafe_allow_html=True)
-
-            # 提供CSV下载功能
-            csv_download = filtered_risk_data[display_columns].to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="下载风险批次数据CSV",
-                data=csv_download,
-                file_name="库存风险批次数据.csv",
-                mime="text/csv",
-                key="download-risk-csv"
-            )
+            # 分页显示表格，排序、检索和翻页只重新执行表格片段
+            with perf_stage("风险批次表格") as record:
+                display_risk_table(filtered_risk_data, display_columns, key_prefix="risk_table")
+                record['rows'] = len(filtered_risk_data)
+
+            # 提供下载功能：点击下载时才生成文件，下载不触发页面重跑
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button(
+                    label="下载风险批次数据CSV",
+                    data=partial(csv_export, filtered_risk_data, display_columns),
+                    file_name="库存风险批次数据.csv",
+                    mime="text/csv",
+                    key="download-risk-csv",
+                    on_click="ignore"
+                )
+            with col2:
+                st.download_button(
+                    label="下载完整分析Excel（全部区域）",
+                    data=partial(export_full_analysis, processed_data, batch_risk_analysis, actual_summary,
+                                 snapshot_results),
+                    file_name="预测与库存风险分析.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    key="download-analysis-xlsx",
+                    on_click="ignore"
+                )
 
             # 添加批次数据解读
             batch_explanation = f"""
             <b>表格说明：</b> 此表格展示了所有符合筛选条件的{len(filtered_risk_data)}个批次的详细风险信息，
             包括产品代码、批次日期、库存量、库龄、批次价值、日均出货量、预计清库天数、风险程度、责任区域、责任人和建议措施。
-            可以通过点击表头对任意列进行排序，以便更好地分析和处理库存风险。
+            可以按任意列排序或按关键字检索，并分页浏览，以便更好地分析和处理库存风险。
             """
 
             add_chart_explanation(batch_explanation)
         else:
             st.info("没有符合条件的批次数据")
 
+
+# 创建标签页 - 更新标签页结构
+tab_pages = [
+    ("📊 总览与历史", render_overview_tab),
+    ("🔍 预测差异分析", render_forecast_diff_tab),
+    ("📈 产品趋势", render_trend_tab),
+    ("🔍 重点SKU分析", render_key_sku_tab),
+    ("🚨 库存风险管理", render_risk_tab)
+]
+
+# 按需计算时只执行当前标签页，切换标签页时重跑页面，各标签页的切片和图表按筛选条件缓存
+lazy_tabs = st.sidebar.toggle("只计算当前标签页", value=True,
+                              help="关闭后每次运行都计算全部标签页，切换标签页不再重跑页面")
+if lazy_tabs:
+    tabs = st.tabs([label for label, _ in tab_pages], key="active_tab", on_change="rerun")
+else:
+    tabs = st.tabs([label for label, _ in tab_pages])
+
+for tab, (label, render_tab) in zip(tabs, tab_pages):
+    # 不跟踪状态时open为None，全部标签页照常计算
+    if tab.open is False:
+        continue
+    with tab, perf_stage(f"标签页：{label.split(' ', 1)[1]}"):
+        render_tab()
+
+# 性能诊断：本次运行各阶段的耗时、缓存命中、行数和内存峰值增量，同时追加到性能日志
+with st.sidebar.expander("⏱ 性能诊断"):
+    perf_table = pd.DataFrame(perf_records, columns=['stage', 'seconds', 'cache', 'rows', 'peak_rss_delta_mb'])
+    perf_table.columns = ['阶段', '耗时(毫秒)', '缓存', '行数', '内存峰值增量(MB)']
+    perf_table['耗时(毫秒)'] = (perf_table['耗时(毫秒)'] * 1000).round(1)
+    perf_table['内存峰值增量(MB)'] = perf_table['内存峰值增量(MB)'].round(1)
+    st.dataframe(perf_table, hide_index=True)
+    st.caption(f"标签页耗时包含其中的图表和表格；筛选、翻页等只重跑片段时不更新本面板，"
+               f"片段的耗时单独写入日志文件：{yuce_engine.PERF_LOG_PATH}")
+
+run_mode = 'snapshot' if use_snapshot else 'sqlite' if use_sqlite else 'default' if use_default_files else 'upload'
+append_perf_log(perf_records, {'mode': run_mode})
+full_run_logged = True
+
 # 页面运行
 if __name__ == "__main__":
     # 页面已成功加载，不需要额外的处理
@@ -0,0 +1,307 @@
+"""
+加载与分析流程的性能基准：按规模档位生成合成数据（见yuce_synth.py），分阶段记录耗时和内存峰值
+
+每个阶段预热一次后重复运行取耗时中位数，另运行一次用tracemalloc记录内存峰值（不计入耗时）。
+tracemalloc记录Python对象和numpy/pandas数组的分配，不包含pyarrow内存池（读取解析缓存时的Arrow表）。
+结果可保存为JSON作为基线；指定--baseline时逐阶段与基线比较，耗时或内存超过阈值的阶段标记为回退。
+
+加载阶段需要把合成数据写成Excel文件，出货数据超过Excel行数上限的档位（100x）只运行分析阶段。
+加载函数分别在无解析缓存（冷启动，解析Excel）和有解析缓存两种情况下计时。
+
+用法:
+    python yuce_bench.py [--tiers 1x 10x] [--repeat 3] [--output bench.json]
+    python yuce_bench.py --tiers 1x 10x --baseline bench.json [--threshold 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import yuce_engine
+from yuce_engine import (
+    analyze_batch_risk,
+    analyze_responsibility,
+    build_responsibility_index,
+    calculate_national_accuracy,
+    calculate_product_growth,
+    calculate_regional_accuracy,
+    calculate_top_skus,
+    compute_product_sales_metrics,
+    default_analysis_months,
+    get_common_months,
+    process_data,
+)
+from yuce_synth import EXCEL_MAX_ROWS, SYNTHETIC_SCALES, generate_synthetic_data, write_synthetic_workbooks
+
+# 加载阶段：阶段名 -> (文件类型, 加载函数)
+LOAD_STAGES = {
+    'load_actual_data': ('actual', yuce_engine.load_actual_data),
+    'load_forecast_data': ('forecast', yuce_engine.load_forecast_data),
+    'load_product_info': ('product_info', yuce_engine.load_product_info),
+    'load_inventory_data': ('inventory', yuce_engine.load_inventory_data),
+    'load_price_data': ('price', yuce_engine.load_price_data)
+}
+
+
+# 函数：测量单个阶段
+def measure(stage, repeat=3):
+    """
+    运行stage()：先不计时运行一次预热，再计时repeat次取中位数，最后在tracemalloc下运行一次记录内存峰值
+
+    参数:
+    stage (callable): 无参数的阶段函数，每次调用应完成同样的工作
+    repeat (int): 计时次数
+
+    返回:
+    tuple: ({'seconds': 耗时中位数, 'peak_mb': 内存峰值}, 最后一次的返回值)
+    """
+    stage()
+    timings = []
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        result = stage()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        stage()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': statistics.median(timings), 'peak_mb': peak / (1 << 20)}, result
+
+
+# 函数：运行加载阶段
+def run_load_stages(paths, repeat=3):
+    """对每个加载函数分别测量无解析缓存（每次使用新的空缓存目录）和有解析缓存时的耗时与内存"""
+    stages = {}
+    original_cache_dir = yuce_engine.PARSED_CACHE_DIR
+    cache_root = tempfile.mkdtemp(prefix='yuce_bench_cache_')
+    try:
+        for name, (kind, loader) in LOAD_STAGES.items():
+            def cold_load():
+                yuce_engine.PARSED_CACHE_DIR = tempfile.mkdtemp(dir=cache_root)
+                return loader(paths[kind], on_error=_raise_load_error)
+
+            stages[name], _ = measure(cold_load, repeat)
+
+            # 最后一次冷启动已写入解析缓存，此后的加载都命中缓存
+            stages[f"{name}[cached]"], _ = measure(lambda: loader(paths[kind], on_error=_raise_load_error), repeat)
+    finally:
+        yuce_engine.PARSED_CACHE_DIR = original_cache_dir
+        shutil.rmtree(cache_root, ignore_errors=True)
+    return stages
+
+
+# 函数：加载出错时中止基准
+def _raise_load_error(message):
+    """加载函数出错时会改用示例数据，此时的计时没有意义，直接中止"""
+    raise RuntimeError(message)
+
+
+# 函数：运行分析阶段
+def run_analysis_stages(inputs, repeat=3):
+    """按run_full_analysis的顺序测量各分析阶段，后续阶段使用前一阶段的结果"""
+    stages = {}
+    actual_data = inputs['actual_data']
+    forecast_data = inputs['forecast_data']
+    batch_data = inputs['batch_data']
+
+    common_months = get_common_months(actual_data, forecast_data)
+    actual_common = actual_data[actual_data['所属年月'].isin(common_months)]
+    forecast_common = forecast_data[forecast_data['所属年月'].isin(common_months)]
+    stages['process_data'], processed_data = measure(
+        lambda: process_data(actual_common, forecast_common, inputs['product_info']), repeat
+    )
+
+    merged_monthly = processed_data['merged_monthly']
+    stages['calculate_national_accuracy'], _ = measure(lambda: calculate_national_accuracy(merged_monthly), repeat)
+    stages['calculate_regional_accuracy'], _ = measure(lambda: calculate_regional_accuracy(merged_monthly), repeat)
+    stages['calculate_top_skus'], _ = measure(lambda: calculate_top_skus(merged_monthly), repeat)
+    stages['calculate_top_skus[by_region]'], _ = measure(
+        lambda: calculate_top_skus(merged_monthly, by_region=True), repeat
+    )
+
+    members = processed_data['sales_cube']['members']
+    regions = list(members['所属区域'])
+    months = default_analysis_months(list(members['所属年月']))
+    stages['calculate_product_growth'], _ = measure(
+        lambda: calculate_product_growth(actual_data, regions, months), repeat
+    )
+
+    today = datetime.now().date()
+    stages['compute_product_sales_metrics'], product_metrics = measure(
+        lambda: compute_product_sales_metrics(actual_data, batch_data['产品代码'].unique(), today), repeat
+    )
+    stages['build_responsibility_index'], index = measure(
+        lambda: build_responsibility_index(actual_data, forecast_data), repeat
+    )
+
+    # 所有批次的责任归属分析（使用预先构建的索引，与analyze_batch_risk中一致）
+    product_sales_metrics = product_metrics[0]
+    batches = list(zip(batch_data['产品代码'], pd.to_datetime(batch_data['生产日期']), batch_data['数量']))
+
+    def responsibility_for_all_batches():
+        return [
+            analyze_responsibility(code, date, product_sales_metrics.get(code, {}), forecast_data, actual_data,
+                                   qty, index)
+            for code, date, qty in batches
+        ]
+
+    stages['analyze_responsibility'], _ = measure(responsibility_for_all_batches, repeat)
+    stages['analyze_batch_risk'], _ = measure(
+        lambda: analyze_batch_risk(batch_data, actual_data, forecast_data, inputs['price_data']), repeat
+    )
+    return stages
+
+
+# 函数：运行一个规模档位
+def run_tier(tier, repeat=3, workdir=None, include_load=True, seed=0):
+    """
+    生成指定档位的合成数据并测量全部阶段
+
+    返回:
+    dict: rows（各数据表行数）、stages（阶段名 -> 耗时与内存峰值）和skipped（跳过的阶段说明）
+    """
+    inputs = generate_synthetic_data(**SYNTHETIC_SCALES[tier], seed=seed)
+    result = {
+        'rows': {name: len(data) for name, data in inputs.items()},
+        'stages': {},
+        'skipped': []
+    }
+
+    if include_load and len(inputs['actual_data']) >= EXCEL_MAX_ROWS:
+        result['skipped'].append("出货数据超过Excel行数上限，未运行加载阶段")
+    elif include_load:
+        tier_dir = os.path.join(workdir or tempfile.mkdtemp(prefix='yuce_bench_'), tier)
+        paths = write_synthetic_workbooks(inputs, tier_dir)
+        result['stages'].update(run_load_stages(paths, repeat))
+        if workdir is None:
+            shutil.rmtree(os.path.dirname(tier_dir), ignore_errors=True)
+
+    result['stages'].update(run_analysis_stages(inputs, repeat))
+    return result
+
+
+# 函数：与基线比较
+def compare_results(results, baseline, threshold=0.2):
+    """
+    逐档位、逐阶段比较耗时和内存峰值
+
+    参数:
+    results, baseline (dict): 档位 -> run_tier的结果
+    threshold (float): 相对基线的增幅超过该比例时标记为回退（耗时另需增加1毫秒以上、内存另需增加1MB以上，避免噪声）
+
+    返回:
+    DataFrame: 档位、阶段、基线与本次的耗时和内存、变化比例及是否回退
+    """
+    rows = []
+    for tier, result in results.items():
+        baseline_stages = baseline.get(tier, {}).get('stages', {})
+        for stage, current in result['stages'].items():
+            previous = baseline_stages.get(stage)
+            if previous is None:
+                continue
+            time_change = current['seconds'] / previous['seconds'] - 1 if previous['seconds'] > 0 else 0.0
+            memory_change = current['peak_mb'] / previous['peak_mb'] - 1 if previous['peak_mb'] > 0 else 0.0
+            regressed = ((time_change > threshold and current['seconds'] - previous['seconds'] > 1e-3)
+                         or (memory_change > threshold and current['peak_mb'] - previous['peak_mb'] > 1))
+            rows.append({
+                '档位': tier,
+                '阶段': stage,
+                '基线耗时(秒)': previous['seconds'],
+                '耗时(秒)': current['seconds'],
+                '耗时变化': time_change,
+                '基线内存(MB)': previous['peak_mb'],
+                '内存(MB)': current['peak_mb'],
+                '内存变化': memory_change,
+                '回退': regressed
+            })
+    return pd.DataFrame(rows)
+
+
+# 函数：输出档位结果
+def print_tier(tier, result):
+    """按阶段输出耗时和内存峰值"""
+    print(f"== {tier}: " + "，".join(f"{name} {count} 行" for name, count in result['rows'].items()))
+    for message in result['skipped']:
+        print(f"   （{message}）")
+    for stage, value in result['stages'].items():
+        print(f"   {stage:<36} {value['seconds'] * 1000:>10.1f} ms {value['peak_mb']:>10.1f} MB")
+
+
+# 函数：解析命令行参数
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="按规模档位测量加载与分析各阶段的耗时和内存峰值")
+    parser.add_argument("--tiers", nargs='+', choices=sorted(SYNTHETIC_SCALES), default=['1x', '10x'],
+                        help="规模档位")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段的计时次数（取中位数）")
+    parser.add_argument("--seed", type=int, default=0, help="合成数据的随机种子")
+    parser.add_argument("--skip-load", action="store_true", help="只运行分析阶段（不生成Excel文件）")
+    parser.add_argument("--workdir", help="保留合成Excel文件的目录，默认使用临时目录并在结束后删除")
+    parser.add_argument("--output", help="保存结果的JSON文件，可作为之后运行的基线")
+    parser.add_argument("--baseline", help="基线JSON文件，提供时逐阶段比较并在有回退时返回非零退出码")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定回退的相对增幅")
+    return parser.parse_args(argv)
+
+
+# 函数：基准入口
+def main(argv=None):
+    """运行基准，返回进程退出码（与基线比较有回退时为1）"""
+    args = parse_args(argv)
+
+    results = {}
+    for tier in args.tiers:
+        results[tier] = run_tier(tier, args.repeat, args.workdir, include_load=not args.skip_load, seed=args.seed)
+        print_tier(tier, results[tier])
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'environment': {
+                    'python': platform.python_version(),
+                    'pandas': pd.__version__,
+                    'numpy': np.__version__,
+                    'machine': platform.machine(),
+                    'cpus': os.cpu_count()
+                },
+                'repeat': args.repeat,
+                'seed': args.seed,
+                'tiers': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    comparison = compare_results(results, baseline['tiers'], args.threshold)
+    if comparison.empty:
+        print("基线中没有可比较的档位和阶段")
+        return 0
+
+    print(f"\n与基线比较（{baseline['created_at']}，阈值 {args.threshold:.0%}）:")
+    for row in comparison.itertuples(index=False):
+        flag = "  <- 回退" if row.回退 else ""
+        print(f"   {row.档位:<5} {row.阶段:<36} 耗时 {row.耗时变化:>+8.1%}  内存 {row.内存变化:>+8.1%}{flag}")
+    regressions = int(comparison['回退'].sum())
+    print(f"回退阶段: {regressions} 个")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3351 @@
+"""
+销售预测与库存风险分析引擎
+
+仪表盘（yuce&warning.py）使用的数据加载与分析函数，不依赖Streamlit，可在批处理任务和工作进程中直接导入。
+加载函数通过on_error回调报告数据问题（仪表盘传入st.error），未提供回调时以警告形式输出。
+"""
+import os
+import re
+import math
+import json
+import shutil
+import uuid
+import hashlib
+import warnings
+import time
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不记录内存峰值
+    resource = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as pa_feather
+except ImportError:  # 未安装pyarrow时不启用解析结果缓存
+    pa = None
+    pa_feather = None
+
+# 解析结果缓存目录（保存已规范化的数据，进程重启后可直接内存映射读取）
+PARSED_CACHE_DIR = os.environ.get("YUCE_PARSED_CACHE_DIR", ".parsed_cache")
+
+# 上传文件目录：上传的文件按内容摘要保存，相同内容的上传共用同一路径和解析缓存
+UPLOAD_DIR = os.environ.get("YUCE_UPLOAD_DIR", os.path.join(PARSED_CACHE_DIR, "uploads"))
+
+# 上传文件保留天数：超过该天数未再上传的文件及其解析缓存被清理
+UPLOAD_RETENTION_DAYS = 30
+
+# 性能诊断日志（JSON Lines，每次页面运行追加一行，便于跨部署比较趋势）
+PERF_LOG_PATH = os.environ.get("YUCE_PERF_LOG", "perf_log.jsonl")
+
+# 加载器版本标记：修改某个加载器的列匹配或类型转换逻辑后需递增对应版本，使旧缓存失效
+PARSED_CACHE_VERSIONS = {
+    'actual': 2,
+    'forecast': 2,
+    'product_info': 1,
+    'inventory': 2,
+    'price': 1
+}
+
+# 维度列：出货、预测和批次数据中以分类类型保存，行内只保存整数编码
+CATEGORICAL_COLUMNS = ['所属年月', '所属区域', '申请人', '销售员', '产品代码']
+
+# 共用分类字典的维度（申请人和销售员是同一批人员），类别按值排序，月份编码即时间顺序
+SHARED_DIMENSIONS = {
+    '所属年月': ('所属年月',),
+    '所属区域': ('所属区域',),
+    '人员': ('申请人', '销售员'),
+    '产品代码': ('产品代码',)
+}
+
+# 日期序号的起点（1970-01-01）
+EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+# 积压风险评估周期（天）及对应的结果列名，其他周期使用“N天积压风险”
+DEFAULT_RISK_HORIZONS = (30, 60, 90)
+RISK_HORIZON_COLUMNS = {
+    30: '一个月积压风险',
+    60: '两个月积压风险',
+    90: '三个月积压风险'
+}
+
+# 风险程度从高到低的排序
+RISK_LEVEL_ORDER = {
+    "极高风险": 0,
+    "高风险": 1,
+    "中风险": 2,
+    "低风险": 3,
+    "极低风险": 4
+}
+
+# 批次风险详情表中可按关键字检索的列
+RISK_TABLE_SEARCH_COLUMNS = ('产品代码', '责任区域', '责任人', '建议措施')
+
+# 默认数据文件路径
+DEFAULT_ACTUAL_FILE = "2409~250224出货数据.xlsx"
+DEFAULT_FORECAST_FILE = "2409~2502人工预测.xlsx"
+DEFAULT_PRODUCT_FILE = "产品信息.xlsx"
+DEFAULT_INVENTORY_FILE = "含批次库存0221（2）.xlsx"
+DEFAULT_PRICE_FILE = "单价.xlsx"
+
+# 夜间快照根目录：每次批处理写入一个带版本号的子目录，LATEST文件记录最新一次完整快照
+SNAPSHOT_DIR = os.environ.get("YUCE_SNAPSHOT_DIR", "snapshots")
+
+# 快照格式版本：快照包含的数据表或其结构变化时需递增，旧格式的快照不再被读取
+SNAPSHOT_FORMAT_VERSION = 1
+
+# 出货数据增量存储目录：按月分区保存出货明细和月度汇总，导入新数据时只重写受影响的月份
+SHIPMENT_STORE_DIR = os.environ.get("YUCE_SHIPMENT_STORE_DIR", "shipment_store")
+
+# 增量存储格式版本，以及保留的变更记录数（更早的版本无法确定变更范围，下游需全部重算）
+SHIPMENT_STORE_FORMAT_VERSION = 1
+SHIPMENT_STORE_CHANGE_LOG_SIZE = 200
+
+# 快照中按原样保存的输入数据表
+SNAPSHOT_INPUT_TABLES = ['actual_data', 'forecast_data', 'product_info', 'inventory_data', 'batch_data']
+
+# 快照中按原样保存的process_data结果表
+SNAPSHOT_PROCESSED_TABLES = ['actual_monthly', 'forecast_monthly', 'merged_monthly', 'merged_by_salesperson',
+                             'national_top_skus']
+
+
+# 函数：报告加载错误
+def report_error(on_error, message):
+    """
+    通过回调报告加载过程中的错误信息
+
+    参数:
+    on_error (callable): 接收错误信息的回调，为None时以警告形式输出
+    message (str): 错误信息
+    """
+    if on_error is not None:
+        on_error(message)
+    else:
+        warnings.warn(message, RuntimeWarning, stacklevel=3)
+
+
+# 函数：简化产品名称
+def simplify_product_name(code, full_name):
+    """将产品完整名称简化为更简短的格式"""
+    # 检查输入有效性
+    if not full_name or not isinstance(full_name, str):
+        return full_name
+
+    # 如果符合"口力X-中国"格式，则简化
+    if "口力" in full_name and "-中国" in full_name:
+        # 去除"口力"前缀和"-中国"后缀
+        return full_name.replace("口力", "").replace("-中国", "").strip()
+
+    # 否则返回原始名称
+    return full_name
+
+
+# 函数：安全计算均值
+def safe_mean(series, default=0):
+    """安全地计算Series的均值，处理空值和异常"""
+    if series is None or len(series) == 0 or (hasattr(series, 'empty') and series.empty) or (
+            hasattr(series, 'isna') and series.isna().all()):
+        return default
+
+    try:
+        # 尝试使用pandas内置mean方法
+        if hasattr(series, 'mean'):
+            return series.mean()
+
+        # 如果不是pandas Series，尝试使用numpy
+        import numpy as np
+        return np.nanmean(series)
+    except (OverflowError, ValueError, TypeError, ZeroDivisionError):
+        # 处理任何计算错误
+        return default
+
+
+# 函数：计算准确率
+def calculate_unified_accuracy(actual, forecast):
+    """统一计算准确率的函数，适用于全国和区域"""
+    if actual == 0 and forecast == 0:
+        return 1.0  # 如果实际和预测都为0，准确率为100%
+
+    if actual == 0:
+        return 0.0  # 如果实际为0但预测不为0，准确率为0%
+
+    # 计算差异率
+    diff_rate = (actual - forecast) / actual
+
+    # 计算准确率 (基础公式: 1 - |差异率|)
+    return max(0, 1 - abs(diff_rate))
+
+
+# 函数：批量计算统一准确率
+def calculate_unified_accuracy_array(actual, forecast):
+    """
+    calculate_unified_accuracy的数组版本，逐元素规则与单值版本一致
+
+    参数:
+    actual (array-like): 实际销售量
+    forecast (array-like): 预测销售量
+
+    返回:
+    ndarray: 准确率（0~1），实际和预测都为0时为1，仅实际为0时为0，缺失值为0
+    """
+    actual = np.asarray(actual, dtype='float64')
+    forecast = np.asarray(forecast, dtype='float64')
+
+    # 基础公式: 1 - |差异率|，实际为0的位置稍后覆盖
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accuracy = 1 - np.abs((actual - forecast) / actual)
+
+    # 负值截断为0，缺失值同样按0处理（与max(0, nan)的结果一致）
+    accuracy = np.where(accuracy > 0, accuracy, 0.0)
+
+    # 实际为0时准确率为0%，实际和预测都为0时为100%
+    actual_zero = actual == 0
+    accuracy[actual_zero] = 0.0
+    accuracy[actual_zero & (forecast == 0)] = 1.0
+    return accuracy
+
+
+# 函数：生成备货建议
+def generate_recommendation(growth_rate):
+    """优化的备货建议生成函数"""
+    # 基于增长率生成建议
+    if growth_rate > 15:
+        return {
+            "建议": "增加备货",
+            "调整比例": round(growth_rate),
+            "颜色": "#4CAF50",
+            "样式类": "recommendation-increase",
+            "图标": "↑"
+        }
+    elif growth_rate > 0:
+        return {
+            "建议": "小幅增加",
+            "调整比例": round(growth_rate / 2),
+            "颜色": "#8BC34A",
+            "样式类": "recommendation-increase",
+            "图标": "↗"
+        }
+    elif growth_rate > -10:
+        return {
+            "建议": "维持现状",
+            "调整比例": 0,
+            "颜色": "#FFC107",
+            "样式类": "recommendation-maintain",
+            "图标": "→"
+        }
+    else:
+        adjust = abs(round(growth_rate / 2))
+        return {
+            "建议": "减少备货",
+            "调整比例": adjust,
+            "颜色": "#F44336",
+            "样式类": "recommendation-decrease",
+            "图标": "↓"
+        }
+
+
+# 函数：计算风险百分比
+def calculate_risk_percentage(days_to_clear, batch_age, target_days):
+    """
+    计算风险百分比，基于清库天数和库龄
+
+    参数:
+    days_to_clear (float): 预计清库天数
+    batch_age (int): 批次库龄（天数）
+    target_days (int): 目标清库天数（30/60/90天）
+
+    返回:
+    float: 风险百分比，范围0-100
+    """
+    # 核心规则1: 库龄已经超过目标天数，风险直接为100%
+    if batch_age >= target_days:
+        return 100.0
+
+    # 核心规则2: 无法清库情况
+    if days_to_clear == float('inf'):
+        return 100.0
+
+    # 核心规则3: 清库天数超过目标的3倍，风险为100%
+    if days_to_clear >= 3 * target_days:
+        return 100.0
+
+    # 计算基于清库天数的风险（使用sigmoid函数提供更好的区分度）
+    clearance_ratio = days_to_clear / target_days
+    clearance_risk = 100 / (1 + math.exp(-4 * (clearance_ratio - 1)))
+
+    # 计算基于库龄的风险（线性比例）
+    age_risk = 100 * batch_age / target_days
+
+    # 组合风险 - 加权平均，更强调高风险因素
+    combined_risk = 0.8 * max(clearance_risk, age_risk) + 0.2 * min(clearance_risk, age_risk)
+
+    # 阈值规则1: 清库天数超过目标，风险至少为80%
+    if days_to_clear > target_days:
+        combined_risk = max(combined_risk, 80)
+
+    # 阈值规则2: 清库天数超过目标的2倍，风险至少为90%
+    if days_to_clear >= 2 * target_days:
+        combined_risk = max(combined_risk, 90)
+
+    # 阈值规则3: 库龄超过目标的75%，风险至少为75%
+    if batch_age >= 0.75 * target_days:
+        combined_risk = max(combined_risk, 75)
+
+    return min(100, round(combined_risk, 1))
+
+
+# 函数：批量计算风险百分比矩阵
+def calculate_risk_percentage_matrix(days_to_clear, batch_age, target_days=DEFAULT_RISK_HORIZONS):
+    """
+    calculate_risk_percentage的数组版本，一次计算所有批次在多个目标周期下的风险百分比
+
+    参数:
+    days_to_clear (array-like): 各批次预计清库天数，可含inf
+    batch_age (array-like): 各批次库龄（天数）
+    target_days (array-like): 目标清库天数列表，如(30, 60, 90)
+
+    返回:
+    ndarray: 形状为(批次数, 周期数)的风险百分比矩阵，逐元素与calculate_risk_percentage结果一致
+    """
+    return _risk_percentage_matrix(days_to_clear, batch_age, target_days)[0]
+
+
+# 函数：批量生成风险百分比文本
+def risk_percentage_labels(days_to_clear, batch_age, target_days=DEFAULT_RISK_HORIZONS):
+    """
+    按calculate_risk_percentage结果的显示格式生成各周期的风险百分比文本
+
+    标量版本中由阈值规则（75/80/90）或上限100得到的风险是整数，显示为“80%”，其余显示一位小数，如“83.4%”、“100.0%”。
+
+    参数同calculate_risk_percentage_matrix
+
+    返回:
+    list: 每个周期一列，每列为各批次的文本列表
+    """
+    risk, integral = _risk_percentage_matrix(days_to_clear, batch_age, target_days)
+    return [
+        [f"{int(value)}%" if is_integral else f"{value}%"
+         for value, is_integral in zip(risk[:, j].tolist(), integral[:, j].tolist())]
+        for j in range(risk.shape[1])
+    ]
+
+
+# 函数：计算风险百分比矩阵及整数标记
+def _risk_percentage_matrix(days_to_clear, batch_age, target_days):
+    """返回(风险百分比矩阵, 标量版本中该结果是否为整数的布尔矩阵)"""
+    days = np.asarray(days_to_clear, dtype=np.float64).reshape(-1, 1)
+    age = np.asarray(batch_age, dtype=np.float64).reshape(-1, 1)
+    target = np.asarray(target_days, dtype=np.float64).reshape(1, -1)
+
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        # 基于清库天数的sigmoid风险和基于库龄的线性风险
+        clearance_risk = 100 / (1 + np.exp(-4 * (days / target - 1)))
+        age_risk = 100 * age / target
+        combined_risk = 0.8 * np.maximum(clearance_risk, age_risk) + 0.2 * np.minimum(clearance_risk, age_risk)
+
+    # 阈值规则，被阈值抬高的结果与标量版本一样记为整数
+    integral = np.zeros(np.broadcast(days, target).shape, dtype=bool)
+    for applies, floor in ((days > target, 80), (days >= 2 * target, 90), (age >= 0.75 * target, 75)):
+        raised = applies & (combined_risk < floor)
+        combined_risk = np.where(raised, floor, combined_risk)
+        integral |= raised
+    rounded = np.round(combined_risk, 1)
+    integral |= rounded >= 100
+    risk = np.minimum(100, rounded)
+
+    # 核心规则：库龄超过目标、无法清库或清库天数超过目标3倍时风险为100%
+    saturated = (age >= target) | (days == np.inf) | (days >= 3 * target)
+    risk[saturated] = 100.0
+    integral[saturated] = False
+
+    # np.exp与math.exp可能相差1个ulp，恰好落在舍入边界附近的元素按标量版本重算以保证结果一致
+    scaled = combined_risk * 10
+    near_tie = ~saturated & (np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i, j in zip(*np.nonzero(near_tie)):
+        value = calculate_risk_percentage(days[i, 0], age[i, 0], target_days[j])
+        risk[i, j] = value
+        integral[i, j] = isinstance(value, int)
+
+    return risk, integral
+
+
+# 函数：获取积压风险列名
+def risk_horizon_column(target_days):
+    """返回目标周期对应的积压风险列名，如30天为“一个月积压风险”"""
+    return RISK_HORIZON_COLUMNS.get(target_days, f"{target_days}天积压风险")
+
+
+# 文件摘要记忆表：(绝对路径, 文件大小, 修改时间) -> SHA-256
+_file_digest_memo = {}
+
+
+# 函数：计算文件内容摘要
+def file_digest(file_path):
+    """计算文件内容的SHA-256摘要，文件大小和修改时间不变时直接复用上次结果"""
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+    digest = _file_digest_memo.get(memo_key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        _file_digest_memo[memo_key] = digest
+
+    return digest
+
+
+# 函数：计算数据内容指纹
+def dataframe_fingerprint(data):
+    """计算DataFrame（或单价字典）的内容指纹，包含列名、类型和逐行哈希"""
+    sha = hashlib.sha256()
+
+    if isinstance(data, dict):
+        sha.update(repr(sorted((str(k), str(v)) for k, v in data.items())).encode('utf-8'))
+        return sha.hexdigest()
+
+    sha.update(repr([(str(col), str(dtype)) for col, dtype in data.dtypes.items()]).encode('utf-8'))
+    try:
+        sha.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    except TypeError:
+        # 含有不可哈希的单元格时退化为按文本内容计算
+        sha.update(data.to_csv().encode('utf-8'))
+
+    return sha.hexdigest()
+
+
+# 函数：获取数据版本
+def data_version(kind, source, data):
+    """
+    获取一份已加载数据的版本标识，用作下游分析阶段的缓存键
+
+    来源为存在的文件路径时使用文件内容摘要和加载器版本（文件未修改时无需重新哈希）；
+    来源为出货增量存储目录时使用存储的版本号；示例数据或上传文件则使用数据内容指纹。
+    """
+    if isinstance(source, str) and os.path.isdir(source):
+        state = read_store_state(source)
+        return f"{kind}:store:{state['store_id']}:{state['version']}"
+
+    if isinstance(source, str) and os.path.exists(source):
+        return f"{kind}:v{PARSED_CACHE_VERSIONS[kind]}:{file_digest(source)}"
+
+    return f"{kind}:data:{dataframe_fingerprint(data)}"
+
+
+# 函数：获取解析缓存文件路径
+def _parsed_cache_paths(kind, file_path, parts):
+    """返回(缓存文件前缀, 各部分缓存文件路径)，文件名包含来源路径标记、内容摘要和加载器版本"""
+    source_tag = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:8]
+    prefix = f"{kind}-{source_tag}-"
+    stem = f"{prefix}{file_digest(file_path)[:32]}-v{PARSED_CACHE_VERSIONS[kind]}"
+    return prefix, [os.path.join(PARSED_CACHE_DIR, f"{stem}-{part}.arrow") for part in parts]
+
+
+# 函数：读取解析缓存
+def read_parsed_cache(kind, file_path, parts=('data',)):
+    """
+    读取已解析并规范化的数据缓存
+
+    参数:
+    kind (str): 数据类型，对应PARSED_CACHE_VERSIONS中的键
+    file_path (str): 源Excel文件路径
+    parts (tuple): 缓存包含的数据表名称
+
+    返回:
+    DataFrame或DataFrame元组（多部分时），未命中或缓存不可用时返回None
+    """
+    if pa_feather is None or not isinstance(file_path, str):
+        return None
+
+    try:
+        _, paths = _parsed_cache_paths(kind, file_path, parts)
+        if not all(os.path.exists(path) for path in paths):
+            return None
+
+        # 内存映射读取Arrow文件，无需重新解析Excel
+        frames = [pa_feather.read_table(path, memory_map=True).to_pandas() for path in paths]
+        return frames[0] if len(frames) == 1 else tuple(frames)
+    except Exception:
+        # 缓存损坏或不兼容时按未命中处理
+        return None
+
+
+# 函数：写入解析缓存
+def write_parsed_cache(kind, file_path, frames, parts=('data',)):
+    """将规范化后的数据写入列式缓存，并清理同一来源文件的旧版本缓存；写入失败不影响数据加载"""
+    if pa_feather is None or not isinstance(file_path, str):
+        return
+
+    if len(parts) == 1:
+        frames = (frames,)
+
+    try:
+        os.makedirs(PARSED_CACHE_DIR, exist_ok=True)
+        prefix, paths = _parsed_cache_paths(kind, file_path, parts)
+
+        for frame, path in zip(frames, paths):
+            table = pa.Table.from_pandas(frame, preserve_index=True)
+            # 先写临时文件再原子替换，避免并发会话读到不完整的缓存
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            pa_feather.write_feather(table, tmp_path, compression='uncompressed')
+            os.replace(tmp_path, path)
+
+        # 清理同一来源文件的过期缓存
+        for name in os.listdir(PARSED_CACHE_DIR):
+            path = os.path.join(PARSED_CACHE_DIR, name)
+            if name.startswith(prefix) and name.endswith('.arrow') and path not in paths:
+                os.remove(path)
+    except Exception:
+        # 存在无法转换为Arrow的混合类型列等情况时跳过缓存
+        pass
+
+
+# 函数：保存上传文件
+def save_uploaded_file(content, file_name):
+    """
+    将上传文件的内容按SHA-256摘要保存到UPLOAD_DIR，返回可直接传给加载函数的文件路径
+
+    相同内容的文件（不论由哪个会话上传）得到同一路径，解析缓存和加载函数的缓存按路径共享；
+    保存时顺带清理超过UPLOAD_RETENTION_DAYS未再上传的文件及其解析缓存。
+
+    参数:
+    content (bytes): 上传文件的内容
+    file_name (str): 上传时的文件名，只用于保留扩展名
+
+    返回:
+    str: 保存后的文件路径
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    extension = os.path.splitext(file_name)[1].lower() or '.xlsx'
+    path = os.path.join(UPLOAD_DIR, f"{digest}{extension}")
+
+    if os.path.exists(path):
+        # 再次上传时更新修改时间，避免被清理
+        os.utime(path)
+    else:
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        prune_uploaded_files()
+
+    # 摘要已知，file_digest无需重新读取文件
+    stat = os.stat(path)
+    _file_digest_memo[(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)] = digest
+    return path
+
+
+# 函数：清理过期的上传文件
+def prune_uploaded_files(retention_days=UPLOAD_RETENTION_DAYS):
+    """删除超过保留天数的上传文件及其解析缓存，返回删除的上传文件路径列表"""
+    if not os.path.isdir(UPLOAD_DIR):
+        return []
+
+    cutoff = datetime.now().timestamp() - retention_days * 86400
+    removed = []
+    for name in os.listdir(UPLOAD_DIR):
+        path = os.path.join(UPLOAD_DIR, name)
+        if name.endswith('.tmp') or os.path.getmtime(path) >= cutoff:
+            continue
+        # 解析缓存文件名以“类型-来源路径标记-”开头（见_parsed_cache_paths）
+        source_tag = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]
+        try:
+            os.remove(path)
+            for cache_name in os.listdir(PARSED_CACHE_DIR):
+                if f"-{source_tag}-" in cache_name:
+                    os.remove(os.path.join(PARSED_CACHE_DIR, cache_name))
+        except OSError:
+            continue
+        removed.append(path)
+    return removed
+
+
+# 函数：将维度列转换为分类类型
+def compact_dimensions(df, columns=CATEGORICAL_COLUMNS):
+    """将数据表中的维度列转换为分类类型（类别按值排序），每个取值只保存一次，groupby和isin按整数编码进行"""
+    for col in columns:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+
+# 函数：统一维度列的分类字典
+def share_categories(*frames):
+    """
+    使多张数据表的同一维度（见SHARED_DIMENSIONS）使用同一分类字典，
+    数据表之间合并、拼接时维度列保持分类类型，无需按字符串重新匹配
+
+    参数:
+    frames (DataFrame): 出货、预测、批次等数据表，为None的参数原样返回
+
+    返回:
+    tuple: 与参数一一对应的数据表（不修改传入的数据表）
+    """
+    frames = [None if frame is None else frame.copy(deep=False) for frame in frames]
+
+    for columns in SHARED_DIMENSIONS.values():
+        present = [(frame, col) for frame in frames if frame is not None for col in columns if col in frame.columns]
+        if not present:
+            continue
+
+        categories = pd.Index([])
+        for frame, col in present:
+            values = frame[col]
+            values = values.cat.categories if isinstance(values.dtype, pd.CategoricalDtype) else values.dropna().unique()
+            categories = categories.union(pd.Index(values))
+
+        dtype = pd.CategoricalDtype(categories)
+        for frame, col in present:
+            if frame[col].dtype != dtype:
+                frame[col] = frame[col].astype(dtype)
+
+    return tuple(frames)
+
+
+# 函数：统计数据表内存占用
+def memory_usage_report(tables):
+    """
+    统计各数据表的行数和内存占用（包含字符串和分类字典的实际大小）
+
+    参数:
+    tables (dict): 数据表名 -> DataFrame，其他类型的值不参与统计
+
+    返回:
+    DataFrame: 数据表、行数、内存(MB)三列，按内存占用降序排列
+    """
+    rows = [
+        {'数据表': name, '行数': len(frame), '内存(MB)': frame.memory_usage(deep=True).sum() / (1 << 20)}
+        for name, frame in tables.items() if isinstance(frame, pd.DataFrame)
+    ]
+    report = pd.DataFrame(rows, columns=['数据表', '行数', '内存(MB)'])
+    return report.sort_values('内存(MB)', ascending=False, ignore_index=True)
+
+
+# 函数：获取进程内存峰值
+def peak_rss_mb():
+    """返回当前进程的常驻内存峰值（MB），不支持时返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return peak / (1 << 20) if os.uname().sysname == 'Darwin' else peak / 1024
+
+
+# 函数：记录阶段耗时
+@contextmanager
+def timed_stage(records, stage):
+    """
+    记录代码块的耗时和进程内存峰值的增量，结束时将记录追加到records
+
+    代码块内可在返回的记录中补充'rows'（处理的行数）和'cache'（'hit'或'miss'）。
+    内存增量为代码块执行期间进程峰值的增长，峰值未被刷新时为0。
+    """
+    record = {'stage': stage, 'seconds': None, 'cache': None, 'rows': None, 'peak_rss_delta_mb': None}
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        if rss_before is not None:
+            record['peak_rss_delta_mb'] = peak_rss_mb() - rss_before
+        records.append(record)
+
+
+# 函数：写入性能诊断日志
+def append_perf_log(records, context=None, log_path=PERF_LOG_PATH):
+    """将一次运行的阶段记录作为一行JSON追加到日志文件，写入失败不影响页面"""
+    entry = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'pid': os.getpid(),
+        'peak_rss_mb': peak_rss_mb(),
+        **(context or {}),
+        'stages': records
+    }
+    try:
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+    except OSError:
+        pass
+
+
+# 函数：加载单价数据
+def load_price_data(file_path=None, on_error=None):
+    """加载产品单价数据"""
+    price_data = {}
+
+    # 指定的产品单价信息（默认值，防止文件不存在或读取失败）
+    specified_prices = {
+        'F01E4B': 137.04,
+        'F3411A': 137.04,
+        'F0104L': 126.72,
+        'F3406B': 129.36,
+        'F01C5D': 153.6,
+        'F01L3A': 182.4,
+        'F01L6A': 307.2,
+        'F01A3C': 175.5,
+        'F01H2B': 307.2,
+        'F01L4A': 182.4,
+        'F0104J': 216.96
+    }
+
+    try:
+        if file_path and os.path.exists(file_path):
+            # 优先读取已解析的单价缓存
+            cached_prices = read_parsed_cache('price', file_path)
+            if cached_prices is not None:
+                return dict(zip(cached_prices['产品代码'], cached_prices['单价']))
+
+            price_df = pd.read_excel(file_path)
+            # 查找包含"单价"的列
+            unit_price_col = [col for col in price_df.columns if '单价' in col]
+            product_code_col = [col for col in price_df.columns if '产品代码' in col or '编号' in col]
+
+            if unit_price_col and product_code_col:
+                # 使用找到的列名
+                code_col = product_code_col[0]
+                price_col = unit_price_col[0]
+
+                # 处理可能的前缀如"型号"或"编号："
+                for _, row in price_df.iterrows():
+                    code = str(row[code_col])
+                    # 提取产品代码 - 查找形如F开头后跟字母和数字的模式
+                    code_match = re.search(r'(F[0-9A-Z]+)', code)
+                    if code_match:
+                        code = code_match.group(1)
+                        price_data[code] = row[price_col]
+            else:
+                # 尝试查找产品代码和单价列，不管列名是什么
+                if len(price_df.columns) >= 2:  # 至少有两列：代码和单价
+                    code_col = price_df.columns[0]  # 假设第一列是代码
+                    price_col = price_df.columns[1]  # 假设第二列是单价
+
+                    for _, row in price_df.iterrows():
+                        code = str(row[code_col])
+                        # 提取产品代码 - 查找形如F开头后跟字母和数字的模式
+                        code_match = re.search(r'(F[0-9A-Z]+)', code)
+                        if code_match:
+                            code = code_match.group(1)
+                            price_data[code] = row[price_col]
+
+            # 如果成功读取了数据，写入缓存后返回
+            if price_data:
+                write_parsed_cache('price', file_path, pd.DataFrame({
+                    '产品代码': list(price_data.keys()),
+                    '单价': list(price_data.values())
+                }))
+                return price_data
+
+        # 如果单价文件加载失败或未提供路径，使用指定的价格
+        return specified_prices
+
+    except Exception as e:
+        # 出错时使用指定的价格
+        return specified_prices
+
+
+# 函数：加载产品信息数据
+def load_product_info(file_path=None, on_error=None):
+    """加载产品信息数据"""
+    try:
+        # 默认路径或示例数据
+        if file_path is None or not os.path.exists(file_path):
+            # 创建示例数据
+            return create_sample_product_info()
+
+        # 优先读取已解析的缓存
+        cached = read_parsed_cache('product_info', file_path)
+        if cached is not None:
+            return cached
+
+        # 加载数据
+        df = pd.read_excel(file_path)
+
+        # 确保列名格式一致
+        required_columns = ['产品代码', '产品名称']
+        missing_columns = [col for col in required_columns if col not in df.columns]
+
+        if missing_columns:
+            report_error(on_error, f"产品信息文件缺少必要的列: {', '.join(missing_columns)}。使用示例数据进行演示。")
+            return create_sample_product_info()
+
+        # 确保数据类型正确
+        df['产品代码'] = df['产品代码'].astype(str)
+        df['产品名称'] = df['产品名称'].astype(str)
+
+        # 添加简化产品名称列
+        df['简化产品名称'] = df.apply(lambda row: simplify_product_name(row['产品代码'], row['产品名称']), axis=1)
+
+        write_parsed_cache('product_info', file_path, df)
+
+        return df
+
+    except Exception as e:
+        report_error(on_error, f"加载产品信息数据时出错: {str(e)}。使用示例数据进行演示。")
+        return create_sample_product_info()
+
+
+# 函数：创建示例产品信息数据
+def create_sample_product_info():
+    """创建示例产品信息数据"""
+    # 产品代码列表
+    product_codes = [
+        'F0104L', 'F01E4P', 'F01E6C', 'F3406B', 'F3409N', 'F3411A',
+        'F01E4B', 'F0183F', 'F0110C', 'F0104J', 'F0104M', 'F0104P',
+        'F0110A', 'F0110B', 'F0115C', 'F0101P'
+    ]
+
+    # 产品名称列表
+    product_names = [
+        '口力比萨68克袋装-中国', '口力汉堡大袋120g-中国', '口力汉堡中袋108g-中国',
+        '口力海洋动物100g-中国', '口力幻彩蜥蜴105g-中国', '口力午餐袋77g-中国',
+        '口力汉堡137g-中国', '口力热狗120g-中国', '口力奶酪90g-中国',
+        '口力比萨小包60g-中国', '口力比萨中包80g-中国', '口力比萨大包100g-中国',
+        '口力薯条65g-中国', '口力鸡块75g-中国', '口力汉堡圈85g-中国',
+        '口力德果汉堡108g-中国'
+    ]
+
+    # 产品规格
+    product_specs = [
+        '68g*24', '120g*24', '108g*24', '100g*24', '105g*24', '77g*24',
+        '137g*24', '120g*24', '90g*24', '60g*24', '80g*24', '100g*24',
+        '65g*24', '75g*24', '85g*24', '108g*24'
+    ]
+
+    # 创建DataFrame
+    data = {'产品代码': product_codes,
+            '产品名称': product_names,
+            '产品规格': product_specs}
+
+    df = pd.DataFrame(data)
+
+    # 添加简化产品名称列
+    df['简化产品名称'] = df.apply(lambda row: simplify_product_name(row['产品代码'], row['产品名称']), axis=1)
+
+    return df
+
+
+# 函数：格式化产品代码
+def format_product_code(code, product_info_df, include_name=True):
+    """将产品代码格式化为只显示简化名称，不显示代码"""
+    if product_info_df is None or code not in product_info_df['产品代码'].values:
+        return code
+
+    if include_name:
+        # 仅使用简化名称，不包含代码
+        filtered_df = product_info_df[product_info_df['产品代码'] == code]
+        if not filtered_df.empty and '简化产品名称' in filtered_df.columns:
+            simplified_name = filtered_df['简化产品名称'].iloc[0]
+            if not pd.isna(simplified_name) and simplified_name:
+                # 移除代码部分，只保留简化产品名称部分
+                return simplified_name.replace(code, "").strip()
+
+        # 回退到只显示产品名称，不显示代码
+        product_name = filtered_df['产品名称'].iloc[0]
+        return product_name
+    else:
+        return code
+
+
+# 函数：加载实际销售数据
+def load_actual_data(file_path=None, on_error=None):
+    """加载实际销售数据"""
+    try:
+        # 默认路径或示例数据
+        if file_path is None or not os.path.exists(file_path):
+            # 创建示例数据
+            return load_sample_actual_data()
+
+        # 优先读取已解析的缓存
+        cached = read_parsed_cache('actual', file_path)
+        if cached is not None:
+            return cached
+
+        # 加载数据
+        df = pd.read_excel(file_path)
+
+        # 确保列名格式一致
+        required_columns = ['订单日期', '所属区域', '申请人', '产品代码', '求和项:数量（箱）']
+
+        # 尝试匹配列名
+        renamed_columns = {}
+        for req_col in required_columns:
+            matched_cols = [col for col in df.columns if req_col in col]
+            if matched_cols:
+                renamed_columns[matched_cols[0]] = req_col
+
+        # 如果找到匹配列，重命名
+        if renamed_columns:
+            df = df.rename(columns=renamed_columns)
+
+        # 检查是否有缺失列
+        missing_columns = [col for col in required_columns if col not in df.columns]
+        if missing_columns:
+            report_error(on_error, f"实际销售数据文件缺少必要的列: {', '.join(missing_columns)}。使用示例数据进行演示。")
+            return load_sample_actual_data()
+
+        # 确保数据类型正确
+        df['订单日期'] = pd.to_datetime(df['订单日期'])
+        df['所属区域'] = df['所属区域'].astype(str)
+        df['申请人'] = df['申请人'].astype(str)
+        df['产品代码'] = df['产品代码'].astype(str)
+        df['求和项:数量（箱）'] = pd.to_numeric(df['求和项:数量（箱）'], errors='coerce')
+
+        # 创建年月字段，用于与预测数据对齐
+        df['所属年月'] = df['订单日期'].dt.strftime('%Y-%m')
+        compact_dimensions(df)
+
+        write_parsed_cache('actual', file_path, df)
+
+        return df
+
+    except Exception as e:
+        report_error(on_error, f"加载实际销售数据时出错: {str(e)}。使用示例数据进行演示。")
+        return load_sample_actual_data()
+
+
+# 函数：加载预测数据
+def load_forecast_data(file_path=None, on_error=None):
+    """加载预测数据"""
+    try:
+        # 默认路径或示例数据
+        if file_path is None or not os.path.exists(file_path):
+            # 创建示例数据
+            return load_sample_forecast_data()
+
+        # 优先读取已解析的缓存
+        cached = read_parsed_cache('forecast', file_path)
+        if cached is not None:
+            return cached
+
+        # 加载数据
+        df = pd.read_excel(file_path)
+
+        # 确保列名格式一致
+        required_columns = ['所属大区', '销售员', '所属年月', '产品代码', '预计销售量']
+
+        # 尝试匹配列名
+        renamed_columns = {}
+        for req_col in required_columns:
+            matched_cols = [col for col in df.columns if req_col in col]
+            if matched_cols:
+                renamed_columns[matched_cols[0]] = req_col
+
+        # 如果找到匹配列，重命名
+        if renamed_columns:
+            df = df.rename(columns=renamed_columns)
+
+        # 检查是否有缺失列
+        missing_columns = [col for col in required_columns if col not in df.columns]
+        if missing_columns:
+            report_error(on_error, f"预测数据文件缺少必要的列: {', '.join(missing_columns)}。使用示例数据进行演示。")
+            return load_sample_forecast_data()
+
+        # 确保数据类型正确
+        df['所属大区'] = df['所属大区'].astype(str)
+        df['销售员'] = df['销售员'].astype(str)
+        df['所属年月'] = pd.to_datetime(df['所属年月']).dt.strftime('%Y-%m')
+        df['产品代码'] = df['产品代码'].astype(str)
+        df['预计销售量'] = pd.to_numeric(df['预计销售量'], errors='coerce')
+
+        # 为了保持一致，将'所属大区'列重命名为'所属区域'
+        df = df.rename(columns={'所属大区': '所属区域'})
+        compact_dimensions(df)
+
+        write_parsed_cache('forecast', file_path, df)
+
+        return df
+
+    except Exception as e:
+        report_error(on_error, f"加载预测数据时出错: {str(e)}。使用示例数据进行演示。")
+        return load_sample_forecast_data()
+
+
+# 函数：创建示例销售数据
+def load_sample_actual_data():
+    """创建示例实际销售数据"""
+    # 产品代码列表
+    product_codes = [
+        'F0104L', 'F01E4P', 'F01E6C', 'F3406B', 'F3409N', 'F3411A',
+        'F01E4B', 'F0183F', 'F0110C', 'F0104J', 'F0104M', 'F0104P',
+        'F0110A', 'F0110B', 'F0115C', 'F0101P'
+    ]
+
+    # 区域列表
+    regions = ['北', '南', '东', '西']
+
+    # 申请人列表
+    applicants = ['孙杨', '李根', '张伟', '王芳', '刘涛', '陈明']
+
+    # 生成日期范围
+    start_date = datetime(2023, 9, 1)
+    end_date = datetime(2025, 2, 24)
+    date_range = pd.date_range(start=start_date, end=end_date, freq='D')
+
+    # 创建数据
+    data = []
+    for date in date_range:
+        # 为每天生成随机数量的记录
+        num_records = np.random.randint(3, 10)
+
+        for _ in range(num_records):
+            region = np.random.choice(regions)
+            applicant = np.random.choice(applicants)
+            product_code = np.random.choice(product_codes)
+            quantity = np.random.randint(5, 300)
+
+            data.append({
+                '订单日期': date,
+                '所属区域': region,
+                '申请人': applicant,
+                '产品代码': product_code,
+                '求和项:数量（箱）': quantity
+            })
+
+    # 创建DataFrame
+    df = pd.DataFrame(data)
+
+    # 添加年月字段
+    df['所属年月'] = df['订单日期'].dt.strftime('%Y-%m')
+
+    return compact_dimensions(df)
+
+
+# 函数：创建示例预测数据
+def load_sample_forecast_data():
+    """创建示例预测数据"""
+    # 产品代码列表
+    product_codes = [
+        'F0104L', 'F01E4P', 'F01E6C', 'F3406B', 'F3409N', 'F3411A',
+        'F01E4B', 'F0183F', 'F0110C', 'F0104J', 'F0104M', 'F0104P',
+        'F0110A', 'F0110B', 'F0115C', 'F0101P'
+    ]
+
+    # 区域列表
+    regions = ['北', '南', '东', '西']
+
+    # 销售员列表
+    sales_people = ['李根', '张伟', '王芳', '刘涛', '陈明', '孙杨']
+
+    # 生成月份范围
+    start_date = datetime(2023, 9, 1)
+    end_date = datetime(2025, 2, 1)
+    month_range = pd.date_range(start=start_date, end=end_date, freq='MS')
+
+    # 创建数据
+    data = []
+    for month in month_range:
+        month_str = month.strftime('%Y-%m')
+
+        for region in regions:
+            for sales_person in sales_people:
+                for product_code in product_codes:
+                    # 使用正态分布生成预测值，使其变化更自然
+                    forecast = max(0, np.random.normal(150, 50))
+
+                    # 有些产品可能没有预测
+                    if np.random.random() > 0.1:  # 90%的概率有预测
+                        data.append({
+                            '所属区域': region,
+                            '销售员': sales_person,
+                            '所属年月': month_str,
+                            '产品代码': product_code,
+                            '预计销售量': round(forecast)
+                        })
+
+    # 创建DataFrame
+    df = pd.DataFrame(data)
+    return compact_dimensions(df)
+
+
+# 函数：计算批次库龄
+def add_batch_age(batch_data):
+    """根据生产日期计算批次库龄（天数），生产日期缺失时库龄为0"""
+    today = pd.Timestamp(datetime.now().date())
+    production_dates = pd.to_datetime(batch_data['生产日期'], errors='coerce')
+
+    # 按日期差向量化计算，忽略生产日期中的时间部分
+    batch_data['库龄'] = (today - production_dates.dt.normalize()).dt.days.fillna(0).astype('int64')
+    return batch_data
+
+
+# 函数：解析库存批次行
+def parse_inventory_batches(inventory_raw, mode='columnar'):
+    """
+    从两层结构的库存表中解析批次行
+
+    库存表中产品行（第一列有物料代码）下方跟随若干批次行（第一列为空，第8列起为库位、生产日期、生产批号、数量），
+    批次行归属于其上方最近的产品行；表格最后一行不作为批次行。
+
+    参数:
+    inventory_raw (DataFrame): 原始库存表
+    mode (str): 'columnar'为按列一次性解析；'rowwise'为逐行解析，用于核对结果和性能对比
+
+    返回:
+    DataFrame: 批次数据（产品代码、描述及第8列起的各列，尚未转换类型），没有批次行时返回None
+    """
+    if mode == 'rowwise':
+        batch_with_product = []
+        product_code = None
+        product_description = None
+
+        for i, row in inventory_raw.iterrows():
+            if pd.notna(row.iloc[0]):
+                # 这是产品行
+                product_code = row.iloc[0]
+                product_description = row.iloc[1]
+            elif i < len(inventory_raw) - 1 and pd.notna(row.iloc[7]):
+                # 这是批次行
+                batch_row = row.iloc[7:].copy()
+                batch_row_with_product = pd.Series([product_code, product_description] + batch_row.tolist())
+                batch_with_product.append(batch_row_with_product)
+
+        return pd.DataFrame(batch_with_product) if batch_with_product else None
+
+    row_count = len(inventory_raw)
+    row_positions = np.arange(row_count)
+    is_product_row = inventory_raw.iloc[:, 0].notna().to_numpy()
+
+    # 批次行：非产品行、库位列有值且不是最后一行
+    is_batch_row = ~is_product_row & inventory_raw.iloc[:, 7].notna().to_numpy() & (row_positions < row_count - 1)
+    if not is_batch_row.any():
+        return None
+
+    # 将每一行映射到其上方最近的产品行位置（首个产品行之前的行为NaN）
+    owner_positions = pd.Series(np.where(is_product_row, row_positions, np.nan)).ffill().to_numpy()[is_batch_row]
+    has_owner = ~np.isnan(owner_positions)
+    owner_positions = np.where(has_owner, owner_positions, 0).astype(np.int64)
+
+    product_codes = inventory_raw.iloc[:, 0].to_numpy(dtype=object)[owner_positions]
+    product_descriptions = inventory_raw.iloc[:, 1].to_numpy(dtype=object)[owner_positions]
+
+    batch_data = inventory_raw.iloc[is_batch_row, 7:].reset_index(drop=True)
+    batch_data.columns = range(2, 2 + batch_data.shape[1])
+    batch_data.insert(0, 0, np.where(has_owner, product_codes, None))
+    batch_data.insert(1, 1, np.where(has_owner, product_descriptions, None))
+
+    # 与逐行构建DataFrame时一致地推断列类型
+    return batch_data.infer_objects()
+
+
+# 函数：加载库存数据
+def load_inventory_data(file_path=None, parser='columnar', on_error=None):
+    """加载库存数据和批次信息，parser指定批次行解析方式（见parse_inventory_batches）"""
+    try:
+        # 默认路径或示例数据
+        if file_path is None or not os.path.exists(file_path):
+            # 创建示例数据
+            return load_sample_inventory_data()
+
+        # 优先读取已解析的缓存（库龄与当天日期相关，不写入缓存，读取后重新计算）
+        cached = read_parsed_cache('inventory', file_path, parts=('inventory', 'batch'))
+        if cached is not None:
+            inventory_data, batch_data = cached
+            return inventory_data, add_batch_age(batch_data)
+
+        # 加载数据
+        inventory_raw = pd.read_excel(file_path, header=0)
+
+        # 确定列名形式
+        expected_columns = ['物料', '描述', '现有库存', '已分配量', '现有库存可订量', '待入库量', '本月剩余可订量',
+                            '库位', '生产日期', '生产批号', '数量']
+
+        # 检查列名是否存在
+        missing_main_columns = [col for col in expected_columns[:7] if
+                                not any(col in str(c) for c in inventory_raw.columns)]
+        if missing_main_columns:
+            report_error(on_error, f"库存文件缺少必要的主要列: {', '.join(missing_main_columns)}。使用示例数据进行演示。")
+            return load_sample_inventory_data()
+
+        # 处理第一层数据（产品信息）
+        product_rows = inventory_raw[inventory_raw.iloc[:, 0].notna()]
+        inventory_data = product_rows.iloc[:, :7].copy()
+        inventory_data.columns = ['产品代码', '描述', '现有库存', '已分配量',
+                                  '现有库存可订量', '待入库量', '本月剩余可订量']
+
+        # 创建批次信息
+        batch_data = parse_inventory_batches(inventory_raw, mode=parser)
+
+        # 创建批次数据DataFrame
+        if batch_data is not None:
+            batch_data.columns = ['产品代码', '描述', '库位', '生产日期', '生产批号', '数量']
+
+            # 转换日期列
+            batch_data['生产日期'] = pd.to_datetime(batch_data['生产日期'], errors='coerce')
+
+            # 转换数量列为数字
+            batch_data['数量'] = pd.to_numeric(batch_data['数量'], errors='coerce')
+        else:
+            batch_data = pd.DataFrame(columns=['产品代码', '描述', '库位', '生产日期', '生产批号', '数量'])
+        compact_dimensions(batch_data, columns=['产品代码'])
+
+        write_parsed_cache('inventory', file_path, (inventory_data, batch_data), parts=('inventory', 'batch'))
+
+        # 计算库龄
+        return inventory_data, add_batch_age(batch_data)
+
+    except Exception as e:
+        report_error(on_error, f"加载库存数据时出错: {str(e)}。使用示例数据进行演示。")
+        return load_sample_inventory_data()
+
+
+# 函数：创建示例库存数据
+def load_sample_inventory_data():
+    """创建示例库存数据和批次信息"""
+    # 产品代码列表
+    product_codes = [
+        'F0101P', 'F0104J', 'F0104L', 'F0104M', 'F0104P',
+        'F0110A', 'F0110C', 'F01C5D', 'F01E4B', 'F01A3C'
+    ]
+
+    # 描述列表
+    descriptions = [
+        '口力汉堡90G直立袋装-中国', '口力比萨XXL45G盒装-中国', '口力比萨68G袋装-中国',
+        '口力比萨1KG散装-中国', '口力比萨24片盒装-中国', '口力薯条65g-中国',
+        '口力奶酪90g-中国', '口力欢乐派对100G袋装（永旺专供）-中国',
+        '口力汉堡137g-中国', '口力芝士蛋糕24片盒装-中国'
+    ]
+
+    # 创建库存数据
+    inventory_data = []
+    for code, desc in zip(product_codes, descriptions):
+        current_stock = np.random.randint(200, 3000)
+        allocated = np.random.randint(0, 300)
+        available = current_stock - allocated
+        pending = np.random.randint(0, 500)
+        remaining = available + pending
+
+        inventory_data.append({
+            '产品代码': code,
+            '描述': desc,
+            '现有库存': current_stock,
+            '已分配量': allocated,
+            '现有库存可订量': available,
+            '待入库量': pending,
+            '本月剩余可订量': remaining
+        })
+
+    # 创建批次数据
+    batch_data = []
+    today = datetime.now().date()
+
+    for i, (code, desc) in enumerate(zip(product_codes, descriptions)):
+        # 为每个产品生成2-5个批次
+        num_batches = np.random.randint(2, 6)
+
+        for j in range(num_batches):
+            # 生成随机的生产日期
+            days_ago = np.random.randint(10, 300)  # 10-300天前的批次
+            production_date = today - timedelta(days=days_ago)
+
+            # 生成批号
+            batch_number = f"{production_date.strftime('%Y%m%d')}L:0{75000 + i * 100 + j}"
+
+            # 生成随机数量
+            quantity = np.random.randint(20, 1000)
+
+            batch_data.append({
+                '产品代码': code,
+                '描述': desc,
+                '库位': f"DC-{np.random.randint(0, 10):03d}",
+                '生产日期': production_date,
+                '生产批号': batch_number,
+                '数量': quantity,
+                '库龄': days_ago
+            })
+
+    # 创建DataFrames
+    inventory_df = pd.DataFrame(inventory_data)
+    batch_df = pd.DataFrame(batch_data)
+
+    # 特别处理F0101P的数据，让它符合附件三中的例子
+    if 'F0101P' in inventory_df['产品代码'].values:
+        # 找到F0101P的索引
+        idx = inventory_df[inventory_df['产品代码'] == 'F0101P'].index[0]
+        inventory_df.loc[idx, '现有库存'] = 2581
+        inventory_df.loc[idx, '已分配量'] = 20
+        inventory_df.loc[idx, '现有库存可订量'] = 2561
+        inventory_df.loc[idx, '本月剩余可订量'] = 2561
+
+        # 为F0101P创建特定批次
+        f0101p_batches = [
+            {
+                '产品代码': 'F0101P',
+                '描述': '口力汉堡90G直立袋装-中国',
+                '库位': 'DC-000',
+                '生产日期': datetime(2025, 3, 5),
+                '生产批号': '20250305L:075064',
+                '数量': 654,
+                '库龄': 68
+            }
+        ]
+
+        # 找到并替换F0101P批次
+        batch_df = batch_df[batch_df['产品代码'] != 'F0101P']
+        for batch in f0101p_batches:
+            batch_df = pd.concat([batch_df, pd.DataFrame([batch])], ignore_index=True)
+
+    # 特别处理F01C5D的数据，让它符合附件三中的例子
+    if 'F01C5D' in inventory_df['产品代码'].values:
+        # 为F01C5D创建特定批次
+        f01c5d_batches = [
+            {
+                '产品代码': 'F01C5D',
+                '描述': '口力欢乐派对100G袋装（永旺专供）-中国',
+                '库位': 'DC-000',
+                '生产日期': datetime(2024, 9, 10),
+                '生产批号': '20240910L:074123',
+                '数量': 252,
+                '库龄': 244
+            }
+        ]
+
+        # 找到并替换F01C5D批次
+        batch_df = batch_df[batch_df['产品代码'] != 'F01C5D']
+        for batch in f01c5d_batches:
+            batch_df = pd.concat([batch_df, pd.DataFrame([batch])], ignore_index=True)
+
+    # 特别处理F01A3C的数据，让它符合附件三中的例子
+    if 'F01A3C' in inventory_df['产品代码'].values:
+        # 为F01A3C创建特定批次
+        f01a3c_batches = [
+            {
+                '产品代码': 'F01A3C',
+                '描述': '口力芝士蛋糕24片盒装-中国',
+                '库位': 'DC-000',
+                '生产日期': datetime(2024, 10, 7),
+                '生产批号': '20241007L:074234',
+                '数量': 16,
+                '库龄': 217
+            }
+        ]
+
+        # 找到并替换F01A3C批次
+        batch_df = batch_df[batch_df['产品代码'] != 'F01A3C']
+        for batch in f01a3c_batches:
+            batch_df = pd.concat([batch_df, pd.DataFrame([batch])], ignore_index=True)
+
+    return inventory_df, compact_dimensions(batch_df, columns=['产品代码'])
+
+
+# 函数：获取共同月份
+def get_common_months(actual_df, forecast_df):
+    """获取两个数据集共有的月份"""
+    actual_months = set(actual_df['所属年月'].unique())
+    forecast_months = set(forecast_df['所属年月'].unique())
+    common_months = sorted(list(actual_months.intersection(forecast_months)))
+    return common_months
+
+
+# 函数：获取最近3个月
+def get_last_three_months():
+    today = datetime.now()
+    current_month = today.replace(day=1)
+
+    last_month = current_month - timedelta(days=1)
+    last_month = last_month.replace(day=1)
+
+    two_months_ago = last_month - timedelta(days=1)
+    two_months_ago = two_months_ago.replace(day=1)
+
+    months = []
+    for dt in [two_months_ago, last_month, current_month]:
+        months.append(dt.strftime('%Y-%m'))
+
+    return months
+
+
+# 函数：筛选数据
+def filter_data(data, months=None, regions=None):
+    """统一的数据筛选函数"""
+    filtered_data = data.copy()
+
+    if months and len(months) > 0:
+        filtered_data = filtered_data[filtered_data['所属年月'].isin(months)]
+
+    if regions and len(regions) > 0:
+        filtered_data = filtered_data[filtered_data['所属区域'].isin(regions)]
+
+    return filtered_data
+
+
+# 销售立方体的维度（由粗到细）和度量
+CUBE_DIMENSIONS = ['所属年月', '所属区域', '销售员', '产品代码']
+CUBE_MEASURES = ['求和项:数量（箱）', '预计销售量']
+
+
+# 预聚合的汇总层级，查询时选用包含所需维度的最小层级
+CUBE_LEVELS = [
+    ('所属年月', '所属区域'),
+    ('所属年月', '所属区域', '产品代码'),
+    ('所属年月', '所属区域', '销售员'),
+    ('所属年月', '所属区域', '销售员', '产品代码')
+]
+
+
+# 函数：按整数编码汇总立方体单元
+def aggregate_cube_cells(codes, values, sizes, dims, mask=None):
+    """
+    将各维度的整数编码组合为单一键后求和，只返回至少包含一个原始单元的组合
+
+    参数:
+    codes (dict): 维度 -> 编码数组
+    values (dict): 度量列名 -> 数值数组（包含计数列'单元数'）
+    sizes (dict): 维度 -> 成员数
+    dims (list): 需要保留的维度，结果按这些维度的编码字典序排列
+    mask (ndarray): 参与汇总的单元，为None时使用全部单元
+
+    返回:
+    tuple: (维度 -> 编码数组, 度量列名 -> 汇总数组)
+    """
+    if mask is not None:
+        codes = {dim: code[mask] for dim, code in codes.items()}
+        values = {name: value[mask] for name, value in values.items()}
+
+    shape = tuple(sizes[dim] for dim in dims)
+    if not dims:
+        return {}, {name: np.array([value.sum()]) for name, value in values.items()}
+
+    keys = np.ravel_multi_index(tuple(codes[dim] for dim in dims), shape)
+    if np.prod(shape, dtype=np.float64) <= 1 << 22:
+        # 组合数较少时直接按全部组合计数
+        counts = np.bincount(keys, minlength=int(np.prod(shape)))
+        present = np.flatnonzero(counts)
+        totals = {name: np.bincount(keys, weights=value, minlength=len(counts))[present]
+                  for name, value in values.items()}
+    else:
+        present, inverse = np.unique(keys, return_inverse=True)
+        totals = {name: np.bincount(inverse, weights=value, minlength=len(present))
+                  for name, value in values.items()}
+
+    present_codes = dict(zip(dims, np.unravel_index(present, shape)))
+    return present_codes, totals
+
+
+# 函数：构建销售立方体
+def build_sales_cube(actual_df, forecast_df):
+    """
+    将实际销售和预测数据一次性汇总为 月份×区域×销售员×产品 的立方体
+
+    各维度成员排序后编码为连续整数，最细层级只保存出现过的单元，并预先汇总CUBE_LEVELS中的各层级。
+    月份、区域或产品为空的记录不参与汇总；销售员为空的记录计入区域/产品层级，但不出现在按销售员的汇总中。
+
+    参数:
+    actual_df (DataFrame): 实际销售数据
+    forecast_df (DataFrame): 预测数据
+
+    返回:
+    dict: 包含members（维度成员）、sizes（含空值槽位的维度大小）和levels（各层级的编码与度量）
+    """
+    qty_col, forecast_col = CUBE_MEASURES
+    records = pd.concat([
+        pd.DataFrame({
+            '所属年月': actual_df['所属年月'],
+            '所属区域': actual_df['所属区域'],
+            '销售员': actual_df['申请人'],
+            '产品代码': actual_df['产品代码'],
+            qty_col: actual_df[qty_col].astype(np.float64),
+            forecast_col: 0.0
+        }),
+        pd.DataFrame({
+            '所属年月': forecast_df['所属年月'],
+            '所属区域': forecast_df['所属区域'],
+            '销售员': forecast_df['销售员'],
+            '产品代码': forecast_df['产品代码'],
+            qty_col: 0.0,
+            forecast_col: forecast_df[forecast_col].astype(np.float64)
+        })
+    ], ignore_index=True).dropna(subset=['所属年月', '所属区域', '产品代码'])
+
+    members = {}
+    codes = {}
+    sizes = {}
+    for dim in CUBE_DIMENSIONS:
+        dim_codes, dim_members = pd.factorize(records[dim], sort=True)
+        # 空值编码为成员数，即额外的“空值”槽位
+        dim_codes[dim_codes < 0] = len(dim_members)
+        members[dim] = np.asarray(dim_members)
+        codes[dim] = dim_codes
+        sizes[dim] = len(dim_members) + 1
+
+    values = {
+        qty_col: records[qty_col].fillna(0).to_numpy(),
+        forecast_col: records[forecast_col].fillna(0).to_numpy(),
+        '单元数': np.ones(len(records))
+    }
+
+    # 最细层级：只保留出现过的单元，单元数为1
+    leaf_codes, leaf_values = aggregate_cube_cells(codes, values, sizes, CUBE_DIMENSIONS)
+    leaf_values['单元数'] = np.ones(len(leaf_values['单元数']))
+
+    return rollup_sales_cube(members, leaf_codes, leaf_values)
+
+
+# 函数：由最细层级汇总销售立方体
+def rollup_sales_cube(members, leaf_codes, leaf_values):
+    """
+    根据维度成员和最细层级单元汇总出CUBE_LEVELS中的各层级
+
+    参数:
+    members (dict): 维度 -> 排序后的成员数组
+    leaf_codes (dict): 维度 -> 最细层级单元的编码数组（空值编码为成员数）
+    leaf_values (dict): 度量列名 -> 最细层级单元的数值数组
+
+    返回:
+    dict: 与build_sales_cube相同结构的销售立方体
+    """
+    sizes = {dim: len(members[dim]) + 1 for dim in CUBE_DIMENSIONS}
+
+    levels = {}
+    for level in CUBE_LEVELS:
+        mask = None
+        if '销售员' in level:
+            mask = leaf_codes['销售员'] < len(members['销售员'])
+        if level == tuple(CUBE_DIMENSIONS):
+            levels[level] = (leaf_codes, leaf_values)
+        else:
+            levels[level] = aggregate_cube_cells(leaf_codes, leaf_values, sizes, list(level), mask)
+
+    return {
+        'members': members,
+        'sizes': sizes,
+        'levels': levels
+    }
+
+
+# 函数：从销售立方体中切片汇总
+def cube_aggregate(cube, by, months=None, regions=None):
+    """
+    按月份、区域筛选立方体并汇总到指定维度，等价于对筛选后的合并数据做groupby求和
+
+    参数:
+    cube (dict): build_sales_cube构建的立方体
+    by (list): 汇总维度，取自CUBE_DIMENSIONS
+    months (list): 月份筛选，为空时不筛选
+    regions (list): 区域筛选，为空时不筛选
+
+    返回:
+    DataFrame: by中的维度列加实际销售量、预计销售量两列，按by的顺序排序
+    """
+    by = list(by)
+    level = next(level for level in CUBE_LEVELS if set(by) <= set(level))
+    level_codes, level_values = cube['levels'][level]
+    members = cube['members']
+
+    mask = np.ones(len(level_values['单元数']), dtype=bool)
+    if months and len(months) > 0:
+        mask &= np.isin(members['所属年月'], months)[level_codes['所属年月']]
+    if regions and len(regions) > 0:
+        mask &= np.isin(members['所属区域'], regions)[level_codes['所属区域']]
+    if '销售员' in by:
+        mask &= level_codes['销售员'] < len(members['销售员'])
+
+    result_codes, totals = aggregate_cube_cells(level_codes, level_values, cube['sizes'], by, mask)
+
+    result = pd.DataFrame({dim: members[dim][result_codes[dim]] for dim in by})
+    for measure in CUBE_MEASURES:
+        result[measure] = totals[measure]
+    return result
+
+
+# 函数：添加预测差异和准确率列
+def add_difference_columns(df):
+    """为包含实际销售量和预计销售量的汇总数据添加数量差异、数量差异率和数量准确率列"""
+    # 差异
+    df['数量差异'] = df['求和项:数量（箱）'] - df['预计销售量']
+
+    # 差异率 (避免除以零)
+    df['数量差异率'] = np.where(
+        df['求和项:数量（箱）'] > 0,
+        df['数量差异'] / df['求和项:数量（箱）'] * 100,
+        np.where(
+            df['预计销售量'] > 0,
+            -100,  # 预测有值但实际为0
+            0  # 预测和实际都是0
+        )
+    )
+
+    # 准确率
+    df['数量准确率'] = np.where(
+        (df['求和项:数量（箱）'] > 0) | (df['预计销售量'] > 0),
+        np.maximum(0, 100 - np.abs(df['数量差异率'])) / 100,
+        1  # 预测和实际都是0时准确率为100%
+    )
+    return df
+
+
+# 函数：处理和分析数据
+def process_data(actual_df, forecast_df, product_info_df):
+    """处理数据并计算关键指标"""
+    # 按月份、区域、产品码汇总数据
+    actual_monthly = actual_df.groupby(['所属年月', '所属区域', '产品代码'], observed=True).agg({
+        '求和项:数量（箱）': 'sum'
+    }).reset_index()
+
+    forecast_monthly = forecast_df.groupby(['所属年月', '所属区域', '产品代码'], observed=True).agg({
+        '预计销售量': 'sum'
+    }).reset_index()
+
+    # 构建销售立方体，各标签页的视图都从立方体切片汇总
+    sales_cube = build_sales_cube(actual_df, forecast_df)
+
+    # 按区域和产品级别、按销售员级别的合并数据
+    merged_monthly = add_difference_columns(
+        cube_aggregate(sales_cube, ['所属年月', '所属区域', '产品代码'])
+    )
+    merged_by_salesperson = add_difference_columns(
+        cube_aggregate(sales_cube, ['所属年月', '所属区域', '销售员', '产品代码'])
+    )
+
+    # 计算总体准确率
+    national_accuracy = calculate_national_accuracy(merged_monthly)
+    regional_accuracy = calculate_regional_accuracy(merged_monthly)
+
+    # 计算占比80%的SKU
+    national_top_skus = calculate_top_skus(merged_monthly, by_region=False)
+    regional_top_skus = calculate_top_skus(merged_monthly, by_region=True)
+
+    return {
+        'actual_monthly': actual_monthly,
+        'forecast_monthly': forecast_monthly,
+        'merged_monthly': merged_monthly,
+        'merged_by_salesperson': merged_by_salesperson,
+        'sales_cube': sales_cube,
+        'national_accuracy': national_accuracy,
+        'regional_accuracy': regional_accuracy,
+        'national_top_skus': national_top_skus,
+        'regional_top_skus': regional_top_skus
+    }
+
+
+# 函数：计算全国准确率
+def calculate_national_accuracy(merged_df):
+    """计算全国的预测准确率"""
+    # 按月份汇总
+    monthly_summary = merged_df.groupby('所属年月', observed=True).agg({
+        '求和项:数量（箱）': 'sum',
+        '预计销售量': 'sum'
+    }).reset_index()
+
+    # 计算差异
+    monthly_summary['数量差异'] = monthly_summary['求和项:数量（箱）'] - monthly_summary['预计销售量']
+
+    # 使用统一函数计算准确率
+    monthly_summary['数量准确率'] = calculate_unified_accuracy_array(
+        monthly_summary['求和项:数量（箱）'], monthly_summary['预计销售量']
+    )
+
+    # 计算整体平均准确率 (使用安全均值计算)
+    overall = {
+        '数量准确率': safe_mean(monthly_summary['数量准确率'], 0)
+    }
+
+    return {
+        'monthly': monthly_summary,
+        'overall': overall
+    }
+
+
+# 函数：计算区域准确率
+def calculate_regional_accuracy(merged_df):
+    """计算各区域的预测准确率"""
+    # 按月份和区域汇总
+    region_monthly_summary = merged_df.groupby(['所属年月', '所属区域'], observed=True).agg({
+        '求和项:数量（箱）': 'sum',
+        '预计销售量': 'sum'
+    }).reset_index()
+
+    # 计算差异
+    region_monthly_summary['数量差异'] = region_monthly_summary['求和项:数量（箱）'] - region_monthly_summary[
+        '预计销售量']
+
+    # 使用统一函数计算准确率
+    region_monthly_summary['数量准确率'] = calculate_unified_accuracy_array(
+        region_monthly_summary['求和项:数量（箱）'], region_monthly_summary['预计销售量']
+    )
+
+    # 按区域计算平均准确率 (使用安全均值计算)
+    region_overall = region_monthly_summary.groupby('所属区域', observed=True).agg({
+        '数量准确率': lambda x: safe_mean(x, 0)
+    }).reset_index()
+
+    return {
+        'region_monthly': region_monthly_summary,
+        'region_overall': region_overall
+    }
+
+
+# 函数：计算增长率数值
+def growth_rate_values(current_sales, base_sales, growth_min=-100, growth_max=500):
+    """
+    按与基期比较的规则批量计算增长率：基期为正时计算百分比并截断异常值，
+    基期为0时当期也为0记0，否则记100
+
+    参数:
+    - current_sales: 当期销量数组
+    - base_sales: 基期销量数组
+    - growth_min/max: 增长率异常值截断范围
+
+    返回:
+    - ndarray: 增长率
+    """
+    current_sales = np.asarray(current_sales, dtype=np.float64)
+    base_sales = np.asarray(base_sales, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth_rate = np.maximum(np.minimum((current_sales - base_sales) / base_sales * 100, growth_max), growth_min)
+    return np.where(base_sales > 0, growth_rate, np.where(current_sales == 0, 0, 100))
+
+
+# 函数：计算环比与同比增长率
+def compute_growth_rates(monthly_sales, growth_min=-100, growth_max=500):
+    """
+    用分组移位计算环比、用(产品代码, 年, 月)自连接计算同比，有同比数据时优先使用同比
+
+    参数:
+    - monthly_sales: 按所属年月和产品代码汇总的销量，需包含年、月列
+    - growth_min/max: 增长率异常值截断范围
+
+    返回:
+    - DataFrame: 每个产品除首月外各月的增长率，产品按首次出现顺序、月份按时间顺序排列
+    """
+    qty_col = '求和项:数量（箱）'
+    if monthly_sales.empty:
+        return pd.DataFrame()
+
+    # 产品按首次出现顺序排列，产品内按年月排序
+    product_order = pd.Series(np.arange(monthly_sales['产品代码'].nunique()),
+                              index=monthly_sales['产品代码'].unique())
+    sales = monthly_sales[['产品代码', '年', '月', qty_col]].assign(
+        产品顺序=monthly_sales['产品代码'].map(product_order).to_numpy()
+    ).sort_values(['产品顺序', '年', '月'], kind='mergesort')
+
+    # 环比：与该产品上一个有数据的月份比较，每个产品的首月没有环比
+    sales['上月销量'] = sales.groupby('产品代码', sort=False, observed=True)[qty_col].shift(1)
+    has_previous = sales.groupby('产品代码', sort=False, observed=True).cumcount() > 0
+    growth_df = sales[has_previous].drop(columns='产品顺序').rename(columns={qty_col: '当月销量'})
+    growth_df['上月销量'] = growth_df['上月销量'].astype(sales[qty_col].dtype)
+    growth_df['销量增长率'] = growth_rate_values(growth_df['当月销量'], growth_df['上月销量'],
+                                            growth_min, growth_max)
+    growth_df['计算方式'] = '环比'
+
+    # 同比：与去年同月比较（去年同月必然早于当月，因此同比月份都已有环比记录）
+    last_year = sales[['产品代码', '年', '月', qty_col]].rename(columns={qty_col: '同比上年销量'})
+    last_year['年'] = last_year['年'] + 1
+    growth_df = growth_df.merge(last_year, on=['产品代码', '年', '月'], how='left')
+    has_yoy = growth_df['同比上年销量'].notna()
+
+    if has_yoy.any():
+        growth_df.loc[has_yoy, '销量增长率'] = growth_rate_values(
+            growth_df.loc[has_yoy, '当月销量'], growth_df.loc[has_yoy, '同比上年销量'], growth_min, growth_max
+        )
+        growth_df.loc[has_yoy, '计算方式'] = '同比'
+    else:
+        growth_df = growth_df.drop(columns='同比上年销量')
+
+    return growth_df.reset_index(drop=True)
+
+
+# 函数：计算产品增长率
+def calculate_product_growth(actual_monthly, regions=None, months=None, growth_min=-100, growth_max=500):
+    """
+    计算产品销量增长率，用于生成备货建议
+
+    计算逻辑：
+    1. 优先计算同比增长率：当前月与去年同月比较
+    2. 若无同比数据，则计算环比增长率：当前月与上月比较
+    3. 根据增长率给出备货建议
+
+    参数:
+    - actual_monthly: 实际销售数据
+    - regions: 区域筛选
+    - months: 月份筛选
+    - growth_min/max: 增长率异常值截断范围
+
+    返回:
+    - all_growth: 所有产品增长率数据
+    - latest_growth: 最新月份的增长率数据，包含趋势与备货建议
+
+    不修改传入的数据，所属年月在只含所需列的副本上转换为日期
+    """
+    # 确保数据按时间排序
+    actual_monthly = actual_monthly[['所属年月', '所属区域', '产品代码', '求和项:数量（箱）']].assign(
+        所属年月=pd.to_datetime(actual_monthly['所属年月'])
+    ).sort_values('所属年月')
+
+    # 应用区域筛选
+    if regions and len(regions) > 0:
+        filtered_data = actual_monthly[actual_monthly['所属区域'].isin(regions)]
+    else:
+        filtered_data = actual_monthly  # 如果没有区域筛选，使用全部数据
+
+    # 应用月份筛选
+    if months and len(months) > 0:
+        months_datetime = pd.to_datetime(months)
+        filtered_data = filtered_data[filtered_data['所属年月'].isin(months_datetime)]
+
+    # 按产品和月份汇总筛选后的区域销量
+    filtered_monthly_sales = filtered_data.groupby(['所属年月', '产品代码'], observed=True).agg({
+        '求和项:数量（箱）': 'sum'
+    }).reset_index()
+
+    # 创建年和月字段
+    filtered_monthly_sales['年'] = filtered_monthly_sales['所属年月'].dt.year
+    filtered_monthly_sales['月'] = filtered_monthly_sales['所属年月'].dt.month
+
+    # 计算环比和同比增长率
+    growth_df = compute_growth_rates(filtered_monthly_sales, growth_min, growth_max)
+
+    # 如果有增长数据，添加趋势判断和备货建议
+    if not growth_df.empty:
+        try:
+            # 取最近一个月的增长率
+            latest_growth = growth_df.sort_values(['年', '月'], ascending=False).groupby(
+                '产品代码', observed=True).first().reset_index()
+
+            # 过滤无效增长率值
+            latest_growth = latest_growth[latest_growth['销量增长率'].notna()]
+            latest_growth = latest_growth[np.isfinite(latest_growth['销量增长率'])]
+
+            if not latest_growth.empty:
+                # 添加趋势判断
+                latest_growth['趋势'] = np.where(
+                    latest_growth['销量增长率'] > 15, '强劲增长',
+                    np.where(
+                        latest_growth['销量增长率'] > 0, '增长',
+                        np.where(
+                            latest_growth['销量增长率'] > -10, '轻微下降',
+                            '显著下降'
+                        )
+                    )
+                )
+
+                # 添加备货建议
+                latest_growth['备货建议对象'] = latest_growth['销量增长率'].apply(generate_recommendation)
+                latest_growth['备货建议'] = latest_growth['备货建议对象'].apply(lambda x: x['建议'])
+                latest_growth['调整比例'] = latest_growth['备货建议对象'].apply(lambda x: x['调整比例'])
+                latest_growth['建议颜色'] = latest_growth['备货建议对象'].apply(lambda x: x['颜色'])
+                latest_growth['建议样式类'] = latest_growth['备货建议对象'].apply(lambda x: x['样式类'])
+                latest_growth['建议图标'] = latest_growth['备货建议对象'].apply(lambda x: x['图标'])
+            else:
+                # 创建空的结果框架
+                latest_growth = pd.DataFrame(columns=growth_df.columns)
+        except Exception as e:
+            # 记录错误但继续执行
+            print(f"处理增长率数据时出错: {str(e)}")
+            latest_growth = pd.DataFrame(columns=growth_df.columns)
+
+        return {
+            'all_growth': growth_df,
+            'latest_growth': latest_growth
+        }
+    else:
+        return {
+            'all_growth': pd.DataFrame(),
+            'latest_growth': pd.DataFrame()
+        }
+
+
+# 函数：计算重点SKU
+def calculate_top_skus(merged_df, by_region=False):
+    """计算占销售量80%的SKU及其准确率 - 修复空区域问题"""
+    if merged_df.empty:
+        return {} if by_region else pd.DataFrame()
+
+    if by_region:
+        # 按区域、产品汇总
+        grouped = merged_df.groupby(['所属区域', '产品代码'], observed=True).agg({
+            '求和项:数量（箱）': 'sum',
+            '预计销售量': 'sum'
+        }).reset_index()
+
+        # 计算准确率
+        grouped['数量准确率'] = calculate_unified_accuracy_array(
+            grouped['求和项:数量（箱）'], grouped['预计销售量']
+        )
+
+        # 计算各区域的占比80%SKU
+        results = {}
+        for region in grouped['所属区域'].unique():
+            if pd.isna(region) or region is None or region == 'None':
+                continue  # 跳过空区域
+
+            region_data = grouped[grouped['所属区域'] == region].copy()
+            if region_data.empty:
+                continue  # 跳过没有数据的区域
+
+            total_sales = region_data['求和项:数量（箱）'].sum()
+            if total_sales <= 0:
+                continue  # 跳过销售量为0的区域
+
+            # 按销售量降序排序
+            region_data = region_data.sort_values('求和项:数量（箱）', ascending=False)
+
+            # 计算累计销售量和占比
+            region_data['累计销售量'] = region_data['求和项:数量（箱）'].cumsum()
+            region_data['累计占比'] = region_data['累计销售量'] / total_sales * 100
+
+            # 筛选占比80%的SKU
+            top_skus = region_data[region_data['累计占比'] <= 80].copy()
+
+            # 如果没有SKU达到80%阈值，至少取前3个SKU
+            if top_skus.empty:
+                top_skus = region_data.head(min(3, len(region_data)))
+
+            results[region] = top_skus
+
+        return results
+    else:
+        # 全国汇总
+        grouped = merged_df.groupby('产品代码', observed=True).agg({
+            '求和项:数量（箱）': 'sum',
+            '预计销售量': 'sum'
+        }).reset_index()
+
+        # 计算准确率
+        grouped['数量准确率'] = calculate_unified_accuracy_array(
+            grouped['求和项:数量（箱）'], grouped['预计销售量']
+        )
+
+        total_sales = grouped['求和项:数量（箱）'].sum()
+        if total_sales <= 0:
+            return pd.DataFrame(columns=grouped.columns)  # 返回空DataFrame但保持列结构
+
+        # 按销售量降序排序
+        grouped = grouped.sort_values('求和项:数量（箱）', ascending=False)
+
+        # 计算累计销售量和占比 - 这里修复了列名不匹配的错误
+        grouped['累计销售量'] = grouped['求和项:数量（箱）'].cumsum()
+        grouped['累计占比'] = grouped['累计销售量'] / total_sales * 100  # 修改这里，使用"累计销售量"而不是"累计销量"
+
+        # 筛选占比80%的SKU
+        top_skus = grouped[grouped['累计占比'] <= 80].copy()
+
+        # 如果没有SKU达到80%阈值，至少取前5个SKU
+        if top_skus.empty:
+            top_skus = grouped.head(min(5, len(grouped)))
+
+        return top_skus
+
+
+# 函数：批量计算产品销售指标
+def compute_product_sales_metrics(actual_data, product_codes=None, today=None, min_seasonal_index=0.3):
+    """
+    对出货数据做少量分组运算，一次性得到所有产品的销售指标和当月季节性指数
+
+    参数:
+    actual_data (DataFrame): 实际销售数据
+    product_codes (array-like): 需要计算的产品代码，为None时计算全部产品
+    today (date): 计算基准日期，默认为今天
+    min_seasonal_index (float): 季节性指数下限
+
+    返回:
+    tuple: (产品销售指标字典, 产品季节性指数字典)
+    """
+    if today is None:
+        today = datetime.now().date()
+    if product_codes is None:
+        product_codes = actual_data['产品代码'].unique()
+    product_codes = list(dict.fromkeys(product_codes))
+
+    qty_col = '求和项:数量（箱）'
+    sales = actual_data.loc[actual_data['产品代码'].isin(product_codes),
+                            ['产品代码', '订单日期', '所属区域', '申请人', qty_col]]
+    order_dates = sales['订单日期']
+
+    # 总销量、最早订单日期和过去90天销量
+    by_product = sales.groupby('产品代码', observed=True)
+    total_sales = by_product[qty_col].sum()
+    first_dates = by_product['订单日期'].min()
+    ninety_days_ago = pd.Timestamp(today - timedelta(days=90))
+    # 不在90天内的出货按0计入，结果与total_sales的产品一致（空的分类索引在pandas中查找不存在的产品会出错）
+    recent_sales = sales[qty_col].where(order_dates >= ninety_days_ago, 0).groupby(
+        sales['产品代码'], observed=True).sum()
+
+    # 每日销量序列的标准差，只有一天数据时为0
+    daily_sales = sales.groupby(['产品代码', order_dates.dt.normalize()], observed=True)[qty_col].sum()
+    daily_groups = daily_sales.groupby(level=0, observed=True)
+    sales_std = daily_groups.std().where(daily_groups.size() > 1, 0)
+
+    # 按月汇总销量，用于计算当月季节性指数
+    monthly_sales = sales.groupby(['产品代码', order_dates.dt.month.rename('月份')], observed=True)[qty_col].sum()
+    monthly_groups = monthly_sales.groupby(level=0, observed=True)
+    monthly_avg = monthly_groups.mean()
+    month_count = monthly_groups.size()
+    current_month_sales = monthly_sales[monthly_sales.index.get_level_values(1) == today.month].droplevel(1)
+
+    # 按区域和销售人员分组统计
+    region_sales = {}
+    for (product_code, region), value in sales.groupby(['产品代码', '所属区域'], observed=True)[qty_col].sum().items():
+        region_sales.setdefault(product_code, {})[region] = value
+    person_sales = {}
+    for (product_code, person), value in sales.groupby(['产品代码', '申请人'], observed=True)[qty_col].sum().items():
+        person_sales.setdefault(product_code, {})[person] = value
+
+    product_sales_metrics = {}
+    seasonal_indices = {}
+    for product_code in product_codes:
+        if product_code not in total_sales.index:
+            # 无销售记录
+            product_sales_metrics[product_code] = {
+                'daily_avg_sales': 0,
+                'sales_std': 0,
+                'coefficient_of_variation': float('inf'),
+                'total_sales': 0,
+                'last_90_days_sales': 0,
+                'region_sales': {},
+                'person_sales': {}
+            }
+            seasonal_index = 1.0  # 无销售数据默认为1
+        else:
+            # 使用从最早订单到今天的天数作为分母
+            total = total_sales[product_code]
+            days_range = (today - first_dates[product_code].date()).days + 1
+            daily_avg_sales = total / days_range if days_range > 0 else 0
+            std = sales_std[product_code]
+            coefficient_of_variation = std / daily_avg_sales if daily_avg_sales > 0 else float('inf')
+
+            product_sales_metrics[product_code] = {
+                'daily_avg_sales': daily_avg_sales,
+                'sales_std': std,
+                'coefficient_of_variation': coefficient_of_variation,
+                'total_sales': total,
+                'last_90_days_sales': recent_sales[product_code],
+                'region_sales': region_sales.get(product_code, {}),
+                'person_sales': person_sales.get(product_code, {})
+            }
+
+            # 只有一个月的数据或当月无数据时，季节性指数默认为1
+            if month_count.get(product_code, 0) > 1 and product_code in current_month_sales.index:
+                seasonal_index = current_month_sales[product_code] / monthly_avg[product_code]
+            else:
+                seasonal_index = 1.0
+
+        # 应用季节性指数下限，避免因季节性极低导致的问题
+        seasonal_indices[product_code] = max(seasonal_index, min_seasonal_index)
+
+    return product_sales_metrics, seasonal_indices
+
+
+# 函数：分析批次风险
+def analyze_batch_risk(batch_data, actual_data, forecast_data, prices, min_daily_sales=0.5, min_seasonal_index=0.3,
+                       risk_horizons=DEFAULT_RISK_HORIZONS, product_metrics=None):
+    """
+    分析批次风险，计算批次的风险等级、清库天数和积压风险等
+
+    参数:
+    batch_data (DataFrame): 批次数据
+    actual_data (DataFrame): 实际销售数据
+    forecast_data (DataFrame): 预测数据
+    prices (dict): 产品单价字典
+    min_daily_sales (float): 最小日均销量阈值，防止清库天数计算为无穷大
+    min_seasonal_index (float): 季节性指数下限，防止季节性太低导致调整后销量接近零
+    risk_horizons (tuple): 积压风险评估周期（天），每个周期生成一列积压风险
+    product_metrics (tuple): 预先计算的(产品销售指标, 季节性指数)，如refresh_product_sales_metrics的结果；
+        为None时根据actual_data计算
+
+    返回:
+    DataFrame: 批次风险分析结果
+    """
+    if batch_data.empty:
+        return pd.DataFrame()
+
+    batch_analysis = []
+    days_to_clear_list = []
+    batch_age_list = []
+    today = datetime.now().date()
+
+    # 分组一次计算所有批次产品的销售指标和季节性指数
+    if product_metrics is None:
+        product_metrics = compute_product_sales_metrics(
+            actual_data, batch_data['产品代码'].unique(), today, min_seasonal_index
+        )
+    product_sales_metrics, seasonal_indices = product_metrics
+
+    # 构建责任归属分析索引
+    responsibility_index = build_responsibility_index(actual_data, forecast_data)
+
+    # 为每个批次计算风险指标
+    for _, batch in batch_data.iterrows():
+        product_code = batch['产品代码']
+        batch_date = pd.Timestamp(batch['生产日期'])  # 示例库存数据的生产日期为date类型
+        batch_qty = batch['数量']
+        batch_age = batch['库龄'] if '库龄' in batch.index else (today - batch_date.date()).days
+
+        # 获取销售指标
+        sales_metrics = product_sales_metrics.get(product_code, {
+            'daily_avg_sales': 0,
+            'sales_std': 0,
+            'coefficient_of_variation': float('inf'),
+            'total_sales': 0,
+            'last_90_days_sales': 0,
+            'region_sales': {},
+            'person_sales': {}
+        })
+
+        # 获取季节性指数
+        seasonal_index = seasonal_indices.get(product_code, 1.0)
+
+        # 获取产品单价并计算批次价值
+        unit_price = prices.get(product_code, 50.0)
+        batch_value = batch_qty * unit_price
+
+        # 计算预计清库天数
+        daily_avg_sales = sales_metrics['daily_avg_sales']
+
+        # 考虑季节性调整，并应用最小销量阈值
+        daily_avg_sales_adjusted = max(daily_avg_sales * seasonal_index, min_daily_sales)
+
+        # 计算清库天数，积压风险在所有批次处理完后批量计算
+        if daily_avg_sales_adjusted > 0:
+            days_to_clear = batch_qty / daily_avg_sales_adjusted
+        else:
+            days_to_clear = float('inf')
+        days_to_clear_list.append(days_to_clear)
+        batch_age_list.append(batch_age)
+
+        # 根据复杂的风险评估逻辑确定风险等级和风险得分
+        # 改进风险等级评估逻辑 - 使用综合评分方法
+        risk_score = 0
+
+        # 库龄因素 (0-40分)
+        if batch_age > 90:
+            risk_score += 40
+        elif batch_age > 60:
+            risk_score += 30
+        elif batch_age > 30:
+            risk_score += 20
+        else:
+            risk_score += 10
+
+        # 清库天数因素 (0-40分)
+        if days_to_clear == float('inf'):
+            risk_score += 40
+        elif days_to_clear > 180:  # 半年以上
+            risk_score += 35
+        elif days_to_clear > 90:
+            risk_score += 30
+        elif days_to_clear > 60:
+            risk_score += 20
+        elif days_to_clear > 30:
+            risk_score += 10
+
+        # 销量波动系数 (0-10分)
+        if sales_metrics['coefficient_of_variation'] > 2.0:
+            risk_score += 10
+        elif sales_metrics['coefficient_of_variation'] > 1.0:
+            risk_score += 5
+
+        # 根据总分确定风险等级
+        if risk_score >= 80:
+            risk_level = "极高风险"
+        elif risk_score >= 60:
+            risk_level = "高风险"
+        elif risk_score >= 40:
+            risk_level = "中风险"
+        elif risk_score >= 20:
+            risk_level = "低风险"
+        else:
+            risk_level = "极低风险"
+
+        # 生成建议措施
+        if risk_level == "极高风险":
+            recommendation = "紧急清理：考虑折价促销"
+        elif risk_level == "高风险":
+            recommendation = "优先处理：降价促销或转仓调配"
+        elif risk_level == "中风险":
+            recommendation = "密切监控：调整采购计划"
+        elif risk_level == "低风险":
+            recommendation = "常规管理：定期审查库存周转"
+        else:
+            recommendation = "维持现状：正常库存水平"
+
+        # 确定积压原因
+        stocking_reasons = []
+        if batch_age > 60:
+            stocking_reasons.append("库龄过长")
+        if sales_metrics['coefficient_of_variation'] > 1.0:
+            stocking_reasons.append("销量波动大")
+        if seasonal_index < 0.8:
+            stocking_reasons.append("季节性影响")
+        if not stocking_reasons:
+            stocking_reasons.append("正常库存")
+
+        # 获取责任区域和责任人
+        responsible_region, responsible_person, responsibility_summary = analyze_responsibility(
+            product_code, batch_date, sales_metrics, forecast_data, actual_data, batch_qty, responsibility_index
+        )
+
+        # 添加批次分析结果，积压风险列先占位
+        batch_record = {
+            '产品代码': product_code,
+            '描述': batch['描述'],
+            '批次日期': batch_date.date(),
+            '批次库存': batch_qty,
+            '库龄': batch_age,
+            '批次价值': batch_value,
+            '日均出货': round(daily_avg_sales, 2),
+            '出货波动系数': round(sales_metrics['coefficient_of_variation'], 2),
+            '预计清库天数': days_to_clear if days_to_clear != float('inf') else float('inf')
+        }
+        for horizon in risk_horizons:
+            batch_record[risk_horizon_column(horizon)] = None
+        batch_record.update({
+            '积压原因': '，'.join(stocking_reasons),
+            '季节性指数': round(seasonal_index, 2),
+            '责任区域': responsible_region,
+            '责任人': responsible_person,
+            '责任分析摘要': responsibility_summary,
+            '风险程度': risk_level,
+            '风险得分': risk_score,
+            '建议措施': recommendation
+        })
+        batch_analysis.append(batch_record)
+
+    # 创建DataFrame并排序
+    batch_df = pd.DataFrame(batch_analysis)
+
+    # 一次计算所有批次在各评估周期下的积压风险
+    if not batch_df.empty:
+        risk_labels = risk_percentage_labels(days_to_clear_list, batch_age_list, risk_horizons)
+        uncleared = np.isinf(days_to_clear_list)
+        for horizon, labels in zip(risk_horizons, risk_labels):
+            batch_df[risk_horizon_column(horizon)] = [
+                "100%" if is_uncleared else label
+                for label, is_uncleared in zip(labels, uncleared)
+            ]
+
+    # 按照风险程度和库龄排序
+    if not batch_df.empty:
+        batch_df['风险排序'] = batch_df['风险程度'].map(RISK_LEVEL_ORDER)
+        batch_df = batch_df.sort_values(by=['风险排序', '库龄'], ascending=[True, False])
+        batch_df = batch_df.drop(columns=['风险排序'])
+
+    return batch_df
+
+
+# 函数：计算批次价值
+def value_batches(batch_analysis, prices, default_price=50.0):
+    """
+    按单价重新计算批次风险分析结果中的批次价值（批次库存×单价），其余列不变
+
+    批次价值是风险分析中唯一依赖单价的列，单价更新时无需重新分析批次风险。
+    """
+    if batch_analysis.empty:
+        return batch_analysis
+    unit_prices = batch_analysis['产品代码'].map(lambda code: prices.get(code, default_price))
+    return batch_analysis.assign(批次价值=batch_analysis['批次库存'] * unit_prices.astype(float))
+
+
+# 函数：按关键字匹配文本列
+def _text_matches(column, keyword):
+    """返回列中包含关键字（不区分大小写）的行掩码，分类列只在类别上匹配一次"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        categories = column.cat.categories
+        matched = categories[categories.astype(str).str.contains(keyword, case=False, regex=False)]
+        return column.isin(matched).to_numpy()
+    return column.astype(str).str.contains(keyword, case=False, regex=False, na=False).to_numpy()
+
+
+# 函数：获取批次风险详情表的一页
+def risk_table_page(batch_analysis, sort_by=None, ascending=True, search=None, page=0, page_size=50):
+    """
+    对批次风险分析结果按关键字检索、排序后取出一页，只有这一页需要格式化和发送到页面
+
+    参数:
+    batch_analysis (DataFrame): 批次风险分析结果
+    sort_by (str): 排序列，为空时保持分析结果的顺序（风险程度从高到低、库龄从长到短）；
+        风险程度按风险高低排序（降序时极高风险在前），预计清库天数中的无法清库（inf）视为最大值
+    ascending (bool): 是否升序
+    search (str): 检索关键字，匹配RISK_TABLE_SEARCH_COLUMNS中任一列，为空时不检索
+    page (int): 页码，从0开始，超出范围时取最后一页
+    page_size (int): 每页行数
+
+    返回:
+    tuple: (当前页的DataFrame, 检索后的总行数, 实际页码)
+    """
+    data = batch_analysis
+    if search:
+        mask = np.zeros(len(data), dtype=bool)
+        for column in RISK_TABLE_SEARCH_COLUMNS:
+            if column in data.columns:
+                mask |= _text_matches(data[column], search)
+        data = data[mask]
+
+    if sort_by:
+        # RISK_LEVEL_ORDER中风险越高序号越小，取负后升序为低风险在前、降序为高风险在前
+        sort_key = (lambda values: -values.map(RISK_LEVEL_ORDER).astype(float)) if sort_by == '风险程度' else None
+        data = data.sort_values(sort_by, ascending=ascending, kind='stable', na_position='last', key=sort_key)
+
+    total_rows = len(data)
+    last_page = max((total_rows - 1) // page_size, 0)
+    page = min(max(page, 0), last_page)
+    return data.iloc[page * page_size:(page + 1) * page_size], total_rows, page
+
+
+# 函数：按产品和人员构建时间窗口累计量索引
+def build_window_sums(df, person_col, date_col, qty_col):
+    """
+    将记录按(产品代码, 人员, 日期)排序，为每个产品保存“人员序号×2^32+日期序号”的有序键和累计量，
+    任意日期区间内各人员的合计量可通过一次二分查找得到
+
+    参数:
+    df (DataFrame): 出货或预测数据
+    person_col (str): 人员列名
+    date_col (str): 日期列名
+    qty_col (str): 数量列名
+
+    返回:
+    dict: {产品代码: (按名称排序的人员列表, 人员序号字典, 有序键数组, 以0开头的累计量数组)}
+    """
+    data = pd.DataFrame({
+        '产品代码': df['产品代码'],
+        '人员': df[person_col],
+        '日期': pd.to_datetime(df[date_col]).dt.normalize(),
+        '数量': df[qty_col].fillna(0)
+    }).dropna(subset=['产品代码', '人员', '日期'])
+    data = data.sort_values(['产品代码', '人员', '日期'], kind='mergesort')
+
+    days = data['日期'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    # 已按人员排序，产品内人员变化处序号加一（即按人员的密集排名，分类类型的人员列同样适用）
+    product_start = data['产品代码'].ne(data['产品代码'].shift())
+    person_start = product_start | data['人员'].ne(data['人员'].shift())
+    person_ranks = person_start.groupby(product_start.cumsum()).cumsum().to_numpy(np.int64) - 1
+    keys = (person_ranks << 32) + days
+    cumulative = data.groupby('产品代码', sort=False, observed=True)['数量'].cumsum().to_numpy()
+    persons = data['人员'].to_numpy()
+
+    window_sums = {}
+    for product_code, positions in data.groupby('产品代码', sort=True, observed=True).indices.items():
+        start, stop = positions[0], positions[-1] + 1
+        product_persons = list(pd.unique(persons[start:stop]))
+        window_sums[product_code] = (
+            product_persons,
+            {person: rank for rank, person in enumerate(product_persons)},
+            keys[start:stop],
+            np.concatenate(([0], cumulative[start:stop]))
+        )
+    return window_sums
+
+
+# 函数：查询时间窗口内各人员的累计量
+def window_sums_by_person(entry, start_day, end_day, persons=None):
+    """
+    对build_window_sums中一个产品的索引做二分查找，返回各人员在[start_day, end_day]闭区间内的数量合计
+
+    参数:
+    entry (tuple): build_window_sums返回的单个产品索引
+    start_day (int): 起始日期序号
+    end_day (int): 结束日期序号
+    persons (list): 需要查询的人员，为None时查询索引中的全部人员；索引中不存在的人员合计为0
+
+    返回:
+    ndarray: 与人员顺序对应的数量合计
+    """
+    entry_persons, ranks, keys, prefix = entry
+    if persons is None:
+        person_ranks = np.arange(len(entry_persons), dtype=np.int64)
+    else:
+        person_ranks = np.array([ranks.get(person, -1) for person in persons], dtype=np.int64)
+
+    left = np.searchsorted(keys, (person_ranks << 32) + start_day, side='left')
+    right = np.searchsorted(keys, (person_ranks << 32) + end_day, side='right')
+    totals = prefix[right] - prefix[left]
+    return np.where((person_ranks >= 0) & (right > left), totals, 0)
+
+
+# 函数：日期转换为日期序号
+def day_number(value):
+    """将日期转换为自1970-01-01起的天数，便于与索引中的日期序号比较"""
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+# 函数：构建责任分析索引
+def build_responsibility_index(actual_df, forecast_df):
+    """
+    一次性构建责任归属分析所需的索引，避免逐批次扫描全表
+
+    参数:
+    actual_df (DataFrame): 实际销售数据
+    forecast_df (DataFrame): 预测数据
+
+    返回:
+    dict: 包含销售人员-区域映射、产品默认责任区域/责任人、出货和预测的时间窗口累计量索引
+    """
+    qty_col = '求和项:数量（箱）'
+
+    # 建立销售人员-区域映射，同一人员对应多个区域时以最后出现的组合为准
+    person_region_data = actual_df[['申请人', '所属区域']].drop_duplicates()
+    person_region = dict(zip(person_region_data['申请人'], person_region_data['所属区域']))
+
+    # 每个产品出货量最大的区域和人员作为默认责任方
+    region_totals = actual_df.groupby(['产品代码', '所属区域'], observed=True)[qty_col].sum()
+    person_totals = actual_df.groupby(['产品代码', '申请人'], observed=True)[qty_col].sum()
+    default_regions = {code: key[1] for code, key in region_totals.groupby(level=0, observed=True).idxmax().items()}
+    default_persons = {code: key[1] for code, key in person_totals.groupby(level=0, observed=True).idxmax().items()}
+
+    return {
+        'person_region': person_region,
+        'default_regions': default_regions,
+        'default_persons': default_persons,
+        'sales': build_window_sums(actual_df, '申请人', '订单日期', qty_col),
+        'forecasts': build_window_sums(forecast_df, '销售员', '所属年月', '预计销售量')
+    }
+
+
+# 函数：分析责任归属
+def analyze_responsibility(product_code, batch_date, sales_metrics, forecast_df, actual_df, batch_qty, index=None):
+    """
+    分析批次库存的责任归属
+
+    参数:
+    product_code (str): 产品代码
+    batch_date (datetime): 批次生产日期
+    sales_metrics (dict): 产品销售指标
+    forecast_df (DataFrame): 预测数据
+    actual_df (DataFrame): 实际销售数据
+    batch_qty (float): 批次库存数量
+    index (dict): build_responsibility_index构建的索引，为None时根据传入数据临时构建
+
+    返回:
+    tuple: (责任区域, 责任人, 责任分析摘要)
+    """
+    if index is None:
+        index = build_responsibility_index(actual_df, forecast_df)
+
+    today = datetime.now().date()
+    batch_date = batch_date.date()
+
+    # 销售人员-区域映射和产品默认责任方
+    sales_person_region_mapping = index['person_region']
+    default_region = index['default_regions'].get(product_code, "未知")
+    default_person = index['default_persons'].get(product_code, "系统管理员")
+
+    # 定义时间窗口
+    forecast_start_day = day_number(batch_date - timedelta(days=90))
+    forecast_end_day = day_number(batch_date + timedelta(days=30))
+    sales_start_day = day_number(batch_date)
+    sales_end_day = day_number(min(today, batch_date + timedelta(days=90)))
+
+    # 该产品各人员的出货和预测累计量
+    product_sales = index['sales'].get(product_code)
+    product_forecasts = index['forecasts'].get(product_code)
+
+    # 初始化责任评分
+    person_scores = {}
+    region_scores = {}
+
+    # 计算预测未兑现量
+    person_allocations = {}
+    forecast_responsibility = {}
+
+    if product_forecasts is not None:
+        # 按销售人员统计窗口内的预测总量和实际销售总量
+        forecast_persons = product_forecasts[0]
+        person_forecast_totals = window_sums_by_person(product_forecasts, forecast_start_day, forecast_end_day)
+        if product_sales is not None:
+            person_actual_totals = window_sums_by_person(product_sales, sales_start_day, sales_end_day,
+                                                         forecast_persons)
+        else:
+            person_actual_totals = np.zeros(len(forecast_persons))
+
+        # 计算未兑现预测量，只保留有预测且未兑现的人员
+        person_unfulfilled = np.maximum(0, person_forecast_totals - person_actual_totals)
+        for i in np.flatnonzero((person_forecast_totals > 0) & (person_unfulfilled > 0)):
+            forecast_qty = person_forecast_totals[i]
+            person_actual_sales = person_actual_totals[i]
+            forecast_responsibility[forecast_persons[i]] = {
+                "forecast_quantity": forecast_qty,
+                "actual_sales": person_actual_sales,
+                "unfulfilled": person_unfulfilled[i],
+                "fulfillment_rate": person_actual_sales / forecast_qty
+            }
+
+        # 如果有未兑现预测，按未兑现量分配库存责任
+        if forecast_responsibility:
+            total_unfulfilled = sum(detail["unfulfilled"] for person, detail in forecast_responsibility.items())
+
+            if total_unfulfilled > 0:
+                # 按未兑现预测量比例分配库存
+                for person, detail in forecast_responsibility.items():
+                    allocation = int(batch_qty * (detail["unfulfilled"] / total_unfulfilled))
+                    person_allocations[person] = max(1, allocation)
+
+                    # 计算责任得分
+                    # 预测差异得分 (60%)
+                    forecast_score = 0.6 * (1 - detail["fulfillment_rate"])
+                    # 分配总得分
+                    person_scores[person] = forecast_score
+
+                    # 设置区域得分
+                    person_region = sales_person_region_mapping.get(person, default_region)
+                    region_scores[person_region] = region_scores.get(person_region, 0) + forecast_score
+
+                # 确保所有库存都被分配
+                allocated_total = sum(person_allocations.values())
+                if allocated_total < batch_qty and person_allocations:
+                    # 将剩余库存分配给未兑现预测量最大的人
+                    top_unfulfilled_person = max(forecast_responsibility.items(),
+                                                 key=lambda x: x[1]["unfulfilled"])[0]
+                    person_allocations[top_unfulfilled_person] += (batch_qty - allocated_total)
+
+    # 如果没有人有预测未兑现，使用默认责任人
+    if not person_scores:
+        person_scores[default_person] = 1.0
+        region_scores[default_region] = 1.0
+        person_allocations[default_person] = batch_qty
+
+    # 确定最终责任人
+    if person_allocations:
+        responsible_person = max(person_allocations.items(), key=lambda x: x[1])[0]
+
+        # 获取责任区域
+        if responsible_person in sales_person_region_mapping:
+            responsible_region = sales_person_region_mapping[responsible_person]
+        else:
+            responsible_region = default_region
+    else:
+        responsible_person = default_person
+        responsible_region = default_region
+
+    # 构建责任分析摘要
+    responsibility_summary = generate_responsibility_summary(
+        responsible_person, forecast_responsibility, person_allocations, batch_qty
+    )
+
+    return responsible_region, responsible_person, responsibility_summary
+
+
+# 函数：生成责任分析摘要
+def generate_responsibility_summary(responsible_person, forecast_responsibility, person_allocations, batch_qty):
+    """
+    生成责任分析摘要
+
+    参数:
+    responsible_person (str): 主要责任人
+    forecast_responsibility (dict): 预测责任详情
+    person_allocations (dict): 人员库存分配情况
+    batch_qty (float): 批次库存数量
+
+    返回:
+    str: 责任分析摘要
+    """
+    if not person_allocations:
+        return "无法确定责任"
+
+    # 确定主要责任人的责任原因
+    main_reasons = []
+
+    if responsible_person in forecast_responsibility:
+        detail = forecast_responsibility[responsible_person]
+        forecast_qty = detail["forecast_quantity"]
+        actual_sales = detail["actual_sales"]
+        fulfillment_rate = detail["fulfillment_rate"] * 100
+        unfulfilled = detail["unfulfilled"]
+
+        main_reasons.append(f"预测{forecast_qty:.0f}件但仅销售{actual_sales:.0f}件(履行率{fulfillment_rate:.0f}%)")
+        main_reasons.append(f"未兑现预测{unfulfilled:.0f}件")
+    else:
+        main_reasons.append("综合预测与销售因素")
+
+    # 获取主要责任人应承担的库存数量
+    main_allocation = person_allocations.get(responsible_person, 0)
+
+    # 构建主要责任人部分
+    main_reason = "、".join(main_reasons)
+    main_part = f"{responsible_person}主要责任({main_reason}，承担{main_allocation}件)"
+
+    # 构建共同责任部分
+    other_persons = []
+    for person, allocation in person_allocations.items():
+        if person != responsible_person and allocation > 0:
+            if person in forecast_responsibility:
+                unfulfilled = forecast_responsibility[person]["unfulfilled"]
+                other_persons.append(f"{person}(未兑现预测{unfulfilled:.0f}件，承担{allocation}件)")
+            else:
+                other_persons.append(f"{person}(责任共担，承担{allocation}件)")
+
+    # 组合最终摘要
+    if other_persons:
+        return f"{main_part}，共同责任：{', '.join(other_persons)}"
+    else:
+        return main_part
+
+
+# 函数：读取出货增量存储状态
+def read_store_state(store_dir=SHIPMENT_STORE_DIR):
+    """
+    读取出货增量存储的状态（版本号、各月份明细行数和变更记录），存储尚未创建时返回初始状态
+
+    参数:
+    store_dir (str): 存储目录
+
+    返回:
+    dict: 存储状态
+    """
+    try:
+        with open(os.path.join(store_dir, 'state.json'), encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {
+            'format_version': SHIPMENT_STORE_FORMAT_VERSION,
+            'store_id': uuid.uuid4().hex,
+            'version': 0,
+            'last_order_date': None,
+            'months': {},
+            'changes': []
+        }
+
+    if state.get('format_version') != SHIPMENT_STORE_FORMAT_VERSION:
+        raise ValueError(f"出货增量存储格式版本不兼容: {state.get('format_version')}")
+    return state
+
+
+# 函数：原子写入存储文件
+def _write_store_file(store_dir, relative_path, write):
+    """先写临时文件再替换，读取方不会看到写了一半的分区或状态文件"""
+    path = os.path.join(store_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+# 函数：汇总出货月度单元
+def aggregate_shipment_cells(shipments):
+    """按月份、区域、申请人、产品汇总出货明细（保留空值分组），可代替明细作为process_data和增长率计算的输入"""
+    return shipments.groupby(
+        ['所属年月', '所属区域', '申请人', '产品代码'], dropna=False, sort=True, observed=True
+    )['求和项:数量（箱）'].sum().reset_index()
+
+
+# 函数：增量导入出货数据
+def ingest_shipments(delta, store_dir=SHIPMENT_STORE_DIR):
+    """
+    将新增的出货明细并入增量存储
+
+    已有明细中落在新数据订单日期范围内的行会被替换（同一批数据重复导入结果不变），范围外的历史数据保持不变；
+    只重写受影响月份的明细和月度汇总分区，并在变更记录中登记受影响的月份和产品。同一存储只允许一个导入进程。
+
+    参数:
+    delta (DataFrame): 新增的出货明细，列与load_actual_data的结果相同
+    store_dir (str): 存储目录
+
+    返回:
+    dict: 本次变更记录（版本号、日期范围、行数、受影响的月份和产品），没有有效数据时返回None
+    """
+    if pa is None:
+        raise RuntimeError("出货增量存储需要安装pyarrow")
+
+    state = read_store_state(store_dir)
+    delta = delta.dropna(subset=['订单日期'])
+    if delta.empty:
+        return None
+
+    delta_days = delta['订单日期'].dt.normalize()
+    start_day, end_day = delta_days.min(), delta_days.max()
+
+    # 受影响的月份：新数据所在月份，以及日期范围覆盖到的已有月份
+    range_months = pd.period_range(start_day, end_day, freq='M').strftime('%Y-%m')
+    months = sorted(set(delta['所属年月'].dropna()) | (set(range_months) & set(state['months'])))
+    products = set(delta['产品代码'].dropna())
+    replaced_rows = 0
+
+    for month in months:
+        month_delta = delta[delta['所属年月'] == month]
+        if month in state['months']:
+            existing = pd.read_parquet(os.path.join(store_dir, 'rows', f"{month}.parquet"), engine='pyarrow')
+            existing_days = existing['订单日期'].dt.normalize()
+            replaced = (existing_days >= start_day) & (existing_days <= end_day)
+            products.update(existing.loc[replaced, '产品代码'].dropna())
+            replaced_rows += int(replaced.sum())
+            month_rows = pd.concat(share_categories(existing[~replaced], month_delta), ignore_index=True)
+        else:
+            month_rows = month_delta
+
+        month_rows = month_rows.sort_values('订单日期', kind='stable').reset_index(drop=True)
+        _write_store_file(store_dir, os.path.join('rows', f"{month}.parquet"),
+                          lambda path: month_rows.to_parquet(path, engine='pyarrow'))
+        month_cells = aggregate_shipment_cells(month_rows)
+        _write_store_file(store_dir, os.path.join('monthly', f"{month}.parquet"),
+                          lambda path: month_cells.to_parquet(path, engine='pyarrow'))
+        state['months'][month] = len(month_rows)
+
+    change = {
+        'version': state['version'] + 1,
+        'ingested_at': datetime.now().isoformat(timespec='seconds'),
+        'date_range': [start_day.date().isoformat(), end_day.date().isoformat()],
+        'rows': len(delta),
+        'replaced_rows': replaced_rows,
+        'months': months,
+        'products': sorted(products)
+    }
+
+    # 分区全部写完后再更新状态，状态文件始终只指向完整的数据
+    state['version'] = change['version']
+    state['months'] = dict(sorted(state['months'].items()))
+    last_order_date = end_day.date().isoformat()
+    if state['last_order_date'] is None or state['last_order_date'] < last_order_date:
+        state['last_order_date'] = last_order_date
+    state['changes'] = (state['changes'] + [change])[-SHIPMENT_STORE_CHANGE_LOG_SIZE:]
+
+    def write_state(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+
+    _write_store_file(store_dir, 'state.json', write_state)
+    return change
+
+
+# 函数：读取增量存储分区
+def _read_store_partitions(store_dir, kind, months, columns):
+    """按月份顺序读取并合并指定类型的分区，没有分区时返回只含列名的空表"""
+    state = read_store_state(store_dir)
+    months = sorted(state['months']) if months is None else sorted(set(months) & set(state['months']))
+    frames = [pd.read_parquet(os.path.join(store_dir, kind, f"{month}.parquet"), engine='pyarrow')
+              for month in months]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    # 各分区的分类字典不同，先统一字典再合并，合并结果保持分类类型
+    return pd.concat(share_categories(*frames), ignore_index=True)
+
+
+# 函数：读取增量存储中的出货明细
+def load_store_shipments(store_dir=SHIPMENT_STORE_DIR, months=None):
+    """读取增量存储中的出货明细（列与load_actual_data的结果相同），months为None时读取全部月份"""
+    return _read_store_partitions(store_dir, 'rows', months,
+                                  ['订单日期', '所属区域', '申请人', '产品代码', '求和项:数量（箱）', '所属年月'])
+
+
+# 函数：读取增量存储中的月度汇总
+def load_store_monthly_cells(store_dir=SHIPMENT_STORE_DIR, months=None):
+    """读取增量存储中按月份、区域、申请人、产品汇总的出货数量，months为None时读取全部月份"""
+    return _read_store_partitions(store_dir, 'monthly', months,
+                                  ['所属年月', '所属区域', '申请人', '产品代码', '求和项:数量（箱）'])
+
+
+# 函数：获取增量存储的变更范围
+def store_changes_since(store_dir, version):
+    """
+    汇总某个版本之后增量存储中受影响的月份和产品，供下游缓存只刷新受影响的部分
+
+    参数:
+    store_dir (str): 存储目录
+    version (int): 下游缓存对应的存储版本
+
+    返回:
+    dict: {'months': 月份集合, 'products': 产品集合}；变更记录已被截断或版本不属于该存储时返回None，表示需要全部重算
+    """
+    state = read_store_state(store_dir)
+    if version == state['version']:
+        return {'months': set(), 'products': set()}
+
+    changes = [change for change in state['changes'] if change['version'] > version]
+    if version > state['version'] or not changes or changes[0]['version'] != version + 1:
+        return None
+
+    return {
+        'months': {month for change in changes for month in change['months']},
+        'products': {product for change in changes for product in change['products']}
+    }
+
+
+# 函数：转换为JSON可保存的值
+def _json_ready(value):
+    """将销售指标中的numpy数值转换为Python数值，字典递归转换"""
+    if isinstance(value, dict):
+        return {str(key): _json_ready(item) for key, item in value.items()}
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# 函数：刷新产品销售指标
+def refresh_product_sales_metrics(store_dir=SHIPMENT_STORE_DIR, today=None, min_seasonal_index=0.3, shipments=None):
+    """
+    维护持久化的产品销售指标：计算日期和季节性指数下限与上次相同时，只重算上次之后出货有变化的产品
+
+    参数:
+    store_dir (str): 存储目录
+    today (date): 计算基准日期，默认为今天
+    min_seasonal_index (float): 季节性指数下限
+    shipments (DataFrame): 已读取的存储出货明细，为None时从存储读取
+
+    返回:
+    tuple: (产品销售指标字典, 产品季节性指数字典)，与compute_product_sales_metrics的结果相同
+    """
+    if today is None:
+        today = datetime.now().date()
+
+    state = read_store_state(store_dir)
+    metrics_path = os.path.join(store_dir, 'product_metrics.json')
+    changes = None
+    try:
+        with open(metrics_path, encoding='utf-8') as f:
+            cached = json.load(f)
+        if (cached['store_id'] == state['store_id'] and cached['as_of'] == today.isoformat()
+                and cached['min_seasonal_index'] == min_seasonal_index):
+            changes = store_changes_since(store_dir, cached['version'])
+    except (OSError, ValueError, KeyError):
+        cached = None
+
+    if shipments is None:
+        shipments = load_store_shipments(store_dir)
+
+    if changes is None:
+        # 首次计算、日期变化或变更记录不足时全部重算
+        product_sales_metrics, seasonal_indices = compute_product_sales_metrics(
+            shipments, None, today, min_seasonal_index
+        )
+    else:
+        product_sales_metrics, seasonal_indices = cached['metrics'], cached['seasonal_indices']
+        if changes['products']:
+            changed_metrics, changed_indices = compute_product_sales_metrics(
+                shipments, sorted(changes['products']), today, min_seasonal_index
+            )
+            product_sales_metrics.update(changed_metrics)
+            seasonal_indices.update(changed_indices)
+
+            # 被替换后已没有出货记录的产品不再保留
+            present_products = set(shipments['产品代码'].unique())
+            for product_code in changes['products']:
+                if product_code not in present_products:
+                    product_sales_metrics.pop(product_code, None)
+                    seasonal_indices.pop(product_code, None)
+
+    if changes is None or changes['products']:
+        metrics_cache = {
+            'store_id': state['store_id'],
+            'version': state['version'],
+            'as_of': today.isoformat(),
+            'min_seasonal_index': min_seasonal_index,
+            'metrics': _json_ready(product_sales_metrics),
+            'seasonal_indices': _json_ready(seasonal_indices)
+        }
+
+        def write_metrics(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(metrics_cache, f, ensure_ascii=False)
+
+        if os.path.isdir(store_dir):
+            _write_store_file(store_dir, 'product_metrics.json', write_metrics)
+
+    return product_sales_metrics, seasonal_indices
+
+
+# 输入文件类型 -> 加载函数，load_input_files按此分派（工作进程中按名称引用，须为模块级函数）
+INPUT_LOADERS = {
+    'actual': load_actual_data,
+    'forecast': load_forecast_data,
+    'product_info': load_product_info,
+    'inventory': load_inventory_data,
+    'price': load_price_data
+}
+
+# 各类型输入文件的解析缓存部分（见write_parsed_cache）
+INPUT_CACHE_PARTS = {'inventory': ('inventory', 'batch')}
+
+# 在工作进程中解析后仍没有解析缓存的文件（加载出错改用了示例数据，或存在无法转换为Arrow的混合类型列），
+# 按缓存文件路径（包含内容摘要）记录，内容不变时不再为写入缓存而重复解析
+_uncacheable_inputs = set()
+
+
+# 函数：判断输入文件是否需要解析
+def needs_parsing(kind, file_path, to_cache=False):
+    """
+    文件存在且没有可用的解析缓存时返回True（示例数据和缓存命中都很快，无需交给工作进程）
+
+    to_cache为True时只返回解析结果能写入解析缓存的文件：未安装pyarrow，或同一内容的文件解析后
+    未能写入缓存时返回False，此时由调用方在当前进程中加载
+    """
+    if not isinstance(file_path, str) or not os.path.exists(file_path):
+        return False
+    if pa_feather is None:
+        return not to_cache
+    try:
+        _, paths = _parsed_cache_paths(kind, file_path, INPUT_CACHE_PARTS.get(kind, ('data',)))
+    except OSError:
+        return not to_cache
+    if to_cache and tuple(paths) in _uncacheable_inputs:
+        return False
+    return not all(os.path.exists(path) for path in paths)
+
+
+# 函数：获取输入文件版本
+def input_file_versions(files):
+    """
+    返回各输入文件的版本标识（见data_version），文件不存在时为“类型:sample”
+
+    每次调用只检查文件大小和修改时间，两者变化时才重新计算内容摘要，可在每次页面重跑时调用以发现文件更新；
+    只修改了时间而内容不变的文件版本不变。
+    """
+    return {
+        kind: data_version(kind, path, None) if isinstance(path, str) and os.path.isfile(path) else f"{kind}:sample"
+        for kind, path in files.items()
+    }
+
+
+# 函数：在工作进程中加载单个输入文件
+def _load_input_file(kind, file_path, return_data=True):
+    """调用对应的加载函数，错误信息收集后随结果返回（回调函数不能跨进程传递）"""
+    messages = []
+    data = INPUT_LOADERS[kind](file_path, on_error=messages.append)
+    return (data if return_data else None), messages
+
+
+# 函数：并行解析输入文件
+def parse_input_files(files, max_workers=None, return_data=True):
+    """
+    在进程池中并行解析需要解析的文件（见needs_parsing），解析结果同时写入解析缓存
+
+    参数:
+    files (dict): 文件类型（INPUT_LOADERS中的键） -> 文件路径
+    max_workers (int): 最大工作进程数，默认为可用的CPU核数；为1或只有一个文件需要解析时不启动进程池
+    return_data (bool): 为False时工作进程只写入解析缓存，不回传数据（之后按文件从缓存读取），
+        此时只解析能写入解析缓存的文件（见needs_parsing）
+
+    返回:
+    dict: 在工作进程中解析的文件类型 -> (加载结果, 错误信息列表)，未使用进程池时为空
+    """
+    pending = [kind for kind, path in files.items() if needs_parsing(kind, path, to_cache=not return_data)]
+    if max_workers is None:
+        # 只计算当前进程可用的CPU核数（容器和taskset限制下少于os.cpu_count()）
+        try:
+            max_workers = len(os.sched_getaffinity(0))
+        except AttributeError:
+            max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(pending))
+
+    loaded = {}
+    if max_workers > 1:
+        # 大文件先提交，缩短整体等待时间
+        pending.sort(key=lambda kind: os.path.getsize(files[kind]), reverse=True)
+        try:
+            # 使用spawn启动工作进程，避免在Streamlit等多线程进程中fork
+            with ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = {kind: pool.submit(_load_input_file, kind, files[kind], return_data) for kind in pending}
+                loaded = {kind: future.result() for kind, future in futures.items()}
+        except (OSError, BrokenProcessPool):
+            # 无法创建工作进程时由调用方在当前进程中逐个加载
+            loaded = {}
+
+    # 记录解析后仍没有缓存的文件，避免之后每次调用都重新解析
+    for kind in loaded:
+        if needs_parsing(kind, files[kind], to_cache=True):
+            _uncacheable_inputs.add(tuple(_parsed_cache_paths(kind, files[kind],
+                                                              INPUT_CACHE_PARTS.get(kind, ('data',)))[1]))
+    return loaded
+
+
+# 函数：并行加载输入文件
+def load_input_files(files, on_error=None, max_workers=None):
+    """
+    加载多个输入文件，需要解析Excel的文件在进程池中并行解析（openpyxl解析受CPU限制且互不依赖），
+    冷启动耗时接近最慢的单个文件而不是所有文件之和
+
+    参数:
+    files (dict): 文件类型（INPUT_LOADERS中的键） -> 文件路径，路径为None或不存在时使用示例数据
+    on_error (callable): 接收加载错误信息的回调，工作进程中的错误在加载完成后按files的顺序依次报告
+    max_workers (int): 最大工作进程数（见parse_input_files）
+
+    返回:
+    dict: 文件类型 -> 对应加载函数的返回值
+    """
+    loaded = parse_input_files(files, max_workers)
+
+    results = {}
+    for kind, path in files.items():
+        if kind in loaded:
+            results[kind], messages = loaded[kind]
+            for message in messages:
+                report_error(on_error, message)
+        else:
+            results[kind] = INPUT_LOADERS[kind](path, on_error=on_error)
+    return results
+
+
+# 函数：加载全部输入数据
+def load_input_data(actual_file=DEFAULT_ACTUAL_FILE, forecast_file=DEFAULT_FORECAST_FILE,
+                    product_file=DEFAULT_PRODUCT_FILE, inventory_file=DEFAULT_INVENTORY_FILE,
+                    price_file=DEFAULT_PRICE_FILE, on_error=None, shipment_store=None, max_workers=None):
+    """
+    加载仪表盘使用的五个输入文件，文件不存在时与仪表盘一样使用示例数据
+
+    参数:
+    actual_file, forecast_file, product_file, inventory_file, price_file (str): 各输入文件路径
+    on_error (callable): 接收加载错误信息的回调
+    shipment_store (str): 出货增量存储目录，提供时出货数据从存储读取（忽略actual_file），
+        并附带存储中的月度汇总actual_cells
+    max_workers (int): 并行解析文件的最大工作进程数（见load_input_files）
+
+    返回:
+    dict: actual_data、forecast_data、product_info、inventory_data、batch_data和price_data（以及可选的actual_cells）
+    """
+    files = {
+        'forecast': forecast_file,
+        'product_info': product_file,
+        'inventory': inventory_file,
+        'price': price_file
+    }
+    if shipment_store is None:
+        files['actual'] = actual_file
+    loaded = load_input_files(files, on_error=on_error, max_workers=max_workers)
+
+    inventory_data, batch_data = loaded['inventory']
+    inputs = {
+        'forecast_data': loaded['forecast'],
+        'product_info': loaded['product_info'],
+        'inventory_data': inventory_data,
+        'batch_data': batch_data,
+        'price_data': loaded['price']
+    }
+
+    if shipment_store is not None:
+        inputs['actual_data'] = load_store_shipments(shipment_store)
+        inputs['actual_cells'] = load_store_monthly_cells(shipment_store)
+    else:
+        inputs['actual_data'] = loaded['actual']
+    return share_input_categories(inputs)
+
+
+# 函数：统一输入数据的分类字典
+def share_input_categories(inputs):
+    """对load_input_data结构的输入数据调用share_categories，使出货、预测和批次数据共用维度字典"""
+    names = [name for name in ('actual_data', 'actual_cells', 'forecast_data', 'batch_data') if name in inputs]
+    shared = share_categories(*(compact_dimensions(inputs[name].copy(deep=False)) for name in names))
+    return {**inputs, **dict(zip(names, shared))}
+
+
+# 函数：获取默认分析月份
+def default_analysis_months(all_months):
+    """返回仪表盘默认选中的月份：数据中包含的最近3个月，都不在数据中时使用最新月份"""
+    valid_last_three_months = [month for month in get_last_three_months() if month in all_months]
+    if valid_last_three_months:
+        return valid_last_three_months
+    return [all_months[-1]] if len(all_months) else []
+
+
+# 函数：运行全部分析
+def run_full_analysis(inputs, product_metrics=None):
+    """
+    完成仪表盘首次打开时需要的全部分析：汇总与准确率、重点SKU、默认筛选条件下的产品增长率、批次风险及责任归属
+
+    输入包含actual_cells（出货增量存储或SQLite数据库的月度汇总）时，汇总和增长率直接基于月度汇总计算，结果与基于明细相同。
+
+    参数:
+    inputs (dict): load_input_data返回的输入数据
+    product_metrics (tuple): 预先计算的(产品销售指标, 季节性指数)，传给analyze_batch_risk
+
+    返回:
+    dict: processed_data、product_growth、product_growth_filters（增长率对应的区域和月份）和batch_risk_analysis
+    """
+    actual_data = inputs['actual_data']
+    forecast_data = inputs['forecast_data']
+    actual_summary = inputs.get('actual_cells', actual_data)
+
+    # 与仪表盘一致，只汇总实际和预测共有的月份
+    common_months = get_common_months(actual_summary, forecast_data)
+    processed_data = process_data(
+        actual_summary[actual_summary['所属年月'].isin(common_months)],
+        forecast_data[forecast_data['所属年月'].isin(common_months)],
+        inputs['product_info']
+    )
+
+    # 产品增长率按产品趋势页的默认筛选条件（全部区域、默认月份）计算
+    members = processed_data['sales_cube']['members']
+    product_growth_filters = {
+        'regions': list(members['所属区域']),
+        'months': default_analysis_months(list(members['所属年月']))
+    }
+    product_growth = calculate_product_growth(
+        actual_summary, product_growth_filters['regions'], product_growth_filters['months']
+    )
+
+    # 批次风险分析（包含责任归属）
+    batch_risk_analysis = analyze_batch_risk(
+        inputs['batch_data'], actual_data, forecast_data, inputs['price_data'], product_metrics=product_metrics
+    )
+
+    return {
+        'processed_data': processed_data,
+        'product_growth': product_growth,
+        'product_growth_filters': product_growth_filters,
+        'batch_risk_analysis': batch_risk_analysis
+    }
+
+
+# 函数：整理快照数据表
+def snapshot_tables(inputs, results):
+    """
+    将输入数据和分析结果展开为可写入Parquet的数据表
+
+    参数:
+    inputs (dict): load_input_data返回的输入数据
+    results (dict): run_full_analysis返回的分析结果
+
+    返回:
+    tuple: (数据表名 -> DataFrame, 可写入JSON的标量结果)
+    """
+    processed_data = results['processed_data']
+    tables = {name: inputs[name] for name in SNAPSHOT_INPUT_TABLES}
+    if 'actual_cells' in inputs:
+        # 出货来自增量存储或SQLite数据库时一并保存月度汇总
+        tables['actual_cells'] = inputs['actual_cells']
+    tables['price_data'] = pd.DataFrame({
+        '产品代码': list(inputs['price_data'].keys()),
+        '单价': list(inputs['price_data'].values())
+    })
+
+    for name in SNAPSHOT_PROCESSED_TABLES:
+        tables[name] = processed_data[name]
+    tables['national_accuracy_monthly'] = processed_data['national_accuracy']['monthly']
+    tables['regional_accuracy_monthly'] = processed_data['regional_accuracy']['region_monthly']
+    tables['regional_accuracy_overall'] = processed_data['regional_accuracy']['region_overall']
+
+    # 各区域的重点SKU合并为一张表，读取时按所属区域拆分
+    regional_top_skus = list(processed_data['regional_top_skus'].values())
+    tables['regional_top_skus'] = pd.concat(regional_top_skus, ignore_index=True) if regional_top_skus \
+        else pd.DataFrame(columns=['所属区域'])
+
+    # 销售立方体只保存维度成员和最细层级，读取时重新汇总其余层级
+    cube = processed_data['sales_cube']
+    for position, dim in enumerate(CUBE_DIMENSIONS):
+        tables[f'sales_cube_members_{position}'] = pd.DataFrame({'成员': cube['members'][dim]})
+    leaf_codes, leaf_values = cube['levels'][tuple(CUBE_DIMENSIONS)]
+    tables['sales_cube_leaf'] = pd.DataFrame({**leaf_codes, **leaf_values})
+
+    tables['product_growth_all'] = results['product_growth']['all_growth']
+    tables['product_growth_latest'] = results['product_growth']['latest_growth']
+    tables['batch_risk_analysis'] = results['batch_risk_analysis']
+
+    scalars = {
+        'national_accuracy': {key: float(value) for key, value in processed_data['national_accuracy']['overall'].items()},
+        'product_growth_filters': results['product_growth_filters']
+    }
+    return tables, scalars
+
+
+# 函数：写入分析快照
+def write_snapshot(inputs, results, sources=None, root=SNAPSHOT_DIR):
+    """
+    将输入数据和分析结果写入带版本号的快照目录（每张表一个Parquet文件，另附manifest.json）
+
+    快照先写入临时目录，完整后再重命名并更新LATEST，读取方不会看到写了一半的快照。
+
+    参数:
+    inputs (dict): load_input_data返回的输入数据
+    results (dict): run_full_analysis返回的分析结果
+    sources (dict): 数据类型 -> 来源文件路径，用于记录各输入的数据版本
+    root (str): 快照根目录
+
+    返回:
+    str: 快照目录
+    """
+    if pa is None:
+        raise RuntimeError("写入快照需要安装pyarrow")
+
+    sources = sources or {}
+    tables, scalars = snapshot_tables(inputs, results)
+
+    # 与仪表盘相同的数据版本标识，快照结果可与实时计算共用缓存键
+    versions = {
+        'actual': data_version('actual', sources.get('actual'), inputs['actual_data']),
+        'forecast': data_version('forecast', sources.get('forecast'), inputs['forecast_data']),
+        'product_info': data_version('product_info', sources.get('product_info'), inputs['product_info']),
+        'inventory': data_version('inventory', sources.get('inventory'), inputs['batch_data']),
+        'price': data_version('price', sources.get('price'), inputs['price_data'])
+    }
+
+    created_at = datetime.now()
+    content_tag = hashlib.sha1(json.dumps(versions, sort_keys=True).encode('utf-8')).hexdigest()[:8]
+    snapshot_id = f"{created_at:%Y%m%d-%H%M%S}-{content_tag}"
+
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = os.path.join(root, f".{snapshot_id}.{os.getpid()}.tmp")
+    os.makedirs(tmp_dir)
+    try:
+        table_entries = {}
+        for name, frame in tables.items():
+            file_name = f"{name}.parquet"
+            frame.to_parquet(os.path.join(tmp_dir, file_name), engine='pyarrow')
+            table_entries[name] = {'file': file_name, 'rows': int(len(frame))}
+
+        manifest = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'snapshot_id': snapshot_id,
+            'created_at': created_at.isoformat(timespec='seconds'),
+            'analysis_date': created_at.date().isoformat(),
+            'sources': {
+                kind: {
+                    'path': sources.get(kind) if isinstance(sources.get(kind), str) else None,
+                    'version': version
+                }
+                for kind, version in versions.items()
+            },
+            'cube_dimensions': CUBE_DIMENSIONS,
+            'tables': table_entries,
+            'scalars': scalars
+        }
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        snapshot_dir = os.path.join(root, snapshot_id)
+        os.replace(tmp_dir, snapshot_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # 最后更新LATEST指向新快照
+    latest_path = os.path.join(root, 'LATEST')
+    tmp_latest = f"{latest_path}.{os.getpid()}.tmp"
+    with open(tmp_latest, 'w', encoding='utf-8') as f:
+        f.write(snapshot_id)
+    os.replace(tmp_latest, latest_path)
+
+    return snapshot_dir
+
+
+# 函数：查找最新快照
+def latest_snapshot(root=SNAPSHOT_DIR):
+    """返回LATEST指向的快照目录，没有可读取的快照（或未安装pyarrow）时返回None"""
+    if pa is None:
+        return None
+
+    try:
+        with open(os.path.join(root, 'LATEST'), encoding='utf-8') as f:
+            snapshot_dir = os.path.join(root, f.read().strip())
+        manifest = read_snapshot_manifest(snapshot_dir)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        return None
+    return snapshot_dir
+
+
+# 函数：读取快照清单
+def read_snapshot_manifest(snapshot_dir):
+    """读取快照目录中的manifest.json（只读取清单，不读取数据表）"""
+    with open(os.path.join(snapshot_dir, 'manifest.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+# 函数：检查快照输入是否与当前文件一致
+def snapshot_changed_inputs(manifest, files):
+    """
+    比较快照记录的各输入版本与当前文件的版本（见input_file_versions）
+
+    参数:
+    manifest (dict): 快照清单
+    files (dict): 文件类型 -> 当前文件路径
+
+    返回:
+    list: 版本不一致（或快照中没有记录）的文件类型，为空表示快照的输入与当前文件相同
+    """
+    sources = manifest.get('sources', {})
+    changed = []
+    for kind, version in input_file_versions(files).items():
+        recorded = sources.get(kind, {}).get('version') or ''
+        if version == f"{kind}:sample":
+            # 当前文件不存在时使用示例数据，与同样使用示例数据（按内容指纹记录版本）生成的快照视为一致
+            if not recorded.startswith(f"{kind}:data:"):
+                changed.append(kind)
+        elif recorded != version:
+            changed.append(kind)
+    return changed
+
+
+# 函数：读取分析快照
+def read_snapshot(snapshot_dir):
+    """
+    读取write_snapshot写入的快照，还原为与load_input_data、run_full_analysis相同结构的结果
+
+    参数:
+    snapshot_dir (str): 快照目录
+
+    返回:
+    tuple: (输入数据, 分析结果, manifest)
+    """
+    manifest = read_snapshot_manifest(snapshot_dir)
+    if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"快照格式版本不兼容: {manifest.get('format_version')}")
+
+    tables = {
+        name: pd.read_parquet(os.path.join(snapshot_dir, entry['file']), engine='pyarrow')
+        for name, entry in manifest['tables'].items()
+    }
+    scalars = manifest['scalars']
+
+    inputs = {name: tables[name] for name in SNAPSHOT_INPUT_TABLES}
+    if 'actual_cells' in tables:
+        inputs['actual_cells'] = tables['actual_cells']
+    inputs['price_data'] = dict(zip(tables['price_data']['产品代码'], tables['price_data']['单价']))
+
+    # 还原销售立方体
+    members = {
+        dim: tables[f'sales_cube_members_{position}']['成员'].to_numpy()
+        for position, dim in enumerate(CUBE_DIMENSIONS)
+    }
+    leaf = tables['sales_cube_leaf']
+    leaf_codes = {dim: leaf[dim].to_numpy() for dim in CUBE_DIMENSIONS}
+    leaf_values = {name: leaf[name].to_numpy() for name in leaf.columns if name not in CUBE_DIMENSIONS}
+
+    processed_data = {name: tables[name] for name in SNAPSHOT_PROCESSED_TABLES}
+    processed_data['sales_cube'] = rollup_sales_cube(members, leaf_codes, leaf_values)
+    processed_data['national_accuracy'] = {
+        'monthly': tables['national_accuracy_monthly'],
+        'overall': scalars['national_accuracy']
+    }
+    processed_data['regional_accuracy'] = {
+        'region_monthly': tables['regional_accuracy_monthly'],
+        'region_overall': tables['regional_accuracy_overall']
+    }
+    processed_data['regional_top_skus'] = {
+        region: group.reset_index(drop=True)
+        for region, group in tables['regional_top_skus'].groupby('所属区域', sort=False, observed=True)
+    }
+
+    results = {
+        'processed_data': processed_data,
+        'product_growth': {
+            'all_growth': tables['product_growth_all'],
+            'latest_growth': tables['product_growth_latest']
+        },
+        'product_growth_filters': scalars['product_growth_filters'],
+        'batch_risk_analysis': tables['batch_risk_analysis']
+    }
+    return inputs, results, manifest
+
+
+# 函数：清理旧快照
+def prune_snapshots(root=SNAPSHOT_DIR, keep=7):
+    """
+    只保留最近的keep个快照（按快照编号排序），LATEST指向的快照始终保留
+
+    返回:
+    list: 被删除的快照目录
+    """
+    latest = latest_snapshot(root)
+    snapshot_ids = sorted(
+        name for name in os.listdir(root)
+        if not name.startswith('.') and os.path.isfile(os.path.join(root, name, 'manifest.json'))
+    )
+
+    removed = []
+    for snapshot_id in snapshot_ids[:max(len(snapshot_ids) - keep, 0)]:
+        snapshot_dir = os.path.join(root, snapshot_id)
+        if latest is not None and os.path.samefile(snapshot_dir, latest):
+            continue
+        shutil.rmtree(snapshot_dir)
+        removed.append(snapshot_dir)
+    return removed
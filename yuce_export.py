@@ -0,0 +1,213 @@
+"""
+结果导出：在需要下载时才把分析结果序列化为CSV或多工作表Excel
+
+CSV按EXPORT_CHUNK_ROWS行一块写出，Excel使用xlsxwriter的constant_memory模式逐行写入（每个工作表写完即落盘），
+导出内容先写入临时文件，超过EXPORT_SPOOL_BYTES后转存到磁盘，生成文件期间内存占用不随数据量增长。
+
+仪表盘把csv_export和analysis_workbook作为下载按钮的延迟数据源，只有点击下载时才生成文件；
+点击下载后Streamlit会把生成的文件完整读入内存并保留以供重复下载，此时占用的内存与文件大小相当。
+命令行导出直接写入目标文件，可以把最新的夜间快照导出为Excel工作簿。
+
+用法:
+    python yuce_export.py --output 分析结果.xlsx [--snapshot snapshots/<快照目录>] [--risk-csv 风险批次.csv]
+"""
+import argparse
+import math
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from yuce_engine import SNAPSHOT_DIR, latest_snapshot, read_snapshot
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# 每次序列化的行数
+EXPORT_CHUNK_ROWS = 50000
+
+# 导出文件在内存中保留的上限，超过后转存到临时文件
+EXPORT_SPOOL_BYTES = 16 * 1024 * 1024
+
+# Excel工作表名最长31个字符
+EXCEL_SHEET_NAME_LIMIT = 31
+
+
+# 函数：分块生成CSV
+def iter_csv_chunks(frame, chunk_rows=EXPORT_CHUNK_ROWS, encoding='utf-8-sig'):
+    """
+    按块把DataFrame序列化为CSV字节串，只有第一块包含表头（utf-8-sig时带BOM，Excel可直接打开中文）
+
+    参数:
+    frame (DataFrame): 导出的数据
+    chunk_rows (int): 每块的行数
+    encoding (str): 编码
+
+    返回:
+    generator: 依次产生各块的bytes
+    """
+    yield frame.iloc[:0].to_csv(index=False).encode(encoding)
+    # 表头之后的块不再带BOM
+    body_encoding = 'utf-8' if encoding == 'utf-8-sig' else encoding
+    for start in range(0, len(frame), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows].to_csv(index=False, header=False).encode(body_encoding)
+
+
+# 函数：导出CSV文件
+def csv_export(frame, columns=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    把数据分块写入临时文件并返回已回到开头的文件对象，可直接作为下载内容
+
+    参数:
+    frame (DataFrame): 导出的数据
+    columns (list): 导出的列，为空时导出全部列
+    chunk_rows (int): 每块的行数
+
+    返回:
+    SpooledTemporaryFile: CSV文件内容
+    """
+    if columns is not None:
+        frame = frame[columns]
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    for chunk in iter_csv_chunks(frame, chunk_rows):
+        output.write(chunk)
+    output.seek(0)
+    return output
+
+
+# 函数：分块生成Excel行
+def _excel_rows(frame, chunk_rows=EXPORT_CHUNK_ROWS):
+    """按块把DataFrame转换为可直接写入xlsxwriter的行，缺失值和无穷大写为空单元格"""
+    for start in range(0, len(frame), chunk_rows):
+        chunk = frame.iloc[start:start + chunk_rows]
+        columns = []
+        for name in chunk.columns:
+            values = chunk[name]
+            if pd.api.types.is_integer_dtype(values.dtype):
+                columns.append(values.tolist())
+            elif pd.api.types.is_float_dtype(values.dtype):
+                columns.append([value if math.isfinite(value) else None for value in values.tolist()])
+            else:
+                columns.append([None if pd.isna(value) else value for value in values.astype(object).tolist()])
+        yield from zip(*columns)
+
+
+# 函数：写入多工作表Excel
+def write_excel_workbook(sheets, target, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    以constant_memory模式把多张表写入同一个Excel工作簿，每个工作表逐行写入并在写完后落盘
+
+    参数:
+    sheets (dict): 工作表名 -> DataFrame，按顺序写入
+    target (str 或 file-like): 输出文件路径或二进制文件对象
+    chunk_rows (int): 每次转换的行数
+    """
+    if xlsxwriter is None:
+        raise RuntimeError("导出Excel需要安装xlsxwriter")
+
+    workbook = xlsxwriter.Workbook(target, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd',
+        'strings_to_urls': False
+    })
+    header_format = workbook.add_format({'bold': True})
+    for sheet_name, frame in sheets.items():
+        worksheet = workbook.add_worksheet(str(sheet_name)[:EXCEL_SHEET_NAME_LIMIT])
+        worksheet.write_row(0, 0, [str(column) for column in frame.columns], header_format)
+        for row_number, row in enumerate(_excel_rows(frame, chunk_rows), start=1):
+            worksheet.write_row(row_number, 0, row)
+    workbook.close()
+
+
+# 函数：整理完整分析的工作表
+def analysis_sheets(processed_data, batch_risk_analysis, product_growth=None):
+    """
+    把汇总与准确率、批次风险和产品增长率结果整理为导出用的工作表（全部区域）
+
+    参数:
+    processed_data (dict): process_data的结果
+    batch_risk_analysis (DataFrame): 批次风险分析结果
+    product_growth (dict): calculate_product_growth的结果，为空时不导出增长率
+
+    返回:
+    dict: 工作表名 -> DataFrame
+    """
+    sheets = {
+        '批次风险': batch_risk_analysis,
+        '全国月度准确率': processed_data['national_accuracy']['monthly'],
+        '区域月度准确率': processed_data['regional_accuracy']['region_monthly'],
+        '区域准确率': processed_data['regional_accuracy']['region_overall'],
+        '全国重点SKU': processed_data['national_top_skus'],
+        '产品区域月度汇总': processed_data['merged_monthly'],
+        '销售员月度汇总': processed_data['merged_by_salesperson']
+    }
+    if product_growth is not None and not product_growth['latest_growth'].empty:
+        sheets['产品增长率'] = product_growth['latest_growth']
+    return sheets
+
+
+# 函数：导出完整分析工作簿
+def analysis_workbook(processed_data, batch_risk_analysis, product_growth=None):
+    """
+    把完整分析写成多工作表Excel并返回已回到开头的临时文件，可直接作为下载内容
+
+    参数同analysis_sheets
+
+    返回:
+    SpooledTemporaryFile: xlsx文件内容
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    write_excel_workbook(analysis_sheets(processed_data, batch_risk_analysis, product_growth), output)
+    output.seek(0)
+    return output
+
+
+# 函数：解析命令行参数
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="把夜间快照中的分析结果导出为多工作表Excel")
+    parser.add_argument("--snapshot", help="快照目录，默认为最新快照")
+    parser.add_argument("--output", required=True, help="Excel文件路径")
+    parser.add_argument("--risk-csv", help="同时把批次风险分析结果导出为CSV文件")
+    return parser.parse_args(argv)
+
+
+# 函数：导出命令入口
+def main(argv=None):
+    """读取快照并导出分析结果，返回进程退出码"""
+    args = parse_args(argv)
+    snapshot_dir = args.snapshot or latest_snapshot(SNAPSHOT_DIR)
+    if snapshot_dir is None:
+        print(f"没有可读取的快照: {SNAPSHOT_DIR}，请先运行 yuce_nightly.py", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    try:
+        _, results, _ = read_snapshot(snapshot_dir)
+    except (OSError, ValueError) as e:
+        print(f"读取快照失败: {e}", file=sys.stderr)
+        return 1
+
+    sheets = analysis_sheets(results['processed_data'], results['batch_risk_analysis'], results['product_growth'])
+    try:
+        write_excel_workbook(sheets, args.output)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"已写入: {args.output}（{', '.join(f'{name} {len(frame)} 行' for name, frame in sheets.items())}）")
+
+    if args.risk_csv:
+        with open(args.risk_csv, 'wb') as f:
+            for chunk in iter_csv_chunks(results['batch_risk_analysis']):
+                f.write(chunk)
+        print(f"已写入: {args.risk_csv}")
+
+    print(f"导出耗时 {time.perf_counter() - start:.1f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
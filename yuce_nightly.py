@@ -0,0 +1,153 @@
+"""
+夜间批处理：加载五个输入文件，预先完成仪表盘的全部分析，并写入带版本号的Parquet快照
+
+仪表盘勾选“使用夜间快照”后直接读取最新快照，首次打开页面时无需重新加载和分析数据。
+
+使用--store时出货数据来自增量存储：--ingest指定的当日新增出货文件先并入存储（只重写受影响的月份），
+汇总基于存储中的月度汇总计算，产品销售指标只重算有变化的产品。首次使用时可将完整的历史出货文件作为--ingest导入。
+
+使用--sqlite时出货、预测、库存和单价数据从SQLite数据库（由yuce_sqlstore.py导入）按需汇总读取，产品信息仍来自--product。
+
+用法:
+    python yuce_nightly.py [--actual 出货数据.xlsx] [--forecast 人工预测.xlsx] [--product 产品信息.xlsx]
+                           [--inventory 库存.xlsx] [--price 单价.xlsx] [--output snapshots] [--keep 7] [--workers N] [--strict]
+    python yuce_nightly.py --store shipment_store [--ingest 新增出货.xlsx ...] [其他参数同上]
+    python yuce_nightly.py --sqlite yuce.sqlite [--product 产品信息.xlsx] [--output snapshots] [--keep 7] [--strict]
+"""
+import argparse
+import os
+import sys
+import time
+
+from yuce_engine import (
+    DEFAULT_ACTUAL_FILE,
+    DEFAULT_FORECAST_FILE,
+    DEFAULT_INVENTORY_FILE,
+    DEFAULT_PRICE_FILE,
+    DEFAULT_PRODUCT_FILE,
+    SNAPSHOT_DIR,
+    ingest_shipments,
+    load_actual_data,
+    load_input_data,
+    load_product_info,
+    memory_usage_report,
+    prune_snapshots,
+    refresh_product_sales_metrics,
+    run_full_analysis,
+    write_snapshot,
+)
+from yuce_sqlstore import load_sql_inputs
+
+
+# 函数：解析命令行参数
+def parse_args(argv=None):
+    """解析命令行参数，输入文件默认与仪表盘的默认文件一致"""
+    parser = argparse.ArgumentParser(description="预先计算销售预测与库存风险仪表盘的全部分析结果并写入快照")
+    parser.add_argument("--actual", default=DEFAULT_ACTUAL_FILE, help="出货数据文件")
+    parser.add_argument("--forecast", default=DEFAULT_FORECAST_FILE, help="人工预测数据文件")
+    parser.add_argument("--product", default=DEFAULT_PRODUCT_FILE, help="产品信息文件")
+    parser.add_argument("--inventory", default=DEFAULT_INVENTORY_FILE, help="库存数据文件")
+    parser.add_argument("--price", default=DEFAULT_PRICE_FILE, help="单价数据文件")
+    parser.add_argument("--output", default=SNAPSHOT_DIR, help="快照根目录")
+    parser.add_argument("--keep", type=int, default=7, help="保留的快照数量")
+    parser.add_argument("--store", help="出货增量存储目录，提供时出货数据从存储读取（忽略--actual）")
+    parser.add_argument("--ingest", action="append", default=[], metavar="FILE",
+                        help="并入增量存储的新增出货文件，可重复指定（需配合--store）")
+    parser.add_argument("--sqlite", metavar="DB",
+                        help="SQLite数据库文件，提供时出货、预测、库存和单价数据从数据库读取（忽略对应的文件参数）")
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help="并行解析输入文件的最大进程数，默认为CPU核数，1表示逐个加载")
+    parser.add_argument("--strict", action="store_true",
+                        help="输入文件缺失或加载出错时不写入快照（默认与仪表盘一样改用示例数据）")
+
+    args = parser.parse_args(argv)
+    if args.ingest and not args.store:
+        parser.error("--ingest 需要配合 --store 使用")
+    if args.store and args.sqlite:
+        parser.error("--store 和 --sqlite 不能同时使用")
+    return args
+
+
+# 函数：批处理入口
+def main(argv=None):
+    """加载数据、运行全部分析并写入快照，返回进程退出码"""
+    args = parse_args(argv)
+    sources = {
+        'actual': args.store or args.sqlite or args.actual,
+        'forecast': args.sqlite or args.forecast,
+        'product_info': args.product,
+        'inventory': args.sqlite or args.inventory,
+        'price': args.sqlite or args.price
+    }
+
+    problems = []
+
+    def report(message):
+        problems.append(message)
+        print(f"警告: {message}", file=sys.stderr)
+
+    if args.sqlite and not os.path.isfile(args.sqlite):
+        print(f"SQLite数据库不存在: {args.sqlite}，请先用 yuce_sqlstore.py 导入数据", file=sys.stderr)
+        return 1
+
+    for kind, path in sources.items():
+        if not os.path.exists(path) and path != args.store:
+            report(f"输入文件不存在: {path}（{kind}），使用示例数据")
+
+    start = time.perf_counter()
+
+    # 先将新增出货并入增量存储
+    for ingest_file in args.ingest:
+        if not os.path.exists(ingest_file):
+            report(f"新增出货文件不存在: {ingest_file}")
+            continue
+        problem_count = len(problems)
+        delta = load_actual_data(ingest_file, on_error=report)
+        if len(problems) > problem_count:
+            # 加载出错时加载器返回的是示例数据，不能并入存储
+            continue
+        change = ingest_shipments(delta, args.store)
+        if change is not None:
+            print(f"已导入 {ingest_file}: {change['rows']} 行（替换 {change['replaced_rows']} 行），"
+                  f"{change['date_range'][0]} ~ {change['date_range'][1]}，"
+                  f"涉及 {len(change['months'])} 个月份、{len(change['products'])} 个产品")
+
+    if args.sqlite:
+        inputs = load_sql_inputs(args.sqlite, product_info=load_product_info(args.product, on_error=report))
+    else:
+        inputs = load_input_data(args.actual, args.forecast, args.product, args.inventory, args.price,
+                                 on_error=report, shipment_store=args.store, max_workers=args.workers)
+    if args.store and inputs['actual_data'].empty:
+        print(f"出货增量存储为空: {args.store}，请先用 --ingest 导入历史出货数据", file=sys.stderr)
+        return 1
+    if args.sqlite and inputs['actual_cells'].empty:
+        print(f"SQLite数据库中没有出货数据: {args.sqlite}", file=sys.stderr)
+        return 1
+    if problems and args.strict:
+        print("输入数据存在问题，未写入快照", file=sys.stderr)
+        return 1
+    loaded = time.perf_counter()
+
+    for row in memory_usage_report(inputs).itertuples(index=False):
+        print(f"{row[0]}: {row[1]} 行，{row[2]:.2f} MB")
+
+    product_metrics = None
+    if args.store:
+        product_metrics = refresh_product_sales_metrics(args.store, shipments=inputs['actual_data'])
+
+    results = run_full_analysis(inputs, product_metrics=product_metrics)
+    analyzed = time.perf_counter()
+
+    snapshot_dir = write_snapshot(inputs, results, sources, root=args.output)
+    removed = prune_snapshots(args.output, keep=max(args.keep, 1))
+    finished = time.perf_counter()
+
+    print(f"快照已写入: {snapshot_dir}")
+    print(f"加载 {loaded - start:.1f} 秒，分析 {analyzed - loaded:.1f} 秒，写入 {finished - analyzed:.1f} 秒")
+    if removed:
+        print(f"已清理 {len(removed)} 个旧快照")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
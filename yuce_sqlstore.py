@@ -0,0 +1,380 @@
+"""
+可选的SQLite存储后端
+
+将出货、预测、库存批次和单价保存在单个SQLite数据库文件中，并在常用的筛选条件上建立索引：
+出货的(产品代码, 订单日期)、(所属年月, 所属区域)、(申请人)，预测的(所属年月, 所属区域)、(销售员)。
+启用该后端时，筛选和汇总在数据库中完成，内存中只保留月度汇总、批次相关产品的日出货和预测汇总，
+内存占用不再随出货明细的历史长度增长。
+
+用法（导入或更新数据库）:
+    python yuce_sqlstore.py [--db yuce.sqlite] [--actual 出货数据.xlsx] [--forecast 人工预测.xlsx]
+                            [--inventory 库存.xlsx] [--price 单价.xlsx]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import uuid
+from contextlib import closing
+
+import pandas as pd
+
+from yuce_engine import (
+    add_batch_age,
+    compact_dimensions,
+    load_actual_data,
+    load_forecast_data,
+    load_inventory_data,
+    load_price_data,
+    share_input_categories,
+)
+
+# 默认数据库文件
+SQLITE_DB_PATH = os.environ.get("YUCE_SQLITE_PATH", "yuce.sqlite")
+
+# 出货数量列名
+QTY_COLUMN = '求和项:数量（箱）'
+
+# 数据库结构：出货和预测按筛选维度建立索引，批次按产品建立索引
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+    f'''CREATE TABLE IF NOT EXISTS shipments (
+        "订单日期" TEXT NOT NULL,
+        "所属年月" TEXT,
+        "所属区域" TEXT,
+        "申请人" TEXT,
+        "产品代码" TEXT,
+        "{QTY_COLUMN}" NUMERIC
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_shipments_product_date ON shipments ("产品代码", "订单日期")',
+    'CREATE INDEX IF NOT EXISTS idx_shipments_month_region ON shipments ("所属年月", "所属区域")',
+    'CREATE INDEX IF NOT EXISTS idx_shipments_person ON shipments ("申请人")',
+    '''CREATE TABLE IF NOT EXISTS forecasts (
+        "所属年月" TEXT,
+        "所属区域" TEXT,
+        "销售员" TEXT,
+        "产品代码" TEXT,
+        "预计销售量" NUMERIC
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_forecasts_month_region ON forecasts ("所属年月", "所属区域")',
+    'CREATE INDEX IF NOT EXISTS idx_forecasts_person ON forecasts ("销售员")',
+    'CREATE INDEX IF NOT EXISTS idx_forecasts_product_month ON forecasts ("产品代码", "所属年月")',
+    '''CREATE TABLE IF NOT EXISTS batches (
+        "产品代码" TEXT,
+        "描述" TEXT,
+        "库位" TEXT,
+        "生产日期" TEXT,
+        "生产批号" TEXT,
+        "数量" REAL
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_batches_product ON batches ("产品代码")',
+    '''CREATE TABLE IF NOT EXISTS inventory (
+        "产品代码" TEXT,
+        "描述" TEXT,
+        "现有库存" REAL,
+        "已分配量" REAL,
+        "现有库存可订量" REAL,
+        "待入库量" REAL,
+        "本月剩余可订量" REAL
+    )''',
+    'CREATE TABLE IF NOT EXISTS prices ("产品代码" TEXT PRIMARY KEY, "单价" REAL)'
+]
+
+# 各表的列（与加载函数输出的DataFrame列名一致）
+SHIPMENT_COLUMNS = ['订单日期', '所属年月', '所属区域', '申请人', '产品代码', QTY_COLUMN]
+FORECAST_COLUMNS = ['所属年月', '所属区域', '销售员', '产品代码', '预计销售量']
+BATCH_COLUMNS = ['产品代码', '描述', '库位', '生产日期', '生产批号', '数量']
+INVENTORY_COLUMNS = ['产品代码', '描述', '现有库存', '已分配量', '现有库存可订量', '待入库量', '本月剩余可订量']
+
+# 查询结果中数值列的类型，表中没有数据时也与文件加载的结果一致（否则read_sql_query返回object列）
+SHIPMENT_DTYPES = {QTY_COLUMN: 'float64'}
+FORECAST_DTYPES = {'预计销售量': 'float64'}
+BATCH_DTYPES = {'数量': 'float64'}
+INVENTORY_DTYPES = {col: 'float64' for col in INVENTORY_COLUMNS[2:]}
+
+
+# 函数：打开数据库
+def connect(db_path=SQLITE_DB_PATH):
+    """打开（必要时创建）数据库并确保表和索引存在"""
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')  # 导入时仪表盘仍可读取
+    with conn:
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('db_id', ?)", (uuid.uuid4().hex,))
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', '0')")
+    return conn
+
+
+# 函数：获取数据库版本
+def database_version(db_path=SQLITE_DB_PATH):
+    """返回数据库的版本标识（数据库编号和导入次数），用作下游分析阶段的缓存键"""
+    with closing(connect(db_path)) as conn:
+        meta = dict(conn.execute('SELECT key, value FROM meta'))
+    return f"sqlite:{meta['db_id']}:{meta['version']}"
+
+
+# 函数：递增数据库版本
+def _bump_version(conn):
+    conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+
+
+# 函数：转换为数据库行
+def _to_rows(frame, columns, date_columns=()):
+    """按列顺序转换为插入用的元组，日期列转换为可排序的ISO文本，缺失值转换为NULL"""
+    frame = frame[columns].copy()
+    for col in date_columns:
+        frame[col] = pd.to_datetime(frame[col], errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
+    frame = frame.astype(object).where(frame.notna(), None)
+    return list(frame.itertuples(index=False, name=None))
+
+
+# 函数：构建IN筛选条件
+def _where(filters):
+    """
+    根据 列名 -> 取值列表 构建WHERE子句，取值为None的条件不参与筛选
+
+    返回:
+    tuple: (WHERE子句（无条件时为空字符串）, 参数列表)
+    """
+    clauses = []
+    params = []
+    for col, values in filters.items():
+        if values is None:
+            continue
+        values = list(values)
+        if not values:
+            clauses.append('0')
+            continue
+        clauses.append(f'"{col}" IN ({", ".join("?" * len(values))})')
+        params.extend(values)
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+# 函数：构建查询列
+def _select_list(columns):
+    return ', '.join(f'"{col}"' for col in columns)
+
+
+# 函数：导入出货数据
+def import_shipments(conn, shipments):
+    """
+    导入出货明细：已有明细中落在新数据订单日期范围内的行被替换，范围外的历史数据保持不变
+
+    返回:
+    int: 导入的行数
+    """
+    shipments = shipments.dropna(subset=['订单日期'])
+    if shipments.empty:
+        return 0
+
+    start = shipments['订单日期'].min().normalize()
+    end = shipments['订单日期'].max().normalize() + pd.Timedelta(days=1)
+    with conn:
+        conn.execute('DELETE FROM shipments WHERE "订单日期" >= ? AND "订单日期" < ?',
+                     (start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
+        conn.executemany(
+            f'INSERT INTO shipments VALUES ({", ".join("?" * len(SHIPMENT_COLUMNS))})',
+            _to_rows(shipments, SHIPMENT_COLUMNS, date_columns=['订单日期'])
+        )
+        _bump_version(conn)
+    return len(shipments)
+
+
+# 函数：导入预测数据
+def import_forecasts(conn, forecasts):
+    """导入预测数据，替换新数据中出现的月份，其他月份保持不变；返回导入的行数"""
+    months = list(forecasts['所属年月'].dropna().unique())
+    with conn:
+        where, params = _where({'所属年月': months})
+        conn.execute(f'DELETE FROM forecasts{where}', params)
+        conn.executemany(
+            f'INSERT INTO forecasts VALUES ({", ".join("?" * len(FORECAST_COLUMNS))})',
+            _to_rows(forecasts, FORECAST_COLUMNS)
+        )
+        _bump_version(conn)
+    return len(forecasts)
+
+
+# 函数：导入库存数据
+def import_inventory(conn, inventory_data, batch_data):
+    """用新的库存快照整体替换库存和批次数据；返回导入的批次数"""
+    with conn:
+        conn.execute('DELETE FROM inventory')
+        conn.execute('DELETE FROM batches')
+        conn.executemany(
+            f'INSERT INTO inventory VALUES ({", ".join("?" * len(INVENTORY_COLUMNS))})',
+            _to_rows(inventory_data.reindex(columns=INVENTORY_COLUMNS), INVENTORY_COLUMNS)
+        )
+        conn.executemany(
+            f'INSERT INTO batches VALUES ({", ".join("?" * len(BATCH_COLUMNS))})',
+            _to_rows(batch_data, BATCH_COLUMNS, date_columns=['生产日期'])
+        )
+        _bump_version(conn)
+    return len(batch_data)
+
+
+# 函数：导入单价数据
+def import_prices(conn, prices):
+    """导入产品单价（按产品代码覆盖）；返回导入的产品数"""
+    with conn:
+        conn.executemany('INSERT OR REPLACE INTO prices VALUES (?, ?)',
+                         [(str(code), float(price)) for code, price in prices.items()])
+        _bump_version(conn)
+    return len(prices)
+
+
+# 函数：查询出货汇总
+def query_shipment_cells(conn, by='month', months=None, regions=None, products=None, start=None, end=None):
+    """
+    在数据库中筛选并汇总出货数量
+
+    参数:
+    conn (Connection): 数据库连接
+    by (str): 'month'按月份、区域、申请人、产品汇总；'day'按订单日期（天）、区域、申请人、产品汇总
+    months, regions, products (list): 月份、区域、产品筛选，为None时不筛选
+    start, end (date): 订单日期范围 [start, end)，为None时不限制
+
+    返回:
+    DataFrame: 'month'时列同aggregate_shipment_cells的结果；'day'时列同load_actual_data的结果，维度列为分类类型
+    """
+    where, params = _where({'所属年月': months, '所属区域': regions, '产品代码': products})
+    date_clauses = []
+    if start is not None:
+        date_clauses.append('"订单日期" >= ?')
+        params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+    if end is not None:
+        date_clauses.append('"订单日期" < ?')
+        params.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+    if date_clauses:
+        where = (where + ' AND ' if where else ' WHERE ') + ' AND '.join(date_clauses)
+
+    if by == 'day':
+        sql = f'''SELECT substr("订单日期", 1, 10) AS "订单日期", "所属区域", "申请人", "产品代码",
+                         SUM("{QTY_COLUMN}") AS "{QTY_COLUMN}", "所属年月"
+                  FROM shipments{where}
+                  GROUP BY 1, "所属区域", "申请人", "产品代码", "所属年月"
+                  ORDER BY 1'''
+        cells = pd.read_sql_query(sql, conn, params=params, dtype=SHIPMENT_DTYPES)
+        cells['订单日期'] = pd.to_datetime(cells['订单日期'])
+        return compact_dimensions(cells)
+
+    sql = f'''SELECT "所属年月", "所属区域", "申请人", "产品代码", SUM("{QTY_COLUMN}") AS "{QTY_COLUMN}"
+              FROM shipments{where}
+              GROUP BY "所属年月", "所属区域", "申请人", "产品代码"
+              ORDER BY "所属年月", "所属区域", "申请人", "产品代码"'''
+    return compact_dimensions(pd.read_sql_query(sql, conn, params=params, dtype=SHIPMENT_DTYPES))
+
+
+# 函数：查询预测汇总
+def query_forecasts(conn, months=None, regions=None, products=None):
+    """在数据库中筛选并按月份、区域、销售员、产品汇总预测数量，列与load_forecast_data的结果相同"""
+    where, params = _where({'所属年月': months, '所属区域': regions, '产品代码': products})
+    sql = f'''SELECT "所属区域", "销售员", "所属年月", "产品代码", SUM("预计销售量") AS "预计销售量"
+              FROM forecasts{where}
+              GROUP BY "所属年月", "所属区域", "销售员", "产品代码"'''
+    return compact_dimensions(pd.read_sql_query(sql, conn, params=params, dtype=FORECAST_DTYPES))
+
+
+# 函数：查询库存数据
+def query_inventory(conn):
+    """读取库存和批次数据，返回(inventory_data, batch_data)，批次库龄按当前日期计算"""
+    inventory_data = pd.read_sql_query(f'SELECT {_select_list(INVENTORY_COLUMNS)} FROM inventory', conn,
+                                       dtype=INVENTORY_DTYPES)
+    batch_data = pd.read_sql_query(f'SELECT {_select_list(BATCH_COLUMNS)} FROM batches', conn, dtype=BATCH_DTYPES)
+    batch_data['生产日期'] = pd.to_datetime(batch_data['生产日期'], errors='coerce')
+    return inventory_data, add_batch_age(compact_dimensions(batch_data, columns=['产品代码']))
+
+
+# 函数：查询单价数据
+def query_prices(conn):
+    """读取产品单价字典"""
+    return dict(conn.execute('SELECT "产品代码", "单价" FROM prices'))
+
+
+# 函数：从数据库加载分析输入
+def load_sql_inputs(db_path=SQLITE_DB_PATH, product_info=None):
+    """
+    从数据库加载与yuce_engine.load_input_data结构相同的输入
+
+    出货只读取两部分：全部月份的月度汇总actual_cells（用于汇总、准确率和增长率），
+    以及库存批次涉及产品的日出货actual_data（用于批次风险、责任归属和预测偏差分析），均在数据库中按索引筛选和汇总。
+
+    参数:
+    db_path (str): 数据库文件
+    product_info (DataFrame): 产品信息（不保存在数据库中）
+
+    返回:
+    dict: actual_data、actual_cells、forecast_data、product_info、inventory_data、batch_data和price_data
+    """
+    with closing(connect(db_path)) as conn:
+        inventory_data, batch_data = query_inventory(conn)
+        batch_products = sorted(batch_data['产品代码'].dropna().unique())
+        return share_input_categories({
+            'actual_data': query_shipment_cells(conn, by='day', products=batch_products),
+            'actual_cells': query_shipment_cells(conn, by='month'),
+            'forecast_data': query_forecasts(conn),
+            'product_info': product_info,
+            'inventory_data': inventory_data,
+            'batch_data': batch_data,
+            'price_data': query_prices(conn)
+        })
+
+
+# 函数：解析命令行参数
+def parse_args(argv=None):
+    """解析导入命令的参数，未指定的数据不导入"""
+    parser = argparse.ArgumentParser(description="将出货、预测、库存和单价数据导入SQLite数据库")
+    parser.add_argument("--db", default=SQLITE_DB_PATH, help="数据库文件")
+    parser.add_argument("--actual", action="append", default=[], metavar="FILE",
+                        help="出货数据文件（按订单日期范围替换），可重复指定")
+    parser.add_argument("--forecast", action="append", default=[], metavar="FILE",
+                        help="预测数据文件（按月份替换），可重复指定")
+    parser.add_argument("--inventory", help="库存数据文件（整体替换）")
+    parser.add_argument("--price", help="单价数据文件")
+    return parser.parse_args(argv)
+
+
+# 函数：导入命令入口
+def main(argv=None):
+    """将指定文件导入数据库，任一文件不存在或加载出错时不导入该文件，返回进程退出码"""
+    args = parse_args(argv)
+    problems = []
+
+    def report(message):
+        problems.append(message)
+        print(f"警告: {message}", file=sys.stderr)
+
+    def load(loader, path):
+        # 加载出错时加载器返回示例数据，此时不导入
+        if not os.path.exists(path):
+            report(f"文件不存在: {path}")
+            return None
+        problem_count = len(problems)
+        data = loader(path, on_error=report)
+        return data if len(problems) == problem_count else None
+
+    with closing(connect(args.db)) as conn:
+        for path in args.actual:
+            shipments = load(load_actual_data, path)
+            if shipments is not None:
+                print(f"已导入出货数据 {path}: {import_shipments(conn, shipments)} 行")
+        for path in args.forecast:
+            forecasts = load(load_forecast_data, path)
+            if forecasts is not None:
+                print(f"已导入预测数据 {path}: {import_forecasts(conn, forecasts)} 行")
+        if args.inventory:
+            inventory = load(load_inventory_data, args.inventory)
+            if inventory is not None:
+                print(f"已导入库存数据 {args.inventory}: {import_inventory(conn, *inventory)} 个批次")
+        if args.price:
+            prices = load(load_price_data, args.price)
+            if prices is not None:
+                print(f"已导入单价数据 {args.price}: {import_prices(conn, prices)} 个产品")
+
+    print(f"数据库版本: {database_version(args.db)}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+"""
+合成数据生成器：按规模参数向量化生成出货、预测、产品信息、库存批次和单价数据，用于压力测试和性能基准
+
+生成结果与load_input_data的返回结构相同（维度列为共用字典的分类类型），可直接传给run_full_analysis；
+也可写成与默认文件格式相同的Excel文件，用于测试各加载函数。相同的参数和随机种子生成相同的数据。
+
+规模档位（SYNTHETIC_SCALES）以当前生产数据量为1x，10x和100x分别约为30万和300万行出货数据。
+100x的出货数据超过Excel工作表的行数上限，只能以Parquet格式写出（--format parquet），用read_synthetic_parquet读回。
+
+用法:
+    python yuce_synth.py --scale 10x --output synthetic_10x [--seed 0]
+    python yuce_synth.py --scale 100x --format parquet --output synthetic_100x
+    python yuce_synth.py --skus 2000 --regions 20 --salespeople 300 --days 730 --lines-per-day 8000 --output synthetic
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from yuce_engine import (
+    DEFAULT_ACTUAL_FILE,
+    DEFAULT_FORECAST_FILE,
+    DEFAULT_INVENTORY_FILE,
+    DEFAULT_PRICE_FILE,
+    DEFAULT_PRODUCT_FILE,
+    add_batch_age,
+    memory_usage_report,
+    share_input_categories,
+    simplify_product_name,
+)
+
+# 规模档位：1x接近当前生产数据（约3万行出货、82个产品、5个区域、24名销售员）
+SYNTHETIC_SCALES = {
+    '1x': {'skus': 82, 'regions': 5, 'salespeople': 24, 'days': 530, 'lines_per_day': 55},
+    '10x': {'skus': 800, 'regions': 10, 'salespeople': 240, 'days': 530, 'lines_per_day': 550},
+    '100x': {'skus': 8000, 'regions': 20, 'salespeople': 2400, 'days': 530, 'lines_per_day': 5500}
+}
+
+# Excel工作表的最大行数（含表头）
+EXCEL_MAX_ROWS = 1048576
+
+# Parquet格式写出的数据表（单价字典另存为price_data表）
+SYNTHETIC_TABLES = ['actual_data', 'forecast_data', 'product_info', 'inventory_data', 'batch_data']
+
+
+# 函数：生成合成数据
+def generate_synthetic_data(skus=82, regions=5, salespeople=24, days=530, lines_per_day=55, batches_per_sku=3,
+                            seasonality=0.3, intermittency=0.2, stocked_share=0.7, seed=0, end_date=None):
+    """
+    向量化生成一整套分析输入数据
+
+    参数:
+    skus, regions, salespeople (int): 产品、区域和销售员数量，每名销售员固定属于一个区域
+    days (int): 出货数据覆盖的天数（截至end_date）
+    lines_per_day (float): 平均每天的出货记录数（泊松分布）
+    batches_per_sku (float): 有库存产品的平均批次数（至少1个）
+    seasonality (float): 季节性振幅，各产品的月度需求在(1 ± seasonality)之间按正弦变化，相位随机
+    intermittency (float): 间歇性，产品在某天没有任何出货的平均概率（各产品在0到2倍之间随机）
+    stocked_share (float): 有库存批次的产品比例
+    seed (int): 随机种子
+    end_date (date): 出货数据的最后一天，默认为今天（批次库龄和近90天销量等按当天计算）
+
+    返回:
+    dict: actual_data、forecast_data、product_info、inventory_data、batch_data和price_data，结构同load_input_data
+    """
+    rng = np.random.default_rng(seed)
+    end_date = pd.Timestamp(end_date or datetime.now().date())
+    start_date = end_date - pd.Timedelta(days=days - 1)
+
+    # 维度成员，名称补零使字典顺序即编号顺序
+    product_codes = [f"F{i + 1:05d}" for i in range(skus)]
+    region_names = [f"区域{i + 1:02d}" for i in range(regions)]
+    person_names = [f"销售{i + 1:05d}" for i in range(salespeople)]
+    person_regions = np.arange(salespeople) % regions
+    month_starts = pd.date_range(start_date.to_period('M').to_timestamp(), end_date, freq='MS')
+    month_names = [month.strftime('%Y-%m') for month in month_starts]
+
+    # 产品热度（长尾分布）、季节性相位和间歇性
+    popularity = 1.0 / np.arange(1, skus + 1) ** 0.8
+    popularity = rng.permutation(popularity)
+    phases = rng.uniform(0, 12, skus)
+    zero_probability = np.clip(intermittency * rng.uniform(0, 2, skus), 0, 0.95)
+
+    # 每天的出货记录数，记录按天顺序排列
+    day_counts = rng.poisson(lines_per_day, days)
+    day_index = np.repeat(np.arange(days), day_counts)
+    order_dates = start_date + pd.to_timedelta(day_index, unit='D')
+    month_index = ((order_dates.year - month_starts[0].year) * 12
+                   + order_dates.month - month_starts[0].month).to_numpy()
+
+    # 按月的季节性权重抽取产品
+    product_index = np.empty(len(day_index), dtype=np.int64)
+    month_bounds = np.searchsorted(month_index, np.arange(len(month_starts) + 1))
+    for m, month in enumerate(month_starts):
+        start, stop = month_bounds[m], month_bounds[m + 1]
+        weights = popularity * (1 + seasonality * np.sin(2 * np.pi * (month.month - phases) / 12))
+        product_index[start:stop] = rng.choice(skus, size=stop - start, p=weights / weights.sum())
+
+    # 间歇性：产品在不出货的日子里没有任何记录
+    active = rng.random((skus, days)) >= zero_probability[:, None]
+    keep = active[product_index, day_index]
+    day_index, month_index, product_index = day_index[keep], month_index[keep], product_index[keep]
+    order_dates = order_dates[keep]
+
+    person_index = rng.integers(0, salespeople, len(day_index))
+    quantities = np.maximum(np.rint(rng.lognormal(2.7, 1.2, len(day_index))), 1).astype(np.int64)
+
+    actual_data = pd.DataFrame({
+        '订单日期': order_dates,
+        '所属区域': pd.Categorical.from_codes(person_regions[person_index], region_names),
+        '申请人': pd.Categorical.from_codes(person_index, person_names),
+        '产品代码': pd.Categorical.from_codes(product_index, product_codes),
+        '求和项:数量（箱）': quantities,
+        '所属年月': pd.Categorical.from_codes(month_index, month_names)
+    })
+
+    forecast_data = _generate_forecasts(rng, actual_data, person_regions, region_names)
+    product_info = _generate_product_info(rng, product_codes)
+    inventory_data, batch_data = _generate_inventory(rng, product_codes, batches_per_sku, stocked_share, end_date)
+    price_data = dict(zip(product_codes, np.round(rng.uniform(60, 320, skus), 2).tolist()))
+
+    return share_input_categories({
+        'actual_data': actual_data,
+        'forecast_data': forecast_data,
+        'product_info': product_info,
+        'inventory_data': inventory_data,
+        'batch_data': batch_data,
+        'price_data': price_data
+    })
+
+
+# 函数：生成预测数据
+def _generate_forecasts(rng, actual_data, person_regions, region_names):
+    """按月份、销售员和产品汇总出货量，加入对数正态误差作为预测量，约10%的组合没有预测"""
+    cells = actual_data.groupby(['所属年月', '申请人', '产品代码'], observed=True)['求和项:数量（箱）'].sum().reset_index()
+    cells = cells[rng.random(len(cells)) >= 0.1]
+    forecasts = np.rint(cells['求和项:数量（箱）'].to_numpy() * rng.lognormal(0, 0.35, len(cells))).astype(np.int64)
+    person_codes = cells['申请人'].cat.codes.to_numpy()
+
+    return pd.DataFrame({
+        '所属区域': pd.Categorical.from_codes(person_regions[person_codes], region_names),
+        '销售员': cells['申请人'].array,
+        '所属年月': cells['所属年月'].array,
+        '产品代码': cells['产品代码'].array,
+        '预计销售量': forecasts
+    })
+
+
+# 函数：生成产品信息
+def _generate_product_info(rng, product_codes):
+    """生成与产品信息文件相同列的数据（含简化产品名称）"""
+    weights = rng.choice([45, 60, 68, 77, 90, 100, 108, 120, 137], len(product_codes))
+    names = [f"口力合成产品{code[1:]} {weight}g-中国" for code, weight in zip(product_codes, weights)]
+    return pd.DataFrame({
+        '产品代码': product_codes,
+        '产品名称': names,
+        '产品规格': [f"{weight}g*24" for weight in weights],
+        '简化产品名称': [simplify_product_name(code, name) for code, name in zip(product_codes, names)]
+    })
+
+
+# 函数：生成库存和批次数据
+def _generate_inventory(rng, product_codes, batches_per_sku, stocked_share, end_date):
+    """为部分产品生成批次（生产日期在end_date前1~365天），库存汇总行由批次数量合计得到"""
+    stocked = np.flatnonzero(rng.random(len(product_codes)) < stocked_share)
+    batch_counts = rng.poisson(max(batches_per_sku - 1, 0), len(stocked)) + 1
+    batch_products = np.repeat(stocked, batch_counts)
+    batch_count = len(batch_products)
+
+    codes = np.asarray(product_codes, dtype=object)
+    descriptions = np.asarray([f"口力合成产品{code[1:]}-中国" for code in product_codes], dtype=object)
+    production_dates = end_date - pd.to_timedelta(rng.integers(1, 366, batch_count), unit='D')
+    lot_numbers = (pd.Series(production_dates.strftime('%Y%m%d'))
+                   + 'L:' + pd.Series(np.arange(batch_count) + 70000).astype(str).str.zfill(6))
+
+    batch_data = pd.DataFrame({
+        '产品代码': pd.Categorical.from_codes(batch_products, product_codes),
+        '描述': descriptions[batch_products],
+        '库位': [f"DC-{location:03d}" for location in rng.integers(0, 10, batch_count)],
+        '生产日期': production_dates,
+        '生产批号': lot_numbers.to_numpy(),
+        '数量': rng.integers(10, 1000, batch_count).astype(float)
+    })
+
+    current_stock = np.bincount(batch_products, weights=batch_data['数量'].to_numpy(), minlength=len(codes))[stocked]
+    allocated = np.floor(current_stock * rng.uniform(0, 0.1, len(stocked)))
+    pending = rng.choice([0.0, 0.0, 200.0, 500.0], len(stocked))
+    inventory_data = pd.DataFrame({
+        '产品代码': codes[stocked],
+        '描述': descriptions[stocked],
+        '现有库存': current_stock,
+        '已分配量': allocated,
+        '现有库存可订量': current_stock - allocated,
+        '待入库量': pending,
+        '本月剩余可订量': current_stock - allocated + pending
+    })
+
+    return inventory_data, add_batch_age(batch_data)
+
+
+# 函数：写入Excel文件
+def write_synthetic_workbooks(data, output_dir):
+    """
+    将合成数据写成与默认文件格式相同的五个Excel文件（文件名同默认文件），用于测试加载函数
+
+    参数:
+    data (dict): generate_synthetic_data的结果
+    output_dir (str): 输出目录
+
+    返回:
+    dict: 文件类型（同INPUT_LOADERS的键） -> 文件路径
+    """
+    actual_data = data['actual_data']
+    if len(actual_data) >= EXCEL_MAX_ROWS:
+        raise ValueError(f"出货数据有{len(actual_data)}行，超过Excel工作表的行数上限，请减小规模或使用--format parquet")
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {
+        'actual': os.path.join(output_dir, DEFAULT_ACTUAL_FILE),
+        'forecast': os.path.join(output_dir, DEFAULT_FORECAST_FILE),
+        'product_info': os.path.join(output_dir, DEFAULT_PRODUCT_FILE),
+        'inventory': os.path.join(output_dir, DEFAULT_INVENTORY_FILE),
+        'price': os.path.join(output_dir, DEFAULT_PRICE_FILE)
+    }
+
+    actual_data.drop(columns='所属年月').to_excel(paths['actual'], index=False)
+    data['forecast_data'].rename(columns={'所属区域': '所属大区'}).to_excel(paths['forecast'], index=False)
+    data['product_info'].drop(columns='简化产品名称').to_excel(paths['product_info'], index=False)
+    pd.DataFrame({
+        '产品代码': list(data['price_data'].keys()),
+        '单价': list(data['price_data'].values())
+    }).to_excel(paths['price'], index=False)
+    _inventory_sheet(data['inventory_data'], data['batch_data']).to_excel(paths['inventory'], index=False)
+
+    return paths
+
+
+# 函数：写入Parquet文件
+def write_synthetic_parquet(data, output_dir):
+    """
+    将合成数据按generate_synthetic_data的结构写成Parquet文件（每张表一个文件），不受Excel行数上限限制
+
+    参数:
+    data (dict): generate_synthetic_data的结果
+    output_dir (str): 输出目录
+
+    返回:
+    dict: 数据表名 -> 文件路径
+    """
+    if pyarrow is None:
+        raise RuntimeError("写入Parquet文件需要安装pyarrow")
+
+    os.makedirs(output_dir, exist_ok=True)
+    tables = {name: data[name] for name in SYNTHETIC_TABLES}
+    tables['price_data'] = pd.DataFrame({
+        '产品代码': list(data['price_data'].keys()),
+        '单价': list(data['price_data'].values())
+    })
+
+    paths = {}
+    for name, frame in tables.items():
+        paths[name] = os.path.join(output_dir, f"{name}.parquet")
+        frame.to_parquet(paths[name], engine='pyarrow', index=False)
+    return paths
+
+
+# 函数：读取Parquet文件
+def read_synthetic_parquet(output_dir):
+    """读取write_synthetic_parquet写出的数据，返回与generate_synthetic_data相同结构的结果"""
+    if pyarrow is None:
+        raise RuntimeError("读取Parquet文件需要安装pyarrow")
+
+    data = {
+        name: pd.read_parquet(os.path.join(output_dir, f"{name}.parquet"), engine='pyarrow')
+        for name in SYNTHETIC_TABLES
+    }
+    prices = pd.read_parquet(os.path.join(output_dir, 'price_data.parquet'), engine='pyarrow')
+    data['price_data'] = dict(zip(prices['产品代码'], prices['单价']))
+    return share_input_categories(data)
+
+
+# 函数：构建两层结构的库存表
+def _inventory_sheet(inventory_data, batch_data):
+    """产品行之后跟随其批次行（第一列为空），末尾为合计行（加载时表格最后一行不作为批次行）"""
+    product_rows = inventory_data.rename(columns={'产品代码': '物料'}).assign(_产品=inventory_data['产品代码'], _顺序=0)
+    batch_rows = batch_data[['库位', '生产日期', '生产批号', '数量']].assign(
+        _产品=batch_data['产品代码'].astype(str).to_numpy(), _顺序=1
+    )
+
+    sheet = pd.concat([product_rows, batch_rows], ignore_index=True).sort_values(['_产品', '_顺序'], kind='mergesort')
+    sheet = sheet.drop(columns=['_产品', '_顺序'])
+    total_row = pd.DataFrame([{'描述': '合计', '现有库存': inventory_data['现有库存'].sum()}])
+    columns = ['物料', '描述', '现有库存', '已分配量', '现有库存可订量', '待入库量', '本月剩余可订量',
+               '库位', '生产日期', '生产批号', '数量']
+    return pd.concat([sheet, total_row], ignore_index=True)[columns]
+
+
+# 函数：解析命令行参数
+def parse_args(argv=None):
+    """解析命令行参数，单独指定的规模参数覆盖--scale档位中的对应值"""
+    parser = argparse.ArgumentParser(description="生成用于压力测试和性能基准的合成数据，并写成Excel或Parquet文件")
+    parser.add_argument("--scale", choices=sorted(SYNTHETIC_SCALES), default='1x', help="规模档位")
+    parser.add_argument("--skus", type=int, help="产品数量")
+    parser.add_argument("--regions", type=int, help="区域数量")
+    parser.add_argument("--salespeople", type=int, help="销售员数量")
+    parser.add_argument("--days", type=int, help="出货数据覆盖的天数")
+    parser.add_argument("--lines-per-day", type=float, help="平均每天的出货记录数")
+    parser.add_argument("--batches-per-sku", type=float, default=3, help="有库存产品的平均批次数")
+    parser.add_argument("--seasonality", type=float, default=0.3, help="季节性振幅（0~1）")
+    parser.add_argument("--intermittency", type=float, default=0.2, help="产品某天没有出货的平均概率（0~1）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--end-date", type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        help="出货数据的最后一天（YYYY-MM-DD），默认为今天")
+    parser.add_argument("--format", choices=['xlsx', 'parquet'], default='xlsx',
+                        help="输出格式：xlsx为与默认文件相同的Excel文件；parquet不受Excel行数上限限制（100x档位需要）")
+    parser.add_argument("--output", required=True, help="输出目录")
+    return parser.parse_args(argv)
+
+
+# 函数：生成命令入口
+def main(argv=None):
+    """生成合成数据并写入Excel或Parquet文件，返回进程退出码"""
+    args = parse_args(argv)
+    scale = dict(SYNTHETIC_SCALES[args.scale])
+    for name in scale:
+        if getattr(args, name) is not None:
+            scale[name] = getattr(args, name)
+
+    start = time.perf_counter()
+    data = generate_synthetic_data(**scale, batches_per_sku=args.batches_per_sku, seasonality=args.seasonality,
+                                   intermittency=args.intermittency, seed=args.seed, end_date=args.end_date)
+    generated = time.perf_counter()
+
+    for row in memory_usage_report(data).itertuples(index=False):
+        print(f"{row[0]}: {row[1]} 行，{row[2]:.2f} MB")
+
+    write_files = write_synthetic_parquet if args.format == 'parquet' else write_synthetic_workbooks
+    try:
+        paths = write_files(data, args.output)
+    except (ValueError, RuntimeError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    finished = time.perf_counter()
+
+    print(f"已写入: {', '.join(paths.values())}")
+    print(f"生成 {generated - start:.1f} 秒，写入 {finished - generated:.1f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())